@@ -12,6 +12,9 @@ CONDITION = 'condition'
 
 # CORE
 from b3.core.tick import Tick
+from b3.core.profiler import Profiler
+from b3.core.budget import Timeout, remaining, check_time, timed_call, \
+    call_timeout, run_budgeted
 from b3.core.basenode import BaseNode
 from b3.core.blackboard import Blackboard
 from b3.core.behaviortree import BehaviorTree
@@ -26,6 +29,7 @@ from b3.composites.priority import Priority
 from b3.composites.mempriority import MemPriority
 from b3.composites.memsequence import MemSequence
 from b3.composites.ornode import OrNode
+from b3.composites.adaptivepriority import AdaptivePriority, UtilityStats
 
 # ACTIONS
 from b3.actions.succeeder import Succeeder
@@ -0,0 +1,142 @@
+import os
+import json
+import b3
+from b3.core import speculate
+
+__all__ = ['AdaptivePriority', 'UtilityStats']
+
+
+class UtilityStats(object):
+    '''Success and timing statistics of BT nodes, by name, kept in a JSON
+    file so they carry over from one run (and robot) to the next.
+
+    For each name: [ticks, successes, timed ticks, their total seconds].
+    save() adds the counts recorded since the last save to whatever is in
+    the file by then, so several runs may share one file.  path None:
+    statistics for this run only.
+    '''
+
+    def __init__(self, path=None):
+        self.path = path
+        self.stats = self.read()
+        self.new = {}       # recorded since the last save()
+
+    def read(self):
+        if self.path is None or not os.path.isfile(self.path):
+            return {}
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (IOError, ValueError):
+            return {}
+        return dict((str(k), list(v)) for (k, v) in data.items())
+
+    def get(self, name):
+        return self.stats.get(name, [0, 0, 0, 0.0])
+
+    #  dt: seconds taken (None: not known)
+    def record(self, name, success, dt=None):
+        for d in (self.stats, self.new):
+            s = d.setdefault(name, [0, 0, 0, 0.0])
+            s[0] += 1
+            if success:
+                s[1] += 1
+            if dt is not None:
+                s[2] += 1
+                s[3] += dt
+
+    def save(self):
+        if self.path is None or not self.new:
+            return
+        stats = self.read()
+        for name in self.new:
+            s = stats.setdefault(name, [0, 0, 0, 0.0])
+            for i in range(4):
+                s[i] += self.new[name][i]
+        d = os.path.dirname(self.path)
+        if d and not os.path.isdir(d):
+            os.makedirs(d)
+        tmp = self.path + '.%d.tmp' % os.getpid()
+        with open(tmp, 'w') as f:
+            json.dump(stats, f, indent=1, sort_keys=True)
+        os.rename(tmp, self.path)      # (atomic: readers never see half)
+        self.stats = stats
+        self.new = {}
+
+
+class AdaptivePriority(b3.Composite):
+    '''Priority which tries its children in order of measured utility:
+    P(success) / mean seconds per tick, from stats (a UtilityStats).
+
+    The order is worked out at the first tick (and by reorder()) from the
+    statistics as they are then, so the tree behaves the same for a given
+    statistics file.  Children with fewer than min_ticks recorded ticks
+    keep their places in the given order, which bounds exploration: they
+    are tried exactly as often as in a plain Priority until they have
+    statistics.  The others are sorted into the remaining places.
+
+    Children are known to the statistics by Name, so give them distinct
+    names.
+    '''
+    stateless = True
+    speculation_attrs = b3.Composite.speculation_attrs + ('stats', 'order')
+
+    def __init__(self, children=None, stats=None, min_ticks=5,
+                 parallel=False):
+        super(AdaptivePriority, self).__init__(children)
+        self.Name = '*AdaptivePriority*'
+        if stats is None:
+            stats = UtilityStats()
+        self.stats = stats
+        self.min_ticks = min_ticks
+        self.parallel = parallel
+        self.order = None
+
+    def key(self, i):
+        node = self.children[i]
+        if node.Name != '--unnamed--':
+            return node.Name
+        return '%s#%d' % (node.title, i)
+
+    def utilities(self):
+        n = len(self.children)
+        s = [self.stats.get(self.key(i)) for i in range(n)]
+        # mean seconds per tick over all the children: the prior cost
+        timed = sum([x[2] for x in s])
+        if timed > 0:
+            t0 = max(sum([x[3] for x in s]) / timed, 1e-9)
+        else:
+            t0 = 1.0
+        return [((x[1] + 1.0) / (x[0] + 2.0)) / ((x[3] + t0) / (x[2] + 1.0))
+                for x in s]
+
+    def reorder(self):
+        n = len(self.children)
+        u = self.utilities()
+        trained = [i for i in range(n)
+                   if self.stats.get(self.key(i))[0] >= self.min_ticks]
+        ranked = sorted(trained, key=lambda i: (-u[i], i))
+        order = range(n)
+        for (place, i) in zip(trained, ranked):
+            order[place] = i
+        self.order = order
+
+    #  names of the children in the order they are tried
+    def order_names(self):
+        if self.order is None or len(self.order) != len(self.children):
+            self.reorder()
+        return [self.key(i) for i in self.order]
+
+    def tick(self, tick):
+        if self.order is None or len(self.order) != len(self.children):
+            self.reorder()
+        nodes = [self.children[i] for i in self.order]
+        self.Cost = 0
+        for (k, status, dt) in speculate.execute(nodes, tick, self.parallel):
+            self.stats.record(self.key(self.order[k]), status == b3.SUCCESS,
+                              dt)
+            self.Cost += nodes[k].Cost
+            if status != b3.FAILURE:
+                return status
+
+        return b3.FAILURE
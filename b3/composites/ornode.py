@@ -1,4 +1,5 @@
 import b3
+from b3.core import speculate
 # run all the children (regardless of status)
 # return success if any child succeeds
 # equvalent to logical OR
@@ -25,14 +26,27 @@ __all__ = ['OrNode']
 
 
 class OrNode(b3.Composite):
-    def __init__(self, children=None):
+    stateless = True
+
+    # parallel: evaluate the children speculatively in worker processes
+    #   (same result as serial, see b3/core/speculate.py)
+    def __init__(self, children=None, parallel=False):
         super(OrNode, self).__init__(children)
         self.Name = '*OrNode*'
+        self.parallel = parallel
 
     def tick(self, tick):
         self.Cost = 0
         status = b3.FAILURE
 
+        if self.parallel:
+            for (i, status_curr, dt) in speculate.execute(self.children,
+                                                          tick, True):
+                self.Cost += self.children[i].Cost
+                if status_curr != b3.FAILURE:
+                    status = b3.SUCCESS
+            return status
+
         for node in self.children:
             status_curr = node._execute(tick)
             # Add in cost of selected leaf (requires zero cost for Seq node)
@@ -1,15 +1,29 @@
 import b3
+from b3.core import speculate
 
 __all__ = ['Priority']
 
 
 class Priority(b3.Composite):
-    def __init__(self, children=None):
+    stateless = True
+
+    # parallel: evaluate the children speculatively in worker processes
+    #   (same result as serial, see b3/core/speculate.py)
+    def __init__(self, children=None, parallel=False):
         super(Priority, self).__init__(children)
         self.Name = '*Priority*'
+        self.parallel = parallel
 
     def tick(self, tick):
         self.Cost = 0
+        if self.parallel:
+            for (i, status, dt) in speculate.execute(self.children, tick,
+                                                     True):
+                self.Cost += self.children[i].Cost
+                if status != b3.FAILURE:
+                    return status
+            return b3.FAILURE
+
         for node in self.children:
             status = node._execute(tick)
             # Add in cost of selected leaf (requires zero cost for Seq node)
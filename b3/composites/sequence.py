@@ -4,6 +4,7 @@ __all__ = ['Sequence']
 
 
 class Sequence(b3.Composite):
+    stateless = True
 
     def __init__(self, children=None):
         super(Sequence, self).__init__(children)
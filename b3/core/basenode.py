@@ -1,5 +1,9 @@
 import b3
 import uuid
+import logging
+
+logger = logging.getLogger('b3')
+logger.addHandler(logging.NullHandler())  # (the application sets up output)
 
 
 __all__ = ['BaseNode']
@@ -9,6 +13,17 @@ class BaseNode(object):
     category = None
     title = None
     description = None
+    log_level = 0
+    max_time = None
+    # stateless: open() and close() do nothing and the node doesn't care
+    #   whether it was left RUNNING, so _execute() skips the is_open
+    #   bookkeeping on the blackboard (e.g. Sequence, Priority)
+    stateless = False
+    # the attributes (statistics) a speculative tick of the node in a
+    #   worker process brings back (see speculate.py)
+    speculation_attrs = ('N_leaf_ticks', 'N_ticks_all', 'N_ticks',
+                         'N_success', 'N_tik2', 'N_suc2', 'Ps', 'Cost',
+                         'N_timeouts')
 
     def __init__(self):
         self.id = str(uuid.uuid1())
@@ -19,7 +34,7 @@ class BaseNode(object):
         # custom members for learning
         self.Name = "--unnamed--"
         self.TEST = "TESTING"
-        self.BHdebug = 0
+        self.log_level = 0          # 0: use the level of the 'b3' logger
         self.N_leaf_ticks = 0       # only increment if a leaf
         self.N_ticks_all = 0        # number of ticks
         self.N_ticks = 0            #
@@ -30,6 +45,8 @@ class BaseNode(object):
         self.Ps = 0.0               # basic P(success)
         self.P_selector = 0.0       # probability selected by selector S02
         self.Cost = 0               # Cost of ticking this leaf (INT!)
+        self.max_time = None        # time budget, seconds (see budget.py)
+        self.N_timeouts = 0         # times it ran out of time
         self.Utility = 0.0	        # U = P/C
         self.Utility_Mode = "RATIO"
 
@@ -115,13 +132,65 @@ class BaseNode(object):
         print 'Cost:               ', self.Cost
         print 'Utility:            ', self.get_Utility()
 
+    # BH debug output.  A node logs at its own level if it has one
+    #   (log_level, also set by BHdebug = True) and otherwise at the level
+    #   of the 'b3' logger.  Arguments are only formatted (str()) if the
+    #   record is actually emitted, e.g.
+    #           self.log(logging.DEBUG, 'solving %s with %s', u, eqn)
+    def log_enabled(self, level):
+        if self.log_level:
+            return level >= self.log_level
+        return logger.isEnabledFor(level)
+
+    def log(self, level, msg, *args):
+        if self.log_enabled(level):
+            # (the node's Name is in record.node)
+            logger.handle(logger.makeRecord(logger.name, level, '(b3 node)',
+                                            0, msg, args, None, None,
+                                            {'node': self.Name}))
+
+    #  BHdebug is true if this node will log debug messages
+    @property
+    def BHdebug(self):
+        return self.log_enabled(logging.DEBUG)
+
+    @BHdebug.setter
+    def BHdebug(self, flag):
+        if flag:
+            self.log_level = logging.DEBUG
+        else:
+            self.log_level = 0
+
     @property
     def name(self):
         return self.__class__.__name__
 
     def _execute(self, tick):
+        prof = tick.tree.profiler
+        if prof is not None:
+            prof.start(self)
+            try:
+                return self._execute_timed(tick)
+            finally:
+                prof.stop(self)
+        return self._execute_timed(tick)
+
+    def _execute_timed(self, tick):
+        if self.max_time is None:
+            return self._execute_node(tick)
+        return b3.run_budgeted(self, tick)
+
+    def _execute_node(self, tick):
         self._enter(tick)
-        if (not tick.blackboard.get('is_open', tick.tree.id, self.id)):
+        if self.stateless:
+            status = self._tick(tick)
+            if (status != b3.RUNNING):
+                tick._close_node(self)
+            self._exit(tick)
+            return status
+
+        memory = tick.blackboard.memory(tick.tree.id, self.id)
+        if (not memory.get('is_open')):
             self._open(tick)
 
         status = self._tick(tick)
@@ -145,19 +214,22 @@ class BaseNode(object):
     def _tick(self, tick):
         tick._tick_node(self)
         # self.N_ticks += 1   # used to have this but caused double ticks
-        if(self.BHdebug == 1):
-            print 'basenode: ', self.Name, " ticked "
+        debug = self.log_enabled(logging.DEBUG)
+        if debug:
+            self.log(logging.DEBUG, 'basenode: %s ticked ', self.Name)
         # BH count the ticks
         self.N_ticks_all += 1
         status = self.tick(tick)
         # BH count the total cost
-        tick.blackboard.inc('TotalCost', self.Cost)
-
-        if(self.BHdebug == 1):
-            if(status == b3.SUCCESS):
-                print "basenode: ", self.Name, " SUCCESS "
-            elif(status == b3.FAILURE):
-                print "basenode: ", self.Name, " FAIL"
+        if self.Cost:
+            tick.blackboard.inc('TotalCost', self.Cost)
+
+        if not debug:
+            pass
+        elif(status == b3.SUCCESS):
+            self.log(logging.DEBUG, 'basenode: %s SUCCESS ', self.Name)
+        elif(status == b3.FAILURE):
+            self.log(logging.DEBUG, 'basenode: %s FAIL', self.Name)
 
         # BH keep track of successful ticks
         if(status == b3.SUCCESS):
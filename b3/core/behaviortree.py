@@ -16,6 +16,17 @@ class BehaviorTree(object):
         self.tick_count = 0
         self.log_flag = 0       # write a log of node results 1 = SUCCESS only 2 = both S+F
         self.log_file = None    # file object
+        self.profiler = None    # b3.Profiler (see enable_profiling())
+        self.timeouts = {}      # node name: times out of time (budget.py)
+
+    # BH time every node from now on (see b3/core/profiler.py)
+    def enable_profiling(self):
+        if self.profiler is None:
+            self.profiler = b3.Profiler()
+        return self.profiler
+
+    def disable_profiling(self):
+        self.profiler = None
 
     def load(self, data, names=None):
         names = names or {}
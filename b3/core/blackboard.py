@@ -1,10 +1,21 @@
+
 __all__ = ['Blackboard']
 
 
 class Blackboard(object):
+    '''Memory shared by the nodes: base memory (the application's data),
+    per tree memory and per node memory (tree_scope and node_scope).
+
+    memory(tree_scope, node_scope) returns the dict itself, which can be
+    kept and used directly.  Node memories are also indexed by (tree,
+    node), so getting one is a single lookup however many trees and nodes
+    there are.
+    '''
+
     def __init__(self):
         self._base_memory = {}
         self._tree_memory = {}
+        self._node_memory = {}      # (tree_scope, node_scope): node memory
         self.set('TotalCost', 0)
 
     def _get_tree_memory(self, tree_scope):
@@ -24,33 +35,36 @@ class Blackboard(object):
 
         return memory[node_scope]
 
-    def _get_memory(self, tree_scope, node_scope):
-        memory = self._base_memory
-
-        if (tree_scope is not None):
-            memory = self._get_tree_memory(tree_scope)
+    def memory(self, tree_scope=None, node_scope=None):
+        if (tree_scope is None):
+            return self._base_memory
+        if (node_scope is None):
+            return self._get_tree_memory(tree_scope)
+        try:
+            return self._node_memory[(tree_scope, node_scope)]
+        except KeyError:
+            memory = self._get_node_memory(self._get_tree_memory(tree_scope),
+                                           node_scope)
+            self._node_memory[(tree_scope, node_scope)] = memory
+            return memory
 
-            if (node_scope is not None):
-                memory = self._get_node_memory(memory, node_scope)
-
-        return memory
+    _get_memory = memory
 
     def set(self, key, value, tree_scope=None, node_scope=None):
-        memory = self._get_memory(tree_scope, node_scope)
-        memory[key] = value
+        if (tree_scope is None):
+            self._base_memory[key] = value
+        else:
+            self.memory(tree_scope, node_scope)[key] = value
 
     def get(self, key, tree_scope=None, node_scope=None):
-        memory = self._get_memory(tree_scope, node_scope)
-        return memory.get(key)
+        if (tree_scope is None):
+            return self._base_memory.get(key)
+        return self.memory(tree_scope, node_scope).get(key)
 
     # BH make it easier to increment a BB value
     def inc(self, key, value, tree_scope=None, node_scope=None):
-        memory = self._get_memory(tree_scope, node_scope)
-        a = 5
-        if (type(a) == type(memory[key])):
-            memory[key] += value
-        else:
-            print type(memory[key])
-            print type(a)
-            print "Blackboard increment error - must be an int"
-            quit()
+        memory = self.memory(tree_scope, node_scope)
+        if (type(memory[key]) is not int):
+            raise TypeError('Blackboard increment error - must be an int, '
+                            'not %s' % type(memory[key]).__name__)
+        memory[key] += value
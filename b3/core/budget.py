@@ -0,0 +1,149 @@
+import os
+import sys
+import time
+import logging
+import multiprocessing
+import b3
+
+__all__ = ['Timeout', 'remaining', 'check_time', 'timed_call', 'call_timeout',
+           'run_budgeted']
+
+# Time budgets for nodes and subtrees.
+#
+#   A node with max_time set (seconds: node.max_time = 30, or a MaxTime
+#   decorator around a subtree) gets a deadline when it is ticked: now +
+#   max_time, or the deadline of an enclosing budget if that is earlier.
+#   The deadline is kept on the Tick.
+#
+#   Python can't stop a running leaf from outside, so cancellation is
+#   cooperative: long running work checks the deadline with
+#   check_time(tick), or calls timed_call(tick, f, ...) which checks it
+#   before and after f.  Both raise Timeout.  Work which must be cut off
+#   when the deadline passes can run in a worker process which is killed
+#   then: timed_call(tick, f, ..., hard=True).  The node whose budget ran
+#   out catches Timeout, closes the nodes it left open and returns
+#   FAILURE, so the tree moves on (e.g. to the next child of a Priority).
+#   Leaves should only raise Timeout before they change the blackboard.
+#
+#   Timeouts are counted in node.N_timeouts and tree.timeouts (name: count).
+#   With no budgets set nothing here runs and timed_call(tick, f, ...) is
+#   just f(...).
+
+
+class Timeout(Exception):
+    pass
+
+
+#  seconds left before the current deadline (None: no deadline)
+def remaining(tick):
+    if tick.deadline is None:
+        return None
+    return tick.deadline - time.time()
+
+
+def check_time(tick):
+    t = remaining(tick)
+    if t is not None and t <= 0:
+        raise Timeout()
+
+
+def _worker(f, args, conn):     # (runs in the forked process)
+    try:
+        result = ('ok', f(*args))
+    except Exception as err:
+        result = ('error', err)
+    try:
+        conn.send(result)
+    except Exception as err:    # (e.g. an unpicklable result)
+        conn.send(('error', RuntimeError(repr(err))))
+    conn.close()
+
+
+def fork_ok():
+    p = multiprocessing.current_process()
+    return hasattr(os, 'fork') and not p.daemon
+
+
+#
+#   f(*args) within seconds (None: no limit), else raise Timeout.
+#     f runs here, and Timeout is raised (instead of returning its result)
+#     if there was no time left to start it or it took too long.
+#
+#     hard=True: f runs in a worker process which is killed when the time
+#     is up, so f and its arguments and result must be picklable, and
+#     changes f makes to its arguments are not seen here.  Use it for work
+#     which may run far past the deadline (e.g. sympy simplification); the
+#     default, which costs no fork(), is for cheap calls.  Where a worker can't be started (no fork(), or we are
+#     in a daemon process, e.g. a speculative worker) f runs here.
+#
+def call_timeout(seconds, f, *args, **kwargs):
+    hard = kwargs.pop('hard', False)
+    if kwargs:
+        raise TypeError('unexpected arguments: %s' % kwargs.keys())
+    if seconds is None:
+        return f(*args)
+    if seconds <= 0:
+        raise Timeout()
+    if not (hard and fork_ok()):
+        t0 = time.time()
+        result = f(*args)
+        if time.time() - t0 > seconds:
+            raise Timeout()
+        return result
+    sys.stdout.flush()          # (or the worker would write it again)
+    (recv, send) = multiprocessing.Pipe(False)
+    p = multiprocessing.Process(target=_worker, args=(f, args, send))
+    p.daemon = True
+    p.start()
+    send.close()
+    try:
+        if not recv.poll(seconds):
+            raise Timeout()
+        try:
+            (kind, value) = recv.recv()
+        except EOFError:        # worker died
+            raise RuntimeError('call_timeout: worker process died')
+    finally:
+        if p.is_alive():
+            p.terminate()
+        p.join()
+        recv.close()
+    if kind == 'error':
+        raise value
+    return value
+
+
+#  f(*args) within the current deadline (see call_timeout())
+def timed_call(tick, f, *args, **kwargs):
+    return call_timeout(remaining(tick), f, *args, **kwargs)
+
+
+#  tick node within its budget (see BaseNode._execute)
+def run_budgeted(node, tick):
+    outer = tick.deadline
+    mine = time.time() + node.max_time
+    if outer is not None and outer < mine:
+        mine = outer
+    tick.deadline = mine
+    nopen = len(tick._open_nodes)
+    try:
+        return node._execute_node(tick)
+    except Timeout:
+        if mine == outer:       # an enclosing budget ran out
+            raise
+        # close node and the nodes below it which the Timeout left open
+        for n in reversed(tick._open_nodes[nopen:]):
+            if not n.stateless:
+                tick.blackboard.set('is_open', False, tick.tree.id, n.id)
+                n.close(tick)
+        del tick._open_nodes[nopen:]
+        node.N_timeouts += 1
+        name = node.Name
+        if name == '--unnamed--':
+            name = node.title
+        tick.tree.timeouts[name] = tick.tree.timeouts.get(name, 0) + 1
+        node.log(logging.INFO, '%s: out of time (%s s)', name,
+                 node.max_time)
+        return b3.FAILURE
+    finally:
+        tick.deadline = outer
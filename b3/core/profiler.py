@@ -0,0 +1,101 @@
+import json
+import time
+
+__all__ = ['Profiler']
+
+# upper edges (seconds) of the latency histogram buckets (last is open)
+HIST_EDGES = [1e-4, 1e-3, 1e-2, 1e-1, 1.0, 10.0, 100.0]
+
+
+class Profiler(object):
+    '''Per node timing for a BehaviorTree.
+
+    Enable with `tree.enable_profiling()`.  Every node execution is then
+    timed (see BaseNode._execute) and for each node we keep the number of
+    calls, cumulative and self (excluding children) wall clock time,
+    cumulative CPU time and a histogram of call latencies.  Self time is
+    also kept per path from the root, for flame graphs.
+
+    When profiling is off (`tree.profiler` is None) the only cost is one
+    attribute test per node execution.
+    '''
+
+    def __init__(self, wall=time.time, cpu=time.clock):
+        self.wall = wall
+        self.cpu = cpu
+        self.stats = {}    # node.id: stats dict
+        self.folded = {}   # (name, name, ...) path from root: self time
+        self._stack = []   # [node, stats, wall0, cpu0, child wall]
+        self._path = []
+
+    def _node_stats(self, node):
+        s = self.stats.get(node.id)
+        if s is None:
+            if node.Name != '--unnamed--':
+                name = node.Name
+            else:
+                name = node.title
+            s = {'name': name, 'class': node.__class__.__name__,
+                 'calls': 0, 'wall': 0.0, 'self': 0.0, 'cpu': 0.0,
+                 'hist': [0] * (len(HIST_EDGES) + 1), 'active': 0}
+            self.stats[node.id] = s
+        return s
+
+    def start(self, node):
+        s = self._node_stats(node)
+        s['active'] += 1
+        self._path.append(s['name'])
+        self._stack.append([node, s, self.wall(), self.cpu(), 0.0])
+
+    def stop(self, node):
+        (n, s, w0, c0, wchild) = self._stack.pop()
+        dt = self.wall() - w0
+        dc = self.cpu() - c0
+        s['active'] -= 1
+        s['calls'] += 1
+        if s['active'] == 0:     # don't count a node nested in itself twice
+            s['wall'] += dt
+            s['cpu'] += dc
+        s['self'] += dt - wchild
+        b = 0
+        while b < len(HIST_EDGES) and dt > HIST_EDGES[b]:
+            b += 1
+        s['hist'][b] += 1
+        path = tuple(self._path)
+        self.folded[path] = self.folded.get(path, 0.0) + dt - wchild
+        self._path.pop()
+        if len(self._stack) > 0:
+            self._stack[-1][4] += dt
+
+    def reset(self):
+        self.stats = {}
+        self.folded = {}
+
+    def to_dict(self):
+        nodes = []
+        for id in self.stats:
+            s = self.stats[id]
+            nodes.append({'id': id, 'name': s['name'], 'class': s['class'],
+                          'calls': s['calls'], 'wall': s['wall'],
+                          'self': s['self'], 'cpu': s['cpu'],
+                          'hist': list(s['hist'])})
+        nodes.sort(key=lambda n: -n['self'])
+        return {'hist_edges': HIST_EDGES, 'nodes': nodes}
+
+    def write_json(self, filename):
+        with open(filename, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def write_folded(self, filename):
+        '''folded stacks (self time in microseconds), e.g. for flamegraph.pl'''
+        with open(filename, 'w') as f:
+            for path in sorted(self.folded.keys()):
+                us = int(round(self.folded[path] * 1e6))
+                names = [n.replace(';', ':').replace(' ', '_') for n in path]
+                f.write(';'.join(names) + ' ' + str(us) + '\n')
+
+    def report(self, n=20):
+        print '\n  node                             calls      wall(s)      self(s)       cpu(s)'
+        for d in self.to_dict()['nodes'][:n]:
+            print '  {:30s} {:7d} {:12.3f} {:12.3f} {:12.3f}'.format(
+                d['name'][:30], d['calls'], d['wall'], d['self'], d['cpu'])
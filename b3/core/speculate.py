@@ -0,0 +1,228 @@
+import os
+import sys
+import time
+import tempfile
+import hashlib
+import StringIO
+import cPickle as pickle
+import multiprocessing
+import b3
+
+__all__ = ['execute']
+
+# Speculative evaluation of the children of a composite (Priority, OrNode).
+#
+#   execute(nodes, tick, parallel) ticks nodes in turn, like the serial
+#   loop of the composite.  With parallel, the next few nodes are each
+#   ticked at the same time in a forked worker process, on a copy of the
+#   current state.  The first worker's result is exactly what ticking
+#   that node here would give, so it is adopted instead of ticking the
+#   node again: its status, the state it left on the blackboard, its
+#   output and the statistics of its subtree.  The next worker's result
+#   is also valid if the one before it left the blackboard unchanged
+#   (e.g. a solver which FAILED), and so on.  After a node which changed
+#   the blackboard, the workers are started again from the new state.
+#   The result is therefore the same as the serial tree, but a run of
+#   failing children costs one worker's time instead of the sum of all
+#   of them.
+#
+#   The state is the blackboard's base memory and the memory of the tree
+#   and its nodes.  Changes are detected by hashing a pickle of it before
+#   and after the tick.  Changes a child makes to objects which are not
+#   reachable from the blackboard (e.g. globals, or attributes of the
+#   nodes other than their statistics, speculation_attrs) are lost, so
+#   only mark composites parallel when their children keep their state on
+#   the blackboard.  Anything a worker can't pickle, and a child left
+#   RUNNING, is simply ticked again here.
+#
+#   Each round forks a worker per node and pickles the whole state, so
+#   this only pays off for children which take long to fail.  It is off
+#   unless a composite is made with parallel=True.
+
+NWORKERS = None      # None: one worker per core
+
+
+def nworkers():
+    if NWORKERS is not None:
+        return NWORKERS
+    try:
+        return multiprocessing.cpu_count()
+    except NotImplementedError:
+        return 1
+
+
+def parallel_ok(tick):
+    return (hasattr(os, 'fork') and nworkers() > 1 and
+            tick.tree.profiler is None and
+            multiprocessing.current_process().name == 'MainProcess')
+
+
+#  the state a tick can change: base memory (but TotalCost: workers report
+#    their cost separately), tree memory and node memory of tick's tree
+def get_state(blackboard, tree_id):
+    base = [(k, v) for (k, v) in sorted(blackboard._base_memory.items())
+            if k != 'TotalCost']
+    tm = blackboard._tree_memory.get(tree_id, {})
+    tree = [(k, v) for (k, v) in sorted(tm.items())
+            if k not in ('node_memory', 'open_nodes')]
+    nodes = sorted(tm.get('node_memory', {}).items())
+    return (base, tree, nodes)
+
+
+#  put state (from get_state() in a worker) on the blackboard.  The
+#    memory dicts are updated in place, so references to them stay valid.
+def set_state(blackboard, tree_id, state):
+    (base, tree, nodes) = state
+    mem = blackboard._base_memory
+    total = mem.get('TotalCost')
+    mem.clear()
+    mem.update(base)
+    mem['TotalCost'] = total
+    tm = blackboard._get_tree_memory(tree_id)
+    for k in tm.keys():
+        if k not in ('node_memory', 'open_nodes'):
+            del tm[k]
+    tm.update(tree)
+    nm = tm['node_memory']
+    nodes = dict(nodes)
+    for k in nm:
+        nm[k].clear()
+    for (k, v) in nodes.items():
+        if k in nm:
+            nm[k].update(v)
+        else:
+            nm[k] = v
+
+
+#  hash of the state (None if it can't be pickled)
+def state_digest(blackboard, tree_id):
+    try:
+        s = pickle.dumps(get_state(blackboard, tree_id), 2)
+    except Exception:
+        return None
+    return hashlib.sha1(s).hexdigest()
+
+
+#  node and all the nodes below it
+def subtree(node):
+    nodes = [node]
+    for n in nodes:
+        nodes += getattr(n, 'children', None) or []
+        if getattr(n, 'child', None) is not None:
+            nodes.append(n.child)
+    return nodes
+
+
+def _worker(node, tick, before, conn):     # (runs in the forked process)
+    result = None
+    try:
+        out = tempfile.TemporaryFile()
+        os.dup2(out.fileno(), sys.stdout.fileno())     # capture the output
+        tree = tick.tree
+        log = StringIO.StringIO()
+        log_file = tree.log_file    # (keep it open: closing would flush it)
+        if tree.log_flag > 0:
+            tree.log_file = log
+        bb = tick.blackboard
+        cost0 = bb.get('TotalCost')
+        timeouts0 = dict(tree.timeouts)
+        t0 = time.time()
+        status = node._execute(tick)
+        dt = time.time() - t0
+        sys.stdout.flush()
+        out.seek(0)
+        if status != b3.RUNNING:
+            state = None
+            if state_digest(bb, tree.id) != before:
+                state = get_state(bb, tree.id)
+            stats = [dict((a, n.__dict__[a]) for a in n.speculation_attrs
+                          if a in n.__dict__) for n in subtree(node)]
+            timeouts = dict((k, v - timeouts0.get(k, 0))
+                            for (k, v) in tree.timeouts.items())
+            result = (status, dt, bb.get('TotalCost') - cost0, out.read(),
+                      log.getvalue(),
+                      pickle.dumps((state, stats, timeouts), 2))
+    except Exception:
+        pass
+    conn.send(result)
+    conn.close()
+
+
+def _speculate(nodes, tick, before):
+    results = []
+    jobs = []
+    sys.stdout.flush()          # (or the workers would write it again)
+    if tick.tree.log_file is not None:
+        tick.tree.log_file.flush()
+    for node in nodes:
+        (recv, send) = multiprocessing.Pipe(False)
+        p = multiprocessing.Process(target=_worker,
+                                    args=(node, tick, before, send))
+        p.daemon = True
+        p.start()
+        send.close()
+        jobs.append((p, recv))
+    for (p, recv) in jobs:
+        try:
+            results.append(recv.recv())
+        except EOFError:        # worker died
+            results.append(None)
+        p.join()
+    return results
+
+
+#  apply the result of a worker which ticked node.  Returns False if the
+#    node changed the state (so later results are not valid).
+def _adopt(node, result, tick):
+    (status, dt, dtotal, out, log, payload) = result
+    (state, stats, timeouts) = pickle.loads(payload)
+    if state is not None:
+        set_state(tick.blackboard, tick.tree.id, state)
+    for (n, d) in zip(subtree(node), stats):
+        for (a, v) in d.items():
+            old = n.__dict__.get(a)
+            if type(old) is type(v) and hasattr(old, '__dict__'):
+                old.__dict__.update(v.__dict__)     # (keep references valid)
+            else:
+                n.__dict__[a] = v
+    for (k, v) in timeouts.items():
+        if v:
+            tick.tree.timeouts[k] = tick.tree.timeouts.get(k, 0) + v
+    tick.blackboard.inc('TotalCost', dtotal)
+    if out:
+        sys.stdout.write(out)
+        sys.stdout.flush()
+    if log and tick.tree.log_flag > 0:
+        tick.tree.log_file.write(log)
+    return state is None
+
+
+#
+#   Tick nodes in turn, yielding (i, status, seconds) after nodes[i] has
+#     been ticked (or its speculative result adopted).  The caller stops
+#     whenever it likes (e.g. a Priority at the first non-FAILURE).
+#
+def execute(nodes, tick, parallel=False):
+    i = 0
+    while i < len(nodes):
+        if parallel and len(nodes) - i > 1 and parallel_ok(tick):
+            before = state_digest(tick.blackboard, tick.tree.id)
+            if before is not None:
+                k = max(nworkers(), 2)
+                for r in _speculate(nodes[i:i + k], tick, before):
+                    if r is None:
+                        break           # tick this one here
+                    clean = _adopt(nodes[i], r, tick)
+                    yield (i, r[0], r[1])
+                    i += 1
+                    if not clean:
+                        break           # the rest saw the old state
+                else:
+                    continue
+                if r is not None:
+                    continue
+        if i < len(nodes):
+            t0 = time.time()
+            status = nodes[i]._execute(tick)
+            yield (i, status, time.time() - t0)
+            i += 1
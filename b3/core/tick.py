@@ -33,6 +33,7 @@ class Tick(object):
 
         self._open_nodes = []
         self._node_count = 0
+        self.deadline = None    # time.time() to give up by (see budget.py)
 
     def _enter_node(self, node):
         '''Called when entering a node (called by BaseNode).
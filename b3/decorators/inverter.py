@@ -4,6 +4,8 @@ __all__ = ['Inverter']
 
 
 class Inverter(b3.Decorator):
+    stateless = True
+
     def __init__(self, children=None):
         super(Inverter, self).__init__(children)
         self.Name = '*Inverter*'
@@ -1,28 +1,24 @@
 import b3
-import time
 
 __all__ = ['MaxTime']
 
 
+#  FAILURE if the child takes longer than max_time seconds.
+#    The budget is enforced by BaseNode (see b3/core/budget.py): the child
+#    is stopped if it checks the time, and otherwise FAILS when it returns.
 class MaxTime(b3.Decorator):
-    def __init__(self, child, max_time=0):
+    def __init__(self, child=None, max_time=0):
         super(MaxTime, self).__init__(child)
 
         self.max_time = max_time
 
-    def open(self, tick):
-        t = time.time()
-        tick.blackboard.set('startTime', t, tick.tree.id, self.id)
-
     def tick(self, tick):
         if not self.child:
             return b3.ERROR
 
-        currTime = time.time()
-        startTime = tick.blackboard.get('startTime', tick.tree.id, self.id)
-
         status = self.child._execute(tick)
-        if (currTime - startTime > self.max_time):
+        left = b3.remaining(tick)
+        if left is not None and left <= 0:
             return b3.FAILURE
 
         return status
@@ -4,10 +4,13 @@ __all__ = ['RepeatUntilSuccess']
 
 
 class RepeatUntilSuccess(b3.Decorator):
-    def __init__(self, child, max_loop=-1):
+    # stalled(tick): called after each FAILURE of the child; if it returns
+    #   True, repeating can't help and we give up (FAILURE) at once.
+    def __init__(self, child, max_loop=-1, stalled=None):
         super(RepeatUntilSuccess, self).__init__(child)
 
         self.max_loop = max_loop
+        self.stalled = stalled
 
     def open(self, tick):
         tick.blackboard.set('i', 0, tick.tree.id, self.id)
@@ -22,6 +25,8 @@ class RepeatUntilSuccess(b3.Decorator):
 
             if status == b3.FAILURE:
                 i += 1
+                if self.stalled is not None and self.stalled(tick):
+                    break
             else:
                 break
 
@@ -19,6 +19,8 @@
 
 import sympy as sp
 from sys import exit, argv
+import os
+import time
 import pickle     # for storing pre-computed FK eqns
 import unittest
 
@@ -31,8 +33,9 @@ import ikbtfunctions.output_python as op
 import ikbtfunctions.output_cpp as oc
 from ikbtfunctions.ik_robots import *
 from ikbtbasics import *
-from ikbtleaves.assigner_leaf import assigner
-from ikbtleaves.rank_leaf import rank
+from ikbtleaves.assigner_leaf import assigner, solve_each
+from ikbtleaves.rank_leaf import rank, rank_all
+from ikbtleaves.comp_detect import stall_detect
 from ikbtleaves.algebra_solver import *
 from ikbtleaves.tan_solver import *
 from ikbtleaves.sincos_solver import *
@@ -41,24 +44,45 @@ from ikbtleaves.x2y2_solver import *
 from ikbtleaves.sub_transform import *
 from ikbtleaves.sum_transform import *
 from ikbtleaves.two_eqn_m7 import *
+import ikbtfunctions.ik_logging as ikl
 
 TEST_DATA_GENERATION = False
 
-sp.init_printing()
+# checkpoint the solve pipeline (after FK, equation scan, sum-of-angles
+#   and the BT solve) in fk_eqns/ so that reruns (e.g. after a code
+#   generation change) skip work that has already been done.
+CHECKPOINTS = True
+
+# time every BT node during the solve and write logs/<robot>_profile.json
+#   and logs/<robot>_profile.folded (flame graph input)
+PROFILE = False
+
+# speculatively evaluate the solvers under worktools in worker processes
+#   (multi core machines only, same result as serial; see b3/core/speculate.py).
+#   Each round forks a worker per solver, so it is off unless IKBT_PARALLEL_BT=1
+PARALLEL_BT = os.environ.get('IKBT_PARALLEL_BT', '0') == '1'
+
+# try every unsolved unknown on each pass of the solver loop (instead of
+#   one unknown, chosen by the assigner, per pass)
+MULTI_UNKNOWN = False
 
-if not TEST_DATA_GENERATION:
-    print ""
-    print "          Running IK solution "
-    print ""
-    print ""
-else:
-    print '-' * 50
-    print ""
-    print "          Generating IKBT TEST DATA only "
-    print ""
-    print "          (for production: line 32: TEST_DATA_GENERATION = False)"
-    print ""
-    print '-' * 50
+# on each pass of the solver loop first solve every unknown that the tan and
+#   sin/cos solvers can solve now, all at once (cheapest solution first, see
+#   rank_all in ikbtleaves/rank_leaf.py), then go on as usual
+BATCH_RANK = False
+
+# time budgets (seconds) of the slow solver leaves (see build_bt() for the
+#   names).  A leaf which runs out of time FAILS and the BT moves on to
+#   the next solver.  (see b3/core/budget.py)
+LEAF_BUDGETS = {'x2z2_Solver': 600, 'SimuEqnSolve': 600}
+
+# try the solvers in order of their measured utility (success rate / time,
+#   learned over all runs and robots and kept in SOLVER_STATS) instead of
+#   the fixed order of build_bt().  (see b3/composites/adaptivepriority.py)
+ADAPTIVE_BT = False
+SOLVER_STATS = 'fk_eqns/solver_stats.json'
+
+sp.init_printing()
 
 # generic variables for any maniplator
 ((th_1, th_2, th_3, th_4, th_5, th_6)) = sp.symbols(
@@ -72,385 +96,492 @@ sp.var('Px Py Pz')
 
 # move definition of Sum-of-Angles variables to ik-classes.py so they are available everywhere
 
+logdir = 'logs/'
+
 ########################################################
 #
-#     Robot Parameters
-
-
-# NEW Style robot param setups
+#     Per robot debug setup
+#
+#   debug:     {BT node name (see build_bt()): BHdebug}, applied on top
+#                of the defaults in build_bt()
+#   log_name:  if set, log node exits to logs/BT_<log_name>_node_log.txt
+#   log_flag:  log exits:  1=SUCCESS only, 2=BOTH S,F
+#   pause:     seconds comp_det waits after each pass (for easier reading)
+#
 
-#  Very basic Test
 
-Rs = ['C-Arm', 'Gomez', 'Kuka', 'Puma', 'Chair_Helper',
-      'Khat6DOF', 'Wrist', 'MiniDD', 'RavenII']
+class debug_config(object):
+    def __init__(self, log_name=None, header='Robot Solution Node Log\n',
+                 log_flag=2, debug={}, FailAllDone=False, pause=2):
+        self.log_name = log_name
+        self.header = header
+        self.log_flag = log_flag
+        self.pause = pause
+        self.debug = dict(debug)
+        # True: comp_det SUCCEEDs when there is more work to do. (not default)
+        self.FailAllDone = FailAllDone
 
-if len(argv) == 1:  # no argument - use default
-    #robot = 'Gomez'
-    #robot = 'Puma'
-    #robot = 'Chair_Helper'
-    #robot = 'Khat6DOF'
-    robot = 'Wrist'
 
-elif len(argv) == 2:
-    robot = str(argv[1])
+T = True
+F = False
 
-print ''
-print ''
-print '             Working on ' + robot
-print ''
-print ''
+# debug output from the x2z2 solver only
+x2z2_debug = {'sumOfAnglesSolve': F, 'tanSolver': F, 'tanID': F,
+              'sacSol': F, 'sacID': F, 'sacSolver': F,
+              'scSol': F, 'scID': F, 'scSolver': F,
+              'x2z2_Solver': T, 'sumOfAnglesT': F, 'compDetect': F,
+              'algID': F, 'algSolver': F, 'tanSol': F}
 
-#   Get the robot model
-[dh, vv, params, pvals, unknowns] = robot_params(robot)  # see ik_robots.py
+debug_configs = {
+    'MiniDD': debug_config('MiniDD', 'MiniDD Solution Node Log\n',
+                           debug={'scSol': F, 'scID': F, 'scSolver': F,
+                                  'tanSol': F}),
+    'Chair_Helper': debug_config('ChHelper'),
+    'Wrist': debug_config('Wrist', debug={'tanSol': F, 'tanSolver': F}),
+    'Puma': debug_config('Puma', 'Puma Node Log --\n', debug=x2z2_debug),
+    'Kuka': debug_config('Kuka', 'Kuka Node Log --\n', debug=x2z2_debug),
+}
 
-#
-#     Set up robot equations for further solution by BT
-#
-#   Check for a pickle file of pre-computed Mech object. If the pickle
-#       file is not there, compute the kinematic equations
 
-testing = False
-[M, R, unknowns] = kinematics_pickle(
-    robot, dh, params, pvals, vv, unknowns, testing)
-print 'GOT HERE: robot name: ', R.name
+def get_debug_config(robot):
+    return debug_configs.get(robot, debug_config())
 
-R.name = robot
-R.params = params
-
-# check the pickle in case DH params were changed
-dhp = M.DH
-# check that two mechanisms have identical DH params
-check_the_pickle(dhp, dh)
 
 ####################################################################################
 ##
 #                                   Set up the BT Leaves
 #
+#     returns the BT and a dict of its nodes by name
 #
-ikbt = b3.BehaviorTree()
-
-LeafDebug = False
-SolverDebug = False
-
-###add in new nodes:assigner and rank node#############
-asgn = assigner()
-asgn.Name = "Assigner"
-rk = rank()
-rk.Name = "Rank Node"
-#######################################################
-tanID = tan_id()
-tanID.Name = 'Tangent ID'
-tanID.BHdebug = LeafDebug
-
-tanSolver = tan_solve()
-tanSolver.BHdebug = SolverDebug
-tanSolver.Name = "Tangent Solver"
-
-tanSol = b3.Sequence([tanID, tanSolver])
-tanSol.Name = "TanID+Solv"
-tanSol.BHdebug = LeafDebug
-
-
-algID = algebra_id()
-algID.Name = "Algebra ID"
-algID.BHdebug = LeafDebug
-
-algSolver = algebra_solve()
-algSolver.Name = "Algebra Solver"
-algSolver.BHdebug = LeafDebug
-
-algSol = b3.Sequence([algID, algSolver])
-algSol.Name = "Algebra ID and Solve"
-algSol.BHdebug = SolverDebug
-
-#  sin(th) OR cos(th)
-scID = sincos_id()
-scID.Name = "Sin Cos ID"
-scID.BHdebug = SolverDebug
-
-scSolver = sincos_solve()
-scSolver.Name = "Sine Cosine Solver"
-scSolver.BHdebug = LeafDebug
-
-scSol = b3.Sequence([scID, scSolver])
-scSol.Name = "SinCos ID+Solve"
-scSol.BHdebug = SolverDebug
-
-# sin(th) AND cos(th) in same eqn
-sacID = sinandcos_id()
-sacID.Name = "Sin Cos ID"
-sacID.BHdebug = True
-
-sacSolver = sinandcos_solve()
-sacSolver.Name = "Sine Cosine Solver"
-sacSolver.BHdebug = True
-
-sacSol = b3.Sequence([sacID, sacSolver])
-sacSol.Name = "Sin AND Cos ID+Solve"
-sacSol.BHdebug = SolverDebug
-
-# x^2 + y^2 trick from Craig (eqn 4.65)
-x2z2_Solver = x2z2_id_solve()
-x2z2_Solver.Name = 'X2Y2 id and solver'
-x2z2_Solver.BHdebug = True
-
-
-# two equations one unknown,
-SimuEqnID = simu_id()
-SimuEqnID.Name = 'Simultaneous Eqn ID'
-SimuEqnID.BHdebug = False
-SimuEqnSolve = simu_solver()
-SimuEqnSolve.Name = 'Simultaneous Eqn solver'
-Simu_Eqn_Sol = b3.Sequence([SimuEqnID, SimuEqnSolve])
-#
-#  Equation Transforms
-#
-
-sub_trans = sub_transform()
-sub_trans.Name = "Substitution Transform"
-sub_trans.BHdebug = LeafDebug
-
-sumOfAnglesT = sum_id()  # we should change name of this to 'transform'
-sumOfAnglesT.BHdebug = False
-sumOfAnglesT.Name = "Sum of Angles Transform"
-
-sumOfAnglesSolve = sum_solve()
-sumOfAnglesSolve.Name = "Sum of Angles Solve"
-
-updateL = updateL()
-updateL.Name = "updateL Transform"
-updateL.BHdebug = False
-
-
-compDetect = comp_det()
-compDetect.Name = "Completion Detect"
-compDetect.BHdebug = True
-
-#           ONE BT TO RULE THEM ALL!
-#   Higher level BT nodes here
-#
-
-sc_tan = b3.Sequence([b3.OrNode([tanSol, scSol]), rk])
-
-
-# this is the current working version
-# it's also possible to build customized BT
-worktools = b3.Priority([algSol, sc_tan, Simu_Eqn_Sol, sacSol, x2z2_Solver])
-
+def build_bt():
+    ikbt = b3.BehaviorTree()
+
+    LeafDebug = False
+    SolverDebug = False
+
+    ###add in new nodes:assigner and rank node#############
+    asgn = assigner()
+    asgn.Name = "Assigner"
+    rk = rank()
+    rk.Name = "Rank Node"
+    #######################################################
+    tanID = tan_id()
+    tanID.Name = 'Tangent ID'
+    tanID.BHdebug = LeafDebug
+
+    tanSolver = tan_solve()
+    tanSolver.BHdebug = SolverDebug
+    tanSolver.Name = "Tangent Solver"
+
+    tanSol = b3.Sequence([tanID, tanSolver])
+    tanSol.Name = "TanID+Solv"
+    tanSol.BHdebug = LeafDebug
+
+    algID = algebra_id()
+    algID.Name = "Algebra ID"
+    algID.BHdebug = LeafDebug
+
+    algSolver = algebra_solve()
+    algSolver.Name = "Algebra Solver"
+    algSolver.BHdebug = LeafDebug
+
+    algSol = b3.Sequence([algID, algSolver])
+    algSol.Name = "Algebra ID and Solve"
+    algSol.BHdebug = SolverDebug
+
+    #  sin(th) OR cos(th)
+    scID = sincos_id()
+    scID.Name = "Sin Cos ID"
+    scID.BHdebug = SolverDebug
+
+    scSolver = sincos_solve()
+    scSolver.Name = "Sine Cosine Solver"
+    scSolver.BHdebug = LeafDebug
+
+    scSol = b3.Sequence([scID, scSolver])
+    scSol.Name = "SinCos ID+Solve"
+    scSol.BHdebug = SolverDebug
+
+    # sin(th) AND cos(th) in same eqn
+    sacID = sinandcos_id()
+    sacID.Name = "Sin Cos ID"
+    sacID.BHdebug = True
+
+    sacSolver = sinandcos_solve()
+    sacSolver.Name = "Sine Cosine Solver"
+    sacSolver.BHdebug = True
+
+    sacSol = b3.Sequence([sacID, sacSolver])
+    sacSol.Name = "Sin AND Cos ID+Solve"
+    sacSol.BHdebug = SolverDebug
+
+    # x^2 + y^2 trick from Craig (eqn 4.65)
+    x2z2_Solver = x2z2_id_solve()
+    x2z2_Solver.Name = 'X2Y2 id and solver'
+    x2z2_Solver.BHdebug = True
+
+    # two equations one unknown,
+    SimuEqnID = simu_id()
+    SimuEqnID.Name = 'Simultaneous Eqn ID'
+    SimuEqnID.BHdebug = False
+    SimuEqnSolve = simu_solver()
+    SimuEqnSolve.Name = 'Simultaneous Eqn solver'
+    Simu_Eqn_Sol = b3.Sequence([SimuEqnID, SimuEqnSolve])
+    Simu_Eqn_Sol.Name = 'Simultaneous Eqn ID+Solve'
+    #
+    #  Equation Transforms
+    #
+
+    sub_trans = sub_transform()
+    sub_trans.Name = "Substitution Transform"
+    sub_trans.BHdebug = LeafDebug
+
+    sumOfAnglesT = sum_id()  # we should change name of this to 'transform'
+    sumOfAnglesT.BHdebug = False
+    sumOfAnglesT.Name = "Sum of Angles Transform"
+
+    sumOfAnglesSolve = sum_solve()
+    sumOfAnglesSolve.Name = "Sum of Angles Solve"
+
+    updateLT = updateL()
+    updateLT.Name = "updateL Transform"
+    updateLT.BHdebug = False
+
+    compDetect = comp_det()
+    compDetect.Name = "Completion Detect"
+    compDetect.BHdebug = True
+
+    #           ONE BT TO RULE THEM ALL!
+    #   Higher level BT nodes here
+    #
+
+    sc_tan = b3.Sequence([b3.OrNode([tanSol, scSol], PARALLEL_BT), rk])
+    sc_tan.Name = 'Tan or SinCos ID+Solve'
+
+    # this is the current working version
+    # it's also possible to build customized BT
+    solvers = [algSol, sc_tan, Simu_Eqn_Sol, sacSol, x2z2_Solver]
+    if ADAPTIVE_BT:
+        worktools = b3.AdaptivePriority(solvers, b3.UtilityStats(SOLVER_STATS),
+                                        parallel=PARALLEL_BT)
+    else:
+        worktools = b3.Priority(solvers, PARALLEL_BT)
+
+    if MULTI_UNKNOWN:
+        subtree = solve_each(worktools, PARALLEL_BT)
+        subtree.Name = "Solve each unknown"
+    else:
+        subtree = b3.RepeatUntilSuccess(b3.Sequence([asgn, worktools]), 6)
+    if BATCH_RANK:
+        batch = rank_all(b3.OrNode([tanSol, scSol]))
+        batch.Name = "Rank all unknowns"
+        subtree = b3.OrNode([batch, subtree])
+    solveRoutine = b3.Sequence([sub_trans, subtree,  updateLT, compDetect])
+
+    # max 7 loops, fewer if nothing more can be solved
+    topnode = b3.RepeatUntilSuccess(solveRoutine, 7, stall_detect())
+
+    ikbt.root = topnode
+
+    nodes = {'tanID': tanID, 'tanSolver': tanSolver, 'tanSol': tanSol,
+             'algID': algID, 'algSolver': algSolver, 'algSol': algSol,
+             'scID': scID, 'scSolver': scSolver, 'scSol': scSol,
+             'sacID': sacID, 'sacSolver': sacSolver, 'sacSol': sacSol,
+             'x2z2_Solver': x2z2_Solver, 'SimuEqnID': SimuEqnID,
+             'SimuEqnSolve': SimuEqnSolve, 'sub_trans': sub_trans,
+             'sumOfAnglesT': sumOfAnglesT,
+             'sumOfAnglesSolve': sumOfAnglesSolve,
+             'updateL': updateLT, 'compDetect': compDetect,
+             'worktools': worktools}
+    return ikbt, nodes
 
-subtree = b3.RepeatUntilSuccess(b3.Sequence([asgn, worktools]), 6)
-solveRoutine = b3.Sequence([sub_trans, subtree,  updateL, compDetect])
-
-topnode = b3.RepeatUntilSuccess(solveRoutine, 7)  # max 10 loops
-
-ikbt.root = topnode
-
-logdir = 'logs/'
-
-if not os.path.isdir(logdir):  # if this doesn't exist, create it.
-    os.mkdir(logdir)
 
 #
 #     Logging setup
 #
-if(robot == 'MiniDD'):
-
-    ikbt.log_flag = 2  # log exits:  1=SUCCESS only, 2=BOTH S,F
-    ikbt.log_file = open(logdir + 'BT_MiniDD_node_log.txt', 'w')
-    ikbt.log_file.write('MiniDD Solution Node Log\n')
-
-    scSol.BHdebug = False
-    scID.BHdebug = False
-    scSolver.BHdebug = False
-
-    tanSol.BHdebug = False
+#   batch mode: no per node debug output (nodes follow the logger level)
+#               and no pauses
+#
+def configure_bt(ikbt, nodes, cfg, batch=False):
+    if cfg.log_name is not None:
+        ikbt.log_flag = cfg.log_flag
+        ikbt.log_file = open(logdir + 'BT_' + cfg.log_name + '_node_log.txt', 'w')
+        ikbt.log_file.write(cfg.header)
+    nodes['compDetect'].FailAllDone = cfg.FailAllDone
+    for name in LEAF_BUDGETS:
+        nodes[name].max_time = LEAF_BUDGETS[name]
+    if batch:
+        for n in nodes.values():
+            n.BHdebug = False
+    else:
+        nodes['compDetect'].pause = cfg.pause
+        for name in cfg.debug:
+            nodes[name].BHdebug = cfg.debug[name]
 
-if(robot == 'Chair_Helper'):
 
-    ikbt.log_flag = 2  # log exits:  1=SUCCESS only, 2=BOTH S,F
-    ikbt.log_file = open(logdir + 'BT_ChHelper_node_log.txt', 'w')
-    ikbt.log_file.write('Robot Solution Node Log\n')
+#
+#     Solve pipeline stages.  Each stage takes and returns
+#       [Robot, unknowns, equation lists]
+#
 
+def fk_stage(robot, dh, vv, params, pvals, unknowns):
+    #
+    #     Set up robot equations for further solution by BT
+    #
+    #   Check for a pickle file of pre-computed Mech object. If the pickle
+    #       file is not there, compute the kinematic equations
 
-if(robot == 'Wrist'):
-    ikbt.log_flag = 2  # log exits:  1=SUCCESS only, 2=BOTH S,F
-    ikbt.log_file = open(logdir + 'BT_Wrist_node_log.txt', 'w')
-    ikbt.log_file.write('Robot Solution Node Log\n')
-    # print ' ----------------------------   INITIAL KINEMATIC EQUATION ----------------------'
-    # print R.mequation_list[0]   # print the classic matrix equation
-    # print ' --------------------------------------------------------------------------------'
-    tanSol.BHdebug = False
-    tanSolver.BHdebug = False
-    #tanID.BHdebug = True
+    testing = False
+    [M, R, unknowns] = kinematics_pickle(
+        robot, dh, params, pvals, vv, unknowns, testing)
+    print 'GOT HERE: robot name: ', R.name
 
+    R.name = robot
+    R.params = params
 
-if (robot == 'Puma'):  # Puma debug setup
-    ikbt.log_flag = 2  # log exits:  1=SUCCESS only, 2=BOTH S,F
-    ikbt.log_file = open(logdir + 'BT_Puma_node_log.txt', 'w')
-    ikbt.log_file.write('Puma Node Log --\n')
+    # check the pickle in case DH params were changed
+    dhp = M.DH
+    # check that two mechanisms have identical DH params
+    check_the_pickle(dhp, dh)
+    return [R, unknowns, None]
 
-    T = True
-    F = False
 
-    sumOfAnglesSolve.BHdebug = F
+def scan_stage(state):
+    [R, unknowns, L] = state
+    # Generate the lists of soln candidate equations from the matrix equations
+    # lists of 1unk and 2unk equations
+    L = R.scan_for_equations(unknowns)
+    return [R, unknowns, L]
 
-    tanSolver.BHdebug = F
-    tanID.BHdebug = F
 
-    sacSol.BHdebug = F
-    sacID.BHdebug = F
-    sacSolver.BHdebug = F
-    scSol.BHdebug = F
-    scID.BHdebug = F
-    scSolver.BHdebug = F
+def soa_stage(state):
+    [R, unknowns, L] = state
+    R.sum_of_angles_transform(unknowns)  # get the sum of angle
+    return [R, unknowns, L]
 
-    x2z2_Solver.BHdebug = T
-    sumOfAnglesT.BHdebug = F
 
-    compDetect.BHdebug = F
-    # set it up to SUCCEED when there is more work to do. (not default)
-    compDetect.FailAllDone = F
-    algID.BHdebug = F
-    algSolver.BHdebug = F
-    tanSol.BHdebug = F
+def solve_stage(ikbt, state):
+    [R, unknowns, [L1, L2, L3p]] = state
+    #
+    #    Set up the blackboard for solution
+    #
+    bb = b3.Blackboard()
 
+    set_eqn_lists(bb, L1, L2, L3p)
 
-if (robot == 'Kuka'):  # Kuka debug setup
-    ikbt.log_flag = 2  # log exits:  1=SUCCESS only, 2=BOTH S,F
-    ikbt.log_file = open(logdir + 'BT_Kuka_node_log.txt', 'w')
-    ikbt.log_file.write('Kuka Node Log --\n')
+    bb.set('Robot', R)
+    bb.set('unknowns', unknowns)
 
-    T = True
-    F = False
+    ################################################################################
+    #
+    #           Perform the Computation via ticking the BT
+    #
 
-    sumOfAnglesSolve.BHdebug = F
+    #  Off we go: tick the BT
+    print "Ticking IK BT for ", R.name, " -------------------------\n\n"
 
-    tanSolver.BHdebug = F
-    tanID.BHdebug = F
+    if PROFILE:
+        prof = ikbt.enable_profiling()
+    ikbt.tick("Test a full solver", bb)
+    if PROFILE:
+        prof.report()
+        prof.write_json(logdir + R.name + '_profile.json')
+        prof.write_folded(logdir + R.name + '_profile.folded')
+    for name in sorted(ikbt.timeouts):
+        print 'Out of time: ', name, ikbt.timeouts[name], 'time(s)'
 
-    sacSol.BHdebug = F
-    sacID.BHdebug = F
-    sacSolver.BHdebug = F
-    scSol.BHdebug = F
-    scID.BHdebug = F
-    scSolver.BHdebug = F
+    return [bb.get('Robot'), bb.get('unknowns'), None]
 
-    x2z2_Solver.BHdebug = T
-    sumOfAnglesT.BHdebug = F
 
-    compDetect.BHdebug = F
-    # set it up to SUCCEED when there is more work to do. (not default)
-    compDetect.FailAllDone = F
-    algID.BHdebug = F
-    algSolver.BHdebug = F
-    tanSol.BHdebug = F
 #
-#    Set up the blackboard for solution
+#    Solve one robot and generate its LaTeX, Python and C++ solutions
 #
-bb = b3.Blackboard()
-
-
-# Generate the lists of soln candidate equations from the matrix equations
-# lists of 1unk and 2unk equations
-[L1, L2, L3p] = R.scan_for_equations(unknowns)
-bb.set('eqns_1u', L1)   # eqns with one unk
-bb.set('eqns_2u', L2)  # two unks
-bb.set('eqns_3pu', L3p)  # three or more unks
-
-R.sum_of_angles_transform(unknowns)  # get the sum of angle
-
-bb.set('Robot', R)
-bb.set('unknowns', unknowns)
+#     returns [Robot, unknowns].  Raises AssertionError if a solution
+#     check fails.
+#
+def solve(robot, batch=False):
+    print ''
+    print ''
+    print '             Working on ' + robot
+    print ''
+    print ''
+
+    #   Get the robot model
+    [dh, vv, params, pvals, unknowns] = robot_params(robot)  # see ik_robots.py
+
+    if not os.path.isdir(logdir):  # if this doesn't exist, create it.
+        os.mkdir(logdir)
+
+    [ikbt, nodes] = build_bt()
+    configure_bt(ikbt, nodes, get_debug_config(robot), batch)
+
+    if CHECKPOINTS:
+        ckstore = cache_store('fk_eqns/')
+    else:
+        ckstore = None
+    solve_name = 'solve'
+    if ADAPTIVE_BT:     # (the result depends on the order of the solvers)
+        solve_name += ':' + ','.join(nodes['worktools'].order_names())
+    stages = [('scan', scan_stage), ('soa', soa_stage),
+              (solve_name, lambda state: solve_stage(ikbt, state))]
+    try:
+        # (a solve cut short by a time budget is not kept)
+        [R, unks, L] = run_checkpointed(
+            stages, fk_cache_key(dh, vv, unknowns),
+            lambda: fk_stage(robot, dh, vv, params, pvals, unknowns), ckstore,
+            lambda state: len(ikbt.timeouts) == 0)
+    finally:
+        if ikbt.log_file is not None:
+            ikbt.log_file.close()
+    if ADAPTIVE_BT:
+        nodes['worktools'].stats.save()
+    # checkpoints are keyed on the kinematics only, and may be shared with
+    #   another robot name or parameter values
+    R.name = robot
+    R.params = params
+    R.Mech.pvals = pvals
+
+    if TEST_DATA_GENERATION:
+        # Now we're going to save some results for use in tests.
+        print ' Storing results for test use'
+        test_pickle_dir = 'Test_pickles/'
+        name = test_pickle_dir + R.name + 'test_pickle.p'
+        with open(name, 'wb') as pf:
+            pickle.dump([R, unks], pf)
+        quit()
+
+    final_groups = matching.matching_func(R.notation_collections, R.solution_nodes)
+    # # matching, now integrated into the latex report
+    # uncomment for debugging
+
+    # print "sorted final notation groups"
+    # for a_set in final_groups:
+    #    print a_set
+    output_solution_graph(R)
+    output_latex_solution(R, unks, final_groups)
+    op.output_python_code(R, final_groups)
+    oc.output_cpp_code(R, final_groups)
+
+    #################################################
+    # print out all eqnuations that used to solve variables
+
+    ikl.log.info('equations evaluated')
+    for one_unk in unks:
+        ikl.log.info('%s\n%s\n%s\n\n', one_unk.symbol, one_unk.eqntosolve,
+                     one_unk.secondeqn)
+
+    check_solution(robot, unks)
+    return [R, unks]
 
 
-################################################################################
 #
-#           Perform the Computation via ticking the BT
 #
+#
+################################################################################
 
-
-#  Off we go: tick the BT
-print "Ticking IK BT for ", R.name, " -------------------------\n\n"
-
-ikbt.tick("Test a full solver", bb)
-
-unks = bb.get('unknowns')
-Tm = bb.get('Tm')
-R = bb.get('Robot')
-
-
-if TEST_DATA_GENERATION:
-    # Now we're going to save some results for use in tests.
-    print ' Storing results for test use'
-    test_pickle_dir = 'Test_pickles/'
-    name = test_pickle_dir + R.name + 'test_pickle.p'
-    with open(name, 'wb') as pf:
-        pickle.dump([R, unks], pf)
-    quit()
+# define symbols that appear in solutions
+sp.var('r_11 r_12 r_13 r_21 r_22 r_23 r_31 r_32 r_33 Px Py Pz')
 
 
-final_groups = matching.matching_func(R.notation_collections, R.solution_nodes)
-# # matching, now integrated into the latex report
-# uncomment for debugging
+#  Test Assertions for known robots
+def check_solution(robot, unks):
+    ntests = 0
+    if(robot == 'Chair_Helper'):
+        fs = 'Chair_Helper   FAIL'
+        for u in unks:
+            print '\n Asserting: ', u.symbol, ' = ',
+            if(u.symbol == d_1):
+                ntests += 1
+                assert(u.nsolutions == 1), fs + ' n(d_1)'
+                print str(u.solutions[0])
+                assert(u.solutions[0] == Pz - l_4 * r_33), fs + '  [d_1]'
+            if(u.symbol == th_2):
+                ntests += 1
+                assert(u.nsolutions == 2), fs + ' n(th_2)'
+                print str(u.solutions[0]) + ', ' + str(u.solutions[1])
+                assert(u.solutions[0] == sp.asin(
+                    (Px - l_1 - l_4 * r_13) / l_2)), fs + ' [th_2a]'
+                assert(u.solutions[1] == -sp.asin((Px - l_1 -
+                                                   l_4 * r_13) / l_2) + sp.pi), fs + ' [th_2b]'
 
-# print "sorted final notation groups"
-# for a_set in final_groups:
-#    print a_set
-output_solution_graph(R)
-output_latex_solution(R, unks, final_groups)
-op.output_python_code(R, final_groups)
-oc.output_cpp_code(R, final_groups)
+    if(robot == 'Wrist'):
+        pass
 
+    fs = '\n         Warning: \n   No Assertions yet for ' + robot
+    if (robot == 'Puma') or (robot == 'Kuka'):
+        print fs
 
-#################################################
-# print out all eqnuations that used to solve variables
-# uncomment for debugging
+    string = 'test robot ' + robot
 
-print "equations evaluated"
-for one_unk in unks:
-    print one_unk.symbol
-    print one_unk.eqntosolve
-    print one_unk.secondeqn
-    print '\n'
+    print '\n\n\n                            ', string, '  PASSES \n\n\n'
 
 
 #
+#    Batch mode: solve each robot in turn with no debug output and no
+#      pauses.  A failure is reported and the run goes on to the next robot.
 #
+#     returns the number of robots which failed
 #
-################################################################################
-
-# define symbols that appear in solutions
-sp.var('r_11 r_12 r_13 r_21 r_22 r_23 r_31 r_32 r_33 Px Py Pz')
-
-ntests = 0
-if(robot == 'Chair_Helper'):
-    fs = 'Chair_Helper   FAIL'
-    for u in unks:
-        print '\n Asserting: ', u.symbol, ' = ',
-        if(u.symbol == d_1):
-            ntests += 1
-            assert(u.nsolutions == 1), fs + ' n(d_1)'
-            print str(u.solutions[0])
-            assert(u.solutions[0] == Pz - l_4 * r_33), fs + '  [d_1]'
-        if(u.symbol == th_2):
-            ntests += 1
-            assert(u.nsolutions == 2), fs + ' n(th_2)'
-            print str(u.solutions[0]) + ', ' + str(u.solutions[1])
-            assert(u.solutions[0] == sp.asin(
-                (Px - l_1 - l_4 * r_13) / l_2)), fs + ' [th_2a]'
-            assert(u.solutions[1] == -sp.asin((Px - l_1 -
-                                               l_4 * r_13) / l_2) + sp.pi), fs + ' [th_2b]'
-
-
-ntests = 0
-# Test Assertions
-if(robot == 'Wrist'):
-    pass
-
-fs = '\n         Warning: \n   No Assertions yet for ' + robot
-if (robot == 'Puma') or (robot == 'Kuka'):
-    print fs
-
-string = 'test robot ' + robot
-
-print '\n\n\n                            ', string, '  PASSES \n\n\n'
+def batch(robots):
+    ikl.quiet()
+    results = []
+    for robot in robots:
+        t0 = time.time()
+        try:
+            solve(robot, batch=True)
+            status = 'PASS'
+        except Exception as err:
+            status = 'FAIL  ' + err.__class__.__name__ + ': ' + str(err).strip()
+        results.append([robot, time.time() - t0, status])
+        print '{:15s} {:9.1f}s   {}'.format(*results[-1])
+    nfail = len([r for r in results if r[2] != 'PASS'])
+    print '\n\n           Batch summary: ', len(results) - nfail, ' of ', len(results), ' robots PASS\n'
+    for r in results:
+        print '     {:15s} {:9.1f}s   {}'.format(*r)
+    print ''
+    return nfail
+
+
+usage = """usage:  ikSolver.py [robot]
+        ikSolver.py --batch [robot ...]     (default: all robots in ik_robots.py)"""
+
+
+def main(args):
+    ikl.setup()      # solver output to stdout (batch() turns it down)
+    if len(args) > 0 and args[0] == '--batch':
+        robots = args[1:]
+        if len(robots) == 0:
+            robots = robot_list
+        exit(batch(robots) > 0)
+
+    if len(args) == 0:  # no argument - use default
+        #robot = 'Gomez'
+        #robot = 'Puma'
+        #robot = 'Chair_Helper'
+        #robot = 'Khat6DOF'
+        robot = 'Wrist'
+    elif len(args) == 1:
+        robot = str(args[0])
+    else:
+        print usage
+        exit(2)
+
+    if not TEST_DATA_GENERATION:
+        print ""
+        print "          Running IK solution "
+        print ""
+        print ""
+    else:
+        print '-' * 50
+        print ""
+        print "          Generating IKBT TEST DATA only "
+        print ""
+        print "          (for production: TEST_DATA_GENERATION = False)"
+        print ""
+        print '-' * 50
+
+    solve(robot)
+
+
+if __name__ == "__main__":
+    main(argv[1:])
@@ -30,8 +30,12 @@ import matching as mtch
 import sys as sys
 import b3 as b3          # behavior trees
 import pickle
+import hashlib
 from ikbtfunctions.helperfunctions import *
 import ikbtfunctions.graph2latex as gl
+from ikbtfunctions.cache_store import cache_store
+import ikbtfunctions.parallel_simplify as ps
+import ikbtfunctions.ik_logging as ikl
 #from kin_cl import *
 import kin_cl as kc
 
@@ -60,6 +64,26 @@ soa_expansions[th_56] = th_5 + th_6
 
 
 pprotocol = 2
+
+
+#
+#   Canonical key for the forward kinematics cache.
+#      FK results depend only on the DH table, the joint types (vv),
+#      the unknowns and the JACOBIAN setting -- not on the robot's name --
+#      so identical mechanisms share one cache entry and every DH
+#      variant gets its own.
+def fk_cache_key(dh, vv, unks):
+    parts = []
+    for r in range(0, dh.shape[0]):
+        for c in range(0, dh.shape[1]):
+            parts.append(sp.srepr(sp.S(dh[r, c])))
+    parts.append(str(list(vv)))
+    for u in unks:
+        parts.append(sp.srepr(u.symbol))
+    parts.append('JACOBIAN=' + str(kc.JACOBIAN))
+    return hashlib.sha1('|'.join(parts)).hexdigest()
+
+
 #
 #   retrieve forward kinematics from a pickle file if it exists.
 #      if it doesn't, compute the FK and store it in a pickle file.
@@ -69,49 +93,159 @@ def kinematics_pickle(rname, dh, constants, pvals, vv, unks, test):
     #
     #   Check for a pickle file of combined pre-computed Mech and Robot objects
     #
+    #   The per-key lock makes concurrent solver processes sharing fk_eqns/
+    #   wait for each other rather than compute the same FK twice.
 
-    pickle_dir = 'fk_eqns/'
-
-    if not os.path.isdir(pickle_dir):  # if this doesn't exist, create it.
-        print 'Creating a new pickle directory: ./' + pickle_dir
-        os.mkdir(pickle_dir)
-
-    name = pickle_dir + rname + '_pickle.p'
+    store = cache_store('fk_eqns/')
+    key = fk_entry_key(dh, vv, unks)
+    name = store.path(key)
 
     print 'kinematics pickle: trying to open ', name, ' in ', os.getcwd()
 
-    if(os.path.isfile(name)):
-        with open(name, 'rb') as pick:
-            print '\Trying to read pre-computed forward kinematics from ' + name
-            [m, R, unks] = pickle.load(pick)
+    with store.lock(key):
+        found = False
+        entry = store.load(key)
+        # guard against stale or colliding entries: recompute instead
+        if entry is not None and check_the_pickle(entry[0].DH, dh):
+            [m, R, unks] = entry
             print 'Successfully read pre-computed forward kinematics'
-    else:
-        # print 'WRONG - quitting, error: ',sys.exc_info()[0]
-        # sys.exit
-        # set up mechanism object instance
-        m = kc.mechanism(dh, constants, vv)
-        m.pvals = pvals  # store numerical values of parameters
-        print 'Did not find VALID stored pickle file: ', name
-        print "Starting Forward Kinematics"
-        m.forward_kinematics()
-        print "Completed Forward Kinematics"
-        print 'Starting Sum of Angles scan (slow!)'
-
-        # set up Robot Object instance
-        R = Robot(m, rname)              # set up IK structs etc
-        R.scan_for_equations(unks)       # generate equation lists
-        # R.sum_of_angles_transform(unks)  # find sum of angles
-
-        R.generate_solution_nodes(unks)  # generate solution nodes
-
-        print ' Storing results'
-        with open(name, 'wb') as pf:
-            pickle.dump([m, R, unks], pf, protocol=pprotocol)
+            found = True
+            m.pvals = pvals
+            R.name = rname    # entry may be shared with another robot name
+        if not found:
+            # set up mechanism object instance
+            m = kc.mechanism(dh, constants, vv)
+            m.pvals = pvals  # store numerical values of parameters
+            print 'Did not find VALID stored pickle file: ', name
+            print "Starting Forward Kinematics"
+            m.forward_kinematics()
+            print "Completed Forward Kinematics"
+            print 'Starting Sum of Angles scan (slow!)'
+
+            # set up Robot Object instance
+            R = Robot(m, rname)              # set up IK structs etc
+            R.scan_for_equations(unks)       # generate equation lists
+            # R.sum_of_angles_transform(unks)  # find sum of angles
+
+            R.generate_solution_nodes(unks)  # generate solution nodes
+
+            print ' Storing results'
+            store.store(key, [m, R, unks])
 
     return [m, R, unks]
 
 
-def check_the_pickle(dh1, dh2):   # check that two mechanisms have identical DH params
+# top of the repository (at import: __file__ may be relative to the cwd,
+#   and the tests change directory)
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+#
+#   Digest of source code: every .py file under dirs plus the given files
+#     (paths relative to the top of the repository)
+def source_digest(dirs, files=()):
+    root = REPO_ROOT
+    paths = []
+    for d in dirs:
+        for dirpath, dirnames, fnames in os.walk(os.path.join(root, d)):
+            for f in fnames:
+                if f.endswith('.py'):
+                    paths.append(os.path.join(dirpath, f))
+    paths += [os.path.join(root, f) for f in files]
+    h = hashlib.sha1()
+    for f in sorted(paths):
+        if os.path.isfile(f):
+            h.update(os.path.relpath(f, root))
+            with open(f, 'rb') as fh:
+                h.update(fh.read())
+    return h.hexdigest()
+
+
+#
+#   Digest of the source code that the solve pipeline depends on
+#     (equation classes, BT leaves and BT engine, and the top level
+#     solver script).  Code generation (ikbtfunctions/output_*.py) is
+#     deliberately left out so that only regenerating code never
+#     invalidates a checkpoint.
+def solver_source_digest():
+    return source_digest(['ikbtbasics', 'ikbtleaves', 'b3'], ['ikSolver.py'])
+
+
+#
+#   Key of the forward kinematics entry in fk_eqns/: fk_cache_key() and a
+#     digest of the code which computes the entry (the mechanism and Robot
+#     classes and the equation scan), so changing that code recomputes the
+#     FK but changing a BT leaf does not.
+def fk_entry_key(dh, vv, unks):
+    digest = source_digest(['ikbtbasics'], ['ikbtfunctions/helperfunctions.py'])
+    return hashlib.sha1(fk_cache_key(dh, vv, unks) + '|fk|' + digest).hexdigest()
+
+
+#
+#   Run a chain of solve pipeline stages with a checkpoint after each one.
+#
+#     stages:     list of (name, function) pairs.  Each function takes the
+#                 state returned by the previous stage and returns the new
+#                 state (which must be picklable).
+#     base_key:   key of the state before the first stage (e.g. fk_cache_key())
+#     start:      function returning the initial state.  Only called if no
+#                 stage has been checkpointed yet.
+#     store:      a cache_store, or None to just run the stages.
+#     keep:       function of a stage's result, False if it must not be
+#                 stored (e.g. it was cut short by a time budget).  The
+#                 stages after it are not stored either.
+#
+#   Stage keys are chained: each is a hash of the previous stage's key,
+#   the stage name and the solver source digest.  The pipeline resumes
+#   after the deepest stage found in the store.
+def run_checkpointed(stages, base_key, start, store=None, keep=None):
+    if store is None:
+        state = start()
+        for (sname, f) in stages:
+            state = f(state)
+        return state
+
+    digest = solver_source_digest()
+    keys = []
+    key = base_key
+    for (sname, f) in stages:
+        key = hashlib.sha1(key + '|' + sname + '|' + digest).hexdigest()
+        keys.append(key)
+
+    # find the deepest stored checkpoint
+    first = 0
+    state = None
+    for n in range(len(stages) - 1, -1, -1):
+        state = store.load(keys[n])
+        if state is not None:
+            ikl.log.info('run_checkpointed: resuming after stage: %s', stages[n][0])
+            first = n + 1
+            break
+    if first == 0:
+        state = start()
+
+    for n in range(first, len(stages)):
+        with store.lock(keys[n]):
+            result = store.load(keys[n])  # another process may have done it
+            if result is None:
+                ikl.log.info('run_checkpointed: running stage: %s', stages[n][0])
+                result = stages[n][1](state)
+                if keep is not None and not keep(result):
+                    ikl.log.info('run_checkpointed: not stored: %s', stages[n][0])
+                    store = None
+                else:
+                    store.store(keys[n], result)
+        state = result
+        if store is None:   # (run the rest without checkpoints)
+            for (sname, f) in stages[n + 1:]:
+                state = f(state)
+            break
+    return state
+
+
+# check that two mechanisms have identical DH params
+#   returns True if they match.  A mismatch is reported but is not fatal.
+def check_the_pickle(dh1, dh2):
     flag = False
     if (dh1.shape[0] != dh2.shape[0]):
         print '   Wrong number of rows!'
@@ -124,10 +258,9 @@ def check_the_pickle(dh1, dh2):   # check that two mechanisms have identical DH
     if(flag):
         print '\n\n  -----------------------------------------------------'
         print '                    DH parameters Differ '
-        print '                 Pickle file is out of date. '
-        print '                   please remove it and start again'
+        print '              Ignoring out of date pickle entry. '
         print '  -----------------------------------------------------'
-        quit()
+    return not flag
 
 # retrieve thxy from thx, thy
 
@@ -154,13 +287,15 @@ class Robot:
         self.params = []  # constant dh params such as l_4 etc.
         self.solution_nodes = []  # first one is the root, by solve order
         self.variables_symbols = []
-        self.notation_graph = set()  # solution nodes notation graph
+        self.notation_graph = edge_set()  # solution nodes notation graph
         self.notation_collections = []  # solution notations divided into subgroups
 
         self.min_index = 0
         self.max_index = 0
         self.mequation_list = []        # all the 4x4 Matrix FK equations
         self.kequation_aux_list = []    # kequations: such as eg th_23 = th_2+th_3
+        self.reset_equation_index()     # see scan_for_equations()
+        self.reset_soa_memo()           # see sum_of_angles_transform()
 
         if(Mech != None):    # in testing situations we only need a "Robot" to keep track of solutions above
             self.Mech = Mech
@@ -182,7 +317,7 @@ class Robot:
             #
             #  build up the equations to solve:
             self.mequation_list = Mech.get_mequation_set()  # all the Matrix FK equations
-            print 'ik_classes: length Robot.mequation_list: ', len(self.mequation_list)
+            ikl.log.info('ik_classes: length Robot.mequation_list: %d', len(self.mequation_list))
 
     def generate_solution_nodes(self, unknowns):
         '''generate solution nodes'''
@@ -190,48 +325,96 @@ class Robot:
             self.solution_nodes.append(Node(unk))
             self.variables_symbols.append(unk.symbol)
 
-        print self.solution_nodes
-        print self.variables_symbols
+        ikl.log.debug('%s', self.solution_nodes)
+        ikl.log.debug('%s', self.variables_symbols)
 
     # get lists of unsolved equations having 1 and 2 unks
     # class Robot:
+    #
+    #   This runs on every pass of updateL, so it works incrementally:
+    #     self.eqn_cache[(k,i,j)] = [kequation, LHS unk symbols, RHS unk symbols, n]
+    #         for entry (i,j) of matrix equation k, n = number of unsolved unks
+    #     self.eqn_index[symbol] = set of (k,i,j) entries containing symbol
+    #   Only entries whose expressions changed (e.g. by a transform) or which
+    #   contain an unknown solved since the last scan are re-examined.
     def scan_for_equations(self, variables):
         self.l1 = []  # equations with one unk nown (if any)
         self.l2 = []  # equations with two unknowns
         self.l3p = []  # 3 OR MORE unknowns
         sp.var('x')  # this will be used to generate 'algebraic zero'
         assert (len(self.mequation_list) > 0), '  not enough equations '
-        for eqn in self.mequation_list:
+        vsyms = [v.symbol for v in variables]
+        solved = set([v.symbol for v in variables if v.solved])
+        if not hasattr(self, 'eqn_cache') or not self.eqn_vars.issubset(set(vsyms)):
+            self.reset_equation_index()   # (older pickle or unknowns removed)
+        new_vars = [v for v in vsyms if v not in self.eqn_vars]
+        touched = set()  # entries to reclassify
+        for v in solved.symmetric_difference(self.eqn_solved):
+            touched.update(self.eqn_index.get(v, set()))
+        seen = set()
+        # hash indexed sets so duplicate checks are not quadratic
+        s1 = kc.kequation_set()
+        s2 = kc.kequation_set()
+        s3p = kc.kequation_set()
+        for k in range(len(self.mequation_list)):
+            eqn = self.mequation_list[k]
             lhs = eqn.Td  # 4x4 matrix
             rhs = eqn.Ts  # 4x4 matrix
             for i in [0, 1, 2, 3]:
                 for j in range(0, 4):
+                    key = (k, i, j)
+                    seen.add(key)
                     lh1x1 = lhs[i, j]
                     rh1x1 = rhs[i, j]
-                    n = count_unknowns(variables, lh1x1) + \
-                        count_unknowns(variables, rh1x1)
-                    e1 = kc.kequation(lh1x1, rh1x1)
+                    c = self.eqn_cache.get(key)
+                    if c is None or not (c[0].LHS == lh1x1 and c[0].RHS == rh1x1):
+                        if c is not None:
+                            self._unindex_entry(key)
+                        lfs = free_symbols(lh1x1)
+                        rfs = free_symbols(rh1x1)
+                        c = [kc.kequation(lh1x1, rh1x1),
+                             set([v for v in vsyms if v in lfs]),
+                             set([v for v in vsyms if v in rfs]), 0]
+                        self.eqn_cache[key] = c
+                        self._index_entry(key, c[1] | c[2])
+                        touched.add(key)
+                    else:
+                        lfs = free_symbols(c[0].LHS)
+                        rfs = free_symbols(c[0].RHS)
+                        for v in new_vars:    # e.g. new sum of angles unknowns
+                            lh = v in lfs
+                            rh = v in rfs
+                            if lh:
+                                c[1].add(v)
+                            if rh:
+                                c[2].add(v)
+                            if lh or rh:
+                                self._index_entry(key, [v])
+                                touched.add(key)
+                    if key in touched:
+                        c[3] = len(c[1] - solved) + len(c[2] - solved)
+                    n = c[3]
+                    e1 = c[0]
+                    # only append if not already there
                     if(n == 1):
-                        flag = False
-
-                        if e1 not in self.l1:
-                            # only append if not already there
-                            self.l1.append(e1)
+                        s1.add(e1)
                     if(n == 2):
-                        flag = False
-
-                        if e1 not in self.l2:
-                            # only append if not already there
-                            self.l2.append(e1)
+                        s2.add(e1)
                     if(n > 2):
-
-                        if e1 not in self.l3p:
-                            # only append if not already there
-                            self.l3p.append(e1)
+                        s3p.add(e1)
+        for key in self.eqn_cache.keys():   # matrix equations were removed
+            if key not in seen:
+                self._unindex_entry(key)
+                del self.eqn_cache[key]
+        self.eqn_vars = set(vsyms)
+        self.eqn_solved = solved
+        self.l1 = list(s1)
+        self.l2 = list(s2)
+        self.l3p = list(s3p)
         for e in self.kequation_aux_list:
             lhs = e.LHS
             rhs = e.RHS
-            n = count_unknowns(variables, lhs) + count_unknowns(variables, rhs)
+            n = e.count_unknowns(variables)
             if(n == 1):
                 # change from 0, rhs-lhs !!  ************
                 self.l1.append(kc.kequation(lhs, rhs))
@@ -245,6 +428,22 @@ class Robot:
         return [self.l1, self.l2, self.l3p]
         # end of scan_for_eqns
 
+    # forget the incremental state used by scan_for_equations()
+    def reset_equation_index(self):
+        self.eqn_cache = {}
+        self.eqn_index = {}
+        self.eqn_vars = set()
+        self.eqn_solved = set()
+
+    def _index_entry(self, key, symbols):
+        for v in symbols:
+            self.eqn_index.setdefault(v, set()).add(key)
+
+    def _unindex_entry(self, key):
+        c = self.eqn_cache[key]
+        for v in c[1] | c[2]:
+            self.eqn_index[v].discard(key)
+
 #
 #   Get equation lists from just a matrix equation
 #     (this is used when generating tests NOT from DH params
@@ -252,6 +451,8 @@ class Robot:
     def scan_Mequation(self, Meqn, variables):
         self.l1 = []
         self.l2 = []
+        s1 = kc.kequation_set()
+        s2 = kc.kequation_set()
         for eqn in Meqn.get_kequation_list():
             lh1x1 = eqn.LHS  # 4x4 matrix
             rh1x1 = eqn.RHS  # 4x4 matrix
@@ -260,90 +461,145 @@ class Robot:
             # e1 = kequation(lh1x1, rh1x1) # change from 0,rh1x1-lh1x1 **********
             e1 = eqn
             if(n == 1):
-                flag = False
-                if e1 not in self.l1:
-
-                    self.l1.append(e1)   # only append if not already there
+                s1.add(e1)   # only append if not already there
             if(n == 2):
-                flag = False
-
-                if e1 not in self.l2:
-                    self.l2.append(e1)    # only append if not already there
+                s2.add(e1)    # only append if not already there
+        self.l1 = list(s1)
+        self.l2 = list(s2)
         # sort the equations (in place) so solvers get preferred eqns first
         self.l1 = erank(self.l1)
         self.l2 = erank(self.l2)
         return [self.l1, self.l2]
 
     # identify sum of angles terms and transform them to new variable
+    #
+    #   This runs again on every updateL tick but usually few entries have
+    #   changed since.  self.soa_done[(k,i,j)] holds the entry we left in
+    #   place last time; if nobody has replaced it since, and the last
+    #   transform found no sum of angles in it, it is skipped (it is fully
+    #   reduced).  soa_entry() replaces only one sum per side, so an entry
+    #   where it found one is transformed again on the next pass, like any
+    #   other.  Entries are looked up in self.soa_memo (keyed on the
+    #   expressions) before being simplified.
     def sum_of_angles_transform(self, variables):
+        if not hasattr(self, 'soa_done'):   # (Robot from an older pickle)
+            self.reset_soa_memo()
 
-        unkn_sums_sym = set()  # keep track of joint variable symbols
-
-        thx = sp.Wild('thx')
-        thy = sp.Wild('thy')
-        sgn = sp.Wild('sgn')
-
-        success_flag = False
+        # simplify all the new entries at once (in parallel)
+        todo = []
+        for k in range(0, len(self.mequation_list)):
+            Meq = self.mequation_list[k]
+            for i in [0, 1, 2]:
+                for j in [0, 1, 2, 3]:
+                    lhs = Meq.Td[i, j]
+                    rhs = Meq.Ts[i, j]
+                    if self.soa_stale(k, i, j, lhs, rhs):
+                        if (lhs, rhs) not in self.soa_memo:
+                            todo += [lhs, rhs]
+        simplified = dict(zip(todo, ps.simplify_all(todo)))
 
         for k in range(0, len(self.mequation_list)):
             Meq = self.mequation_list[k]  # get next matrix equation
 
             for i in [0, 1, 2]:   # only first three rows are interesting
                 for j in [0, 1, 2, 3]:
-                    # simplfy with lasting effect
-                    # simplify should catch c1s2+s1c2 etc. (RHS)
-                    Meq.Ts[i, j] = sp.simplify(Meq.Ts[i, j])
-                    # simplify should catch c1s2+s1c2 etc. (LHS)
-                    Meq.Td[i, j] = sp.simplify(Meq.Td[i, j])
-
                     lhs = Meq.Td[i, j]
                     rhs = Meq.Ts[i, j]
+                    done = self.soa_done.get((k, i, j))
+                    if self.soa_stale(k, i, j, lhs, rhs):
+                        key = (lhs, rhs)
+                        if key not in self.soa_memo:
+                            new = self.soa_entry(lhs, rhs, simplified)
+                            self.soa_memo[key] = new
+                            if len(new[2]) == 0:
+                                # fully reduced: the result is its own transform
+                                self.soa_memo[(new[0], new[1])] = new
+                        new = self.soa_memo[key]
+                        sums = new[2]
+                        if done is not None and done[0] is lhs and done[1] is rhs:
+                            sums = done[2] + sums    # (another pass on it)
+                        # simplfy and substitute with lasting effect
+                        Meq.Td[i, j] = new[0]
+                        Meq.Ts[i, j] = new[1]
+                        done = (Meq.Td[i, j], Meq.Ts[i, j], sums, len(new[2]) == 0)
+                        self.soa_done[(k, i, j)] = done
+                    for [th_xy, sumexpr] in done[2]:
+                        self.soa_add_variable(th_xy, sumexpr, variables)
+
+    # True if entry (k,i,j), now lhs = rhs, has to be transformed (again)
+    def soa_stale(self, k, i, j, lhs, rhs):
+        done = self.soa_done.get((k, i, j))
+        return done is None or done[0] is not lhs or done[1] is not rhs \
+            or not done[3]
+
+    def reset_soa_memo(self):
+        self.soa_done = {}
+        self.soa_memo = {}
+
+    # sum of angles transform of one matrix equation entry
+    #   returns [new lhs, new rhs, [[th_xy, thx+/-thy], ...]]
+    #   simplified: dict of already simplified expressions (optional)
+    def soa_entry(self, lhs, rhs, simplified={}):
+        thx = sp.Wild('thx')
+        thy = sp.Wild('thy')
+        sgn = sp.Wild('sgn')
 
-                    for expr in [lhs, rhs]:
-                        # returns a subset of expressions with the quary pattern, this finds sin(thx) too
-                        sub_sin = expr.find(sp.sin(thx + sgn * thy))
-                        sub_cos = expr.find(sp.cos(thx + sgn * thy))
-
-                        found = False
-                        while len(sub_sin) > 0 and not found:
-                            sin_expr = sub_sin.pop()
-                            d = sin_expr.match(sp.sin(thx + sgn * thy))
-                            if d[thx] != 0 and d[sgn] != 0 and d[thy] != 0:  # has to be joint variable
-                                found = True
-
-                        while len(sub_cos) > 0 and not found:
-                            cos_expr = sub_cos.pop()
-                            d = cos_expr.match(sp.cos(thx + sgn * thy))
-                            if d[thx] != 0 and d[sgn] != 0 and d[thy] != 0:
-                                found = True
-
-                        if found:
-                            # print 'SoA: found ', sin_expr, ' in ', expr
-                            success_flag = True
-                            th_xy = find_xy(d[thx], d[thy])
-                            # if not exists in the unknown list (this requires proper hashing), create variable
-                            exists = False
-                            for v in variables:
-                                if v.symbol == th_xy:
-                                    exists = True
-                            if not exists:
-                                print "found new 'joint' (sumofangle) variable: ", th_xy
-                                #  try moving soa equation to Tm.auxeqns
-                                # unkn_sums_sym.add(th_xy) #add into the joint variable set
-                                newjoint = unknown(th_xy)
-                                newjoint.solved = False  # just to be clear
-                                # add it to unknowns list
-                                variables.append(newjoint)
-                                tmpeqn = kc.kequation(
-                                    th_xy, d[thx] + d[sgn] * d[thy])
-                                print 'sumofanglesT: appending ', tmpeqn
-                                self.kequation_aux_list.append(tmpeqn)
-                                print d[thx] + d[sgn] * d[thy]
-                            # substitute all thx +/- thy expression with th_xy
-                            self.mequation_list[k].Td[i, j] = Meq.Td[i, j].subs(
-                                d[thx] + d[sgn] * d[thy], th_xy)
-                            self.mequation_list[k].Ts[i, j] = Meq.Ts[i, j].subs(
-                                d[thx] + d[sgn] * d[thy], th_xy)
+        sums = []
+        # simplify should catch c1s2+s1c2 etc. (RHS)
+        if rhs in simplified:
+            rhs = simplified[rhs]
+        else:
+            rhs = sp.simplify(rhs)
+        # simplify should catch c1s2+s1c2 etc. (LHS)
+        if lhs in simplified:
+            lhs = simplified[lhs]
+        else:
+            lhs = sp.simplify(lhs)
+        newlhs = lhs
+        newrhs = rhs
+
+        for expr in [lhs, rhs]:
+            # returns a subset of expressions with the quary pattern, this finds sin(thx) too
+            sub_sin = expr.find(sp.sin(thx + sgn * thy))
+            sub_cos = expr.find(sp.cos(thx + sgn * thy))
+
+            found = False
+            while len(sub_sin) > 0 and not found:
+                sin_expr = sub_sin.pop()
+                d = sin_expr.match(sp.sin(thx + sgn * thy))
+                if d[thx] != 0 and d[sgn] != 0 and d[thy] != 0:  # has to be joint variable
+                    found = True
+
+            while len(sub_cos) > 0 and not found:
+                cos_expr = sub_cos.pop()
+                d = cos_expr.match(sp.cos(thx + sgn * thy))
+                if d[thx] != 0 and d[sgn] != 0 and d[thy] != 0:
+                    found = True
+
+            if found:
+                # print 'SoA: found ', sin_expr, ' in ', expr
+                th_xy = find_xy(d[thx], d[thy])
+                sums.append([th_xy, d[thx] + d[sgn] * d[thy]])
+                # substitute all thx +/- thy expression with th_xy
+                newlhs = newlhs.subs(d[thx] + d[sgn] * d[thy], th_xy)
+                newrhs = newrhs.subs(d[thx] + d[sgn] * d[thy], th_xy)
+        return [newlhs, newrhs, sums]
+
+    # make sure a sum of angles variable is in the unknowns
+    def soa_add_variable(self, th_xy, sumexpr, variables):
+        # if not exists in the unknown list (this requires proper hashing), create variable
+        for v in variables:
+            if v.symbol == th_xy:
+                return
+        ikl.log.info("found new 'joint' (sumofangle) variable: %s", th_xy)
+        #  try moving soa equation to Tm.auxeqns
+        newjoint = unknown(th_xy)
+        newjoint.solved = False  # just to be clear
+        # add it to unknowns list
+        variables.append(newjoint)
+        tmpeqn = kc.kequation(th_xy, sumexpr)
+        ikl.log.info('sumofanglesT: appending %s', tmpeqn)
+        self.kequation_aux_list.append(tmpeqn)
 
 # class kequation()       now moved to kin_cl.py
 
@@ -399,13 +655,12 @@ class unknown(object):
                                                  #  and update the solution tree
         self.solved = True
         self.readytosolve = False
-        print '\n\n'
-        print 'set_solved: ', self.symbol, '      by: ', self.solvemethod
+        ikl.log.info('\n\nset_solved: %s      by: %s', self.symbol, self.solvemethod)
         # print '            ', self.eqntosolve
         fs = 'set_solved: solutions empty '
         assert(len(self.solutions) >= 1), fs
         assert(self.nsolutions > 0), fs
-        print '            ', self.symbol, '=', self.solutions[0], '\n\n'
+        ikl.log.info('             %s = %s\n\n', self.symbol, self.solutions[0])
         # print 'Robot instance.name: ', R.name      # shouldn't change!!
         #########################################
         #
@@ -431,10 +686,8 @@ class unknown(object):
             if sol_node.symbol == self.symbol:
                 curr_node = sol_node
 
-        print ' -  - - - - '
-        print R.solution_nodes
-        print 'Trying to find: ',  self.symbol
-        print ' - - - - - '
+        ikl.log.debug(' -  - - - - \n%s\nTrying to find: %s\n - - - - - ',
+                      R.solution_nodes, self.symbol)
         assert(curr_node is not None), ' Trouble finding solution tree node'
 
         curr_node.solveorder = R.solveN
@@ -455,7 +708,7 @@ class unknown(object):
         curr_node.detect_parent(R)
         curr_node.generate_notation(R)
         # curr_node.generate_solutions(R)
-        print 'finish set_solved', self.symbol
+        ikl.log.debug('finish set_solved %s', self.symbol)
 
     def scan(self, MatEqn):        # find list of kequations containing this UNK
         self.eqnlist = []   # reset eqn list
@@ -476,6 +729,108 @@ class unknown(object):
         self.eqnlist = erank(self.eqnlist)  # sort them in place
 
 
+#
+#   Put the equation lists on the blackboard, with an index of them:
+#     'eqns_index'[symbol] = (version, eqns, symbols) for the eqns of L1
+#     and L2 which contain symbol, and all the symbols in them.  An entry's
+#     version changes only when its eqns change ('eqns_version' counts
+#     the changes), so leaves can tell whether the equations of an unknown
+#     are the same as at their last tick (see id_leaf below).  The trig
+#     flags of each equation's unknowns (kequation.features()) are worked
+#     out here too, so the ID leaves only look them up.
+#
+def set_eqn_lists(bb, L1, L2, L3p):
+    eqns = {}
+    unks = set([u.symbol for u in bb.get('unknowns') or []])
+    for e in L1 + L2:
+        f = e.features()    # (the trig flags the ID leaves look up)
+        for s in e.free_symbols():
+            eqns.setdefault(s, []).append(e)
+            if s in unks:
+                f.trig(s)
+    old = bb.get('eqns_index') or {}
+    version = bb.get('eqns_version') or 0
+    index = {}
+    for s in eqns:
+        sig = tuple((e.LHS, e.RHS) for e in eqns[s])
+        if s in old and old[s][1] == sig:
+            index[s] = old[s]
+        else:
+            version += 1
+            syms = set()
+            for e in eqns[s]:
+                syms |= e.free_symbols()
+            index[s] = (version, sig, frozenset(syms))
+    bb.set('eqns_version', version)
+    bb.set('eqns_index', index)
+    bb.set('eqns_1u', L1)   # eqns w/ 1 unknown
+    bb.set('eqns_2u', L2)   # eqns w/ 2 unknowns
+    bb.set('eqns_3pu', L3p)  # eqns w/ 3 or more unknowns
+
+
+#
+#   Progress of the solver: the state of the unknowns and the version of
+#     the equations.  'tried' is (progress, symbols of the unknowns given
+#     to the solvers since progress was last different); see stall_detect
+#     in comp_detect.py.
+#
+def solver_progress(bb):
+    return (tuple((u.symbol, u.solved, u.solvable_tan, u.solvable_sincos)
+                  for u in bb.get('unknowns')), bb.get('eqns_version'))
+
+
+def note_tried(bb, u):
+    p = solver_progress(bb)
+    tried = bb.get('tried')
+    if tried is None or tried[0] != p:
+        tried = (p, set())
+        bb.set('tried', tried)
+    tried[1].add(u.symbol)
+
+
+#
+#   Base class for the ID leaves (tan_id, sincos_id, ...)
+#
+#     An ID leaf looks only at the eqns (in L1, L2) of the current unknown
+#     and at which of their unknowns are solved, and its FAILURE changes
+#     nothing.  So once it has FAILED for an unknown it will keep failing
+#     until one of those changes: remember the failures and answer
+#     repeats at once.  (No memo when the lists were set without
+#     set_eqn_lists().)
+#
+#     id_leaf is abstract: a subclass implements identify(tick), which
+#     does the work of its tick(), and leaves tick() (the memo) to id_leaf.
+#
+class id_leaf(b3.Action):
+    memo = True
+
+    def memo_key(self, bb):
+        index = bb.get('eqns_index')
+        if not self.memo or index is None:
+            return None
+        u = bb.get('curr_unk')
+        (version, sig, syms) = index.get(u.symbol, (0, (), frozenset()))
+        return (u.symbol, u.solved, u.solvable_tan, u.solvable_sincos,
+                version, tuple(v.solved for v in bb.get('unknowns')
+                               if v.symbol in syms))
+
+    def tick(self, tick):
+        bb = tick.blackboard
+        key = self.memo_key(bb)
+        failed = bb.get('id_failures', tick.tree.id, self.id)
+        if failed is None:
+            failed = set()
+            bb.set('id_failures', failed, tick.tree.id, self.id)
+        if key is not None and key in failed:
+            self.log(ikl.DEBUG, '%s: %s failed before (memo)',
+                     self.Name, key[0])
+            return b3.FAILURE
+        status = self.identify(tick)
+        if key is not None and status == b3.FAILURE:
+            failed.add(key)
+        return status
+
+
 # matrix_equation class moved to kin_cl.py
 
 
@@ -678,7 +1033,7 @@ def erank(list_L):    # rearrange list of eqns by length
     sorted_ls = []
     list_d = {}
     for e in list_L:
-        count = int(sp.count_ops(e.RHS)) + int(sp.count_ops(e.LHS))
+        count = e.count_ops()
         if count not in list_d.keys():
             list_d[count] = []
         list_d[count].append(e)
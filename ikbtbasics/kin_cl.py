@@ -44,14 +44,162 @@ JACOBIAN = True  # False = disable velocity calculations for FK speed
 sp.init_printing()
 sp.var('x')
 
+#
+#   What the ID leaves look for in an equation, 0 = RHS - LHS
+#
+#     tan_id, sincos_id, sinandcos_id, algebra_id, simu_id and x2z2 all ask
+#     the same questions about the same equations, tick after tick: which
+#     symbols are in it, whether sin(u) and/or cos(u) are, and the
+#     coefficients of sin(u) and cos(u).  Each is answered (by walking the
+#     expression) once per equation and symbol, and kept here.  Get them
+#     with kequation.features(): equations with the same LHS and RHS share
+#     one eqn_features (up to EQN_FEATURES_MAX of them).
+#
+#     trig(s):        flags, see trig_flags
+#     tan_form(s, f): (expr collected in sin(s), cos(s),
+#                      its match to Aw*f(s) + Bw),  f = sp.sin or sp.cos
+#     sincos_form(s): (expr expanded, ... then collected in sin(s), cos(s),
+#                      coefficient of sin(s), of cos(s), the rest)
+#     algebra_form(s): expr expanded and collected in s
+#
+EQN_FEATURES_MAX = 20000
+eqn_features_cache = {}
+
+_Aw = sp.Wild("Aw")
+_Bw = sp.Wild("Bw")
+
+
+class trig_flags(object):
+    __slots__ = ('sin', 'cos', 'sin_sides', 'cos_sides', 'plain')
+
+    def __init__(self, f, s):
+        self.sin = f.expr.has(sp.sin(s))          # (in RHS - LHS)
+        self.cos = f.expr.has(sp.cos(s))
+        self.sin_sides = f.LHS.has(sp.sin(s)) or f.RHS.has(sp.sin(s))
+        self.cos_sides = f.LHS.has(sp.cos(s)) or f.RHS.has(sp.cos(s))
+        # s appears, but not in sin(s) or cos(s) (on either side)
+        self.plain = (s in f.side_symbols and not self.sin_sides and
+                      not self.cos_sides)
+
+
+class eqn_features(object):
+    def __init__(self, LHS, RHS):
+        self.LHS = sp.sympify(LHS)
+        self.RHS = sp.sympify(RHS)
+        self.expr = self.RHS - self.LHS
+        self.symbols = hf.free_symbols(self.expr)
+        self.side_symbols = hf.free_symbols(LHS) | hf.free_symbols(RHS)
+        self._trig = {}
+        self._forms = {}
+
+    def trig(self, s):
+        try:
+            return self._trig[s]
+        except KeyError:
+            t = self._trig[s] = trig_flags(self, s)
+            return t
+
+    def _form(self, key, make):
+        try:
+            return self._forms[key]
+        except KeyError:
+            form = self._forms[key] = make()
+            return form
+
+    def expanded(self):
+        return self._form('expand', self.expr.expand)
+
+    def tan_form(self, s, f):
+        def make():
+            c = self._form(('collect', s), lambda: self.expr.collect(
+                [sp.sin(s), sp.cos(s)]))
+            return (c, c.match(_Aw * f(s) + _Bw))
+        return self._form(('tan', s, f), make)
+
+    def sincos_form(self, s):
+        def make():
+            ex = self.expanded()
+            es = ex.collect(sp.sin(s)).collect(sp.cos(s))
+            A = es.coeff(sp.sin(s))
+            B = es.coeff(sp.cos(s))
+            return (ex, es, A, B, es - A * sp.sin(s) - B * sp.cos(s))
+        return self._form(('sincos', s), make)
+
+    def algebra_form(self, s):
+        return self._form(('algebra', s), lambda: self.expanded().collect(s))
+
+
+def features(LHS, RHS):
+    key = (LHS, RHS)
+    try:
+        return eqn_features_cache[key]
+    except KeyError:
+        pass
+    if len(eqn_features_cache) > EQN_FEATURES_MAX:
+        eqn_features_cache.clear()
+    f = eqn_features_cache[key] = eqn_features(LHS, RHS)
+    return f
+
+
 #  Kinematic Equation class
 
 
-class kequation:
+class kequation(object):
+    # kequations are created and re-ranked constantly, so keep them small
+    #   and compute the string, hash and op count only when first needed.
+    __slots__ = ('LHS', 'RHS', '_string', '_hash', 'nops', 'fsyms', 'feats')
+
     def __init__(self, LHS=x, RHS=x):
         self.LHS = LHS
         self.RHS = RHS
-        self.string = str(LHS) + ' = ' + str(RHS)
+        self._string = None
+        self._hash = None
+        self.nops = None    # cached count_ops(), see count_ops()
+        self.fsyms = None   # cached free symbols, see free_symbols()
+        self.feats = None   # see features()
+
+    # pickle just the equation (and read old style pickles)
+    def __getstate__(self):
+        return (self.LHS, self.RHS)
+
+    def __setstate__(self, state):
+        if isinstance(state, dict):
+            state = (state['LHS'], state['RHS'])
+        self.__init__(state[0], state[1])
+
+    def get_string(self):
+        if self._string is None:
+            self._string = str(self.LHS) + ' = ' + str(self.RHS)
+        return self._string
+
+    def set_string(self, s):
+        self._string = s
+
+    string = property(get_string, set_string)
+
+    # all free symbols of the equation (computed once)
+    def free_symbols(self):
+        if self.fsyms is None:
+            self.fsyms = hf.free_symbols(self.LHS) | hf.free_symbols(self.RHS)
+        return self.fsyms
+
+    # the eqn_features of this equation (for the ID leaves)
+    def features(self):
+        if self.feats is None:
+            self.feats = features(self.LHS, self.RHS)
+        return self.feats
+
+    # sp.count_ops() of LHS plus RHS (computed once), used to rank equations
+    def count_ops(self):
+        if self.nops is None:
+            self.nops = int(sp.count_ops(self.RHS)) + int(sp.count_ops(self.LHS))
+        return self.nops
+
+    # number of unsolved unknowns in LHS plus number in RHS
+    #   (same as count_unknowns(unknowns, LHS) + count_unknowns(unknowns, RHS))
+    def count_unknowns(self, unknowns):
+        return hf.count_unknowns(unknowns, self.LHS) + \
+            hf.count_unknowns(unknowns, self.RHS)
 
     def prt(self):
         print self.LHS, ' = ', self.RHS
@@ -75,7 +223,9 @@ class kequation:
             return False
 
     def __hash__(self):
-        return hash(str(self.LHS) + str(self.RHS))
+        if self._hash is None:
+            self._hash = hash(str(self.LHS) + str(self.RHS))
+        return self._hash
 
     def LaTexOutput(self, align=False):
         tmp = sp.latex(self.RHS)
@@ -96,6 +246,47 @@ class kequation:
         return tmp
 
 
+#
+#   A set of kequations with fast duplicate detection.
+#
+#     kequation.__eq__ subtracts sympy expressions, so testing 'e not in list'
+#     costs a symbolic comparison against every equation already in the list.
+#     Here equations are bucketed by the structural (sympy) hash of LHS and
+#     RHS and the symbolic comparison is only done within a bucket.
+#
+class kequation_set:
+    def __init__(self, eqns=[]):
+        self.buckets = {}
+        self.eqns = []    # in order added
+        for e in eqns:
+            self.add(e)
+
+    def key(self, e):
+        return hash((e.LHS, e.RHS))
+
+    # add e, return True if it was not already in the set
+    def add(self, e):
+        bucket = self.buckets.setdefault(self.key(e), [])
+        for e2 in bucket:
+            if e2 == e:
+                return False
+        bucket.append(e)
+        self.eqns.append(e)
+        return True
+
+    def __contains__(self, e):
+        for e2 in self.buckets.get(self.key(e), []):
+            if e2 == e:
+                return True
+        return False
+
+    def __len__(self):
+        return len(self.eqns)
+
+    def __iter__(self):
+        return iter(self.eqns)
+
+
 class matrix_equation:
     def __init__(self, Td=sp.zeros(4), Ts=sp.zeros(4)):
         self.Td = sp.zeros(4)  # LHS (T desired)
@@ -142,6 +333,8 @@ class mechanism:
         ])
         # a place to store numerical Jacobian
         self.jnum = np.matrix(np.zeros(36).reshape(6, 6))
+        # shared products of the link transforms (see chain_product())
+        self.chain_cache = {}
 
     # compute kinematic transforms and equations for the manipulator (including Jacobian)
     def forward_kinematics(self):
@@ -175,14 +368,16 @@ class mechanism:
         self.T_56 = Link_S(self.DH[5, al], self.DH[5, a],
                            self.DH[5, d], self.DH[5, th])
 
-        #  here is the full FK derivation:
-        self.T_06 = sp.trigsimp(
-            self.T_01 * self.T_12 * self.T_23 * self.T_34 * self.T_45 * self.T_56)
-
         # list of T_ij matrices (used in inverse kinematics update
         self.Ts = [self.T_01, self.T_12, self.T_23,
                    self.T_34, self.T_45, self.T_56]
 
+        # link transforms changed: forget any previous chain products
+        self.chain_cache = {}
+
+        #  here is the full FK derivation (shared with get_mequation_set()):
+        self.T_06 = sp.trigsimp(self.chain_product('suffix', 0))
+
         if(JACOBIAN):
             # Rotation sub matrices:
             self.R_01 = self.T_01[0:3, 0:3]
@@ -299,6 +494,40 @@ class mechanism:
 
             self.J66 = ManipJacobian_S(self.v_66, self.w_66, self.qdot)
 
+    ###################################################
+    #
+    #   Shared chain products of the link transforms.
+    #
+    #    ('suffix', k):  T_k,k+1 * .... * T_56     (k = 0 is T_06)
+    #    ('inv', k):     inverse of link transform k
+    #    ('lhs', k):     T_k,k-1 * ... * T_10 * Td
+    #
+    #   Each level is built from its neighbour with a single 4x4
+    #   multiply, so the six matrix equations (and T_06) share the
+    #   work instead of rebuilding every chain from scratch.
+
+    def chain_product(self, kind, k):
+        key = (kind, k)
+        if key in self.chain_cache:
+            return self.chain_cache[key]
+        if kind == 'suffix':
+            if k == len(self.Ts) - 1:
+                prod = self.Ts[k]
+            else:
+                prod = self.Ts[k] * self.chain_product('suffix', k + 1)
+        elif kind == 'inv':
+            prod = H_inv_S(self.Ts[k])
+        elif kind == 'lhs':
+            if k == 0:
+                prod = self.Td
+            else:
+                prod = self.chain_product('inv', k - 1) * \
+                    self.chain_product('lhs', k - 1)
+        else:
+            assert False, 'chain_product: unknown product type: ' + str(kind)
+        self.chain_cache[key] = prod
+        return prod
+
     ###################################################
     #
     #   Compute the full set of FK equations for input
@@ -312,33 +541,14 @@ class mechanism:
 
     def get_mequation_set(self):
         self.Td = hf.ik_lhs()
+        # a new Td invalidates the left hand side products
+        for k in range(0, len(self.Ts)):
+            self.chain_cache.pop(('lhs', k), None)
         list = []
-        lhs = self.Td
-        rhs = self.T_01 * self.T_12 * self.T_23 * self.T_34 * self.T_45 * self.T_56
-        list.append(matrix_equation(lhs, rhs))
-
-        lhs = H_inv_S(self.T_01) * self.Td
-        rhs = self.T_12 * self.T_23 * self.T_34 * self.T_45 * self.T_56
-        list.append(matrix_equation(lhs, rhs))
-
-        lhs = H_inv_S(self.T_12) * H_inv_S(self.T_01) * self.Td
-        rhs = self.T_23 * self.T_34 * self.T_45 * self.T_56
-        list.append(matrix_equation(lhs, rhs))
-
-        lhs = H_inv_S(self.T_23) * H_inv_S(self.T_12) * \
-            H_inv_S(self.T_01) * self.Td
-        rhs = self.T_34 * self.T_45 * self.T_56
-        list.append(matrix_equation(lhs, rhs))
-
-        lhs = H_inv_S(self.T_34) * H_inv_S(self.T_23) * \
-            H_inv_S(self.T_12) * H_inv_S(self.T_01) * self.Td
-        rhs = self.T_45 * self.T_56
-        list.append(matrix_equation(lhs, rhs))
-
-        lhs = H_inv_S(self.T_45) * H_inv_S(self.T_34) * H_inv_S(self.T_23) * \
-            H_inv_S(self.T_12) * H_inv_S(self.T_01) * self.Td
-        rhs = self.T_56
-        list.append(matrix_equation(lhs, rhs))
+        for k in range(0, len(self.Ts)):
+            lhs = self.chain_product('lhs', k)
+            rhs = self.chain_product('suffix', k)
+            list.append(matrix_equation(lhs, rhs))
         return list
 
 
@@ -388,6 +598,30 @@ class TestSolver008(unittest.TestCase):
     def runTest(self):
         self.a_test_kin_cl()
         self.a_test_kequation()
+        self.a_test_features()
+
+    def a_test_features(self):
+        fs = 'kequation features  FAIL'
+        (th_1, l_1, l_2, x, y) = sp.symbols('th_1 l_1 l_2 x y')
+        e = kequation(l_1 * sp.sin(th_1), x + l_2 * sp.cos(th_1) + th_1 * y)
+        f = e.features()
+        self.assertTrue(f is kequation(e.LHS, e.RHS).features(), fs)
+        self.assertEqual(f.side_symbols, e.free_symbols(), fs)
+        t = f.trig(th_1)
+        self.assertEqual((t.sin, t.cos, t.sin_sides, t.cos_sides, t.plain),
+                         (True, True, True, True, False), fs)
+        self.assertTrue(f.trig(x).plain and not f.trig(x).sin, fs)
+        (ex, es, A, B, C) = f.sincos_form(th_1)
+        self.assertEqual((A, B, C), (-l_1, l_2, x + th_1 * y), fs)
+        self.assertEqual(sp.expand(es - ex), 0, fs)
+        (c, d) = f.tan_form(th_1, sp.cos)
+        self.assertEqual(sp.expand(c - e.RHS + e.LHS), 0, fs)
+        self.assertEqual(d[sp.Wild('Aw')], l_2, fs)
+        self.assertEqual(f.algebra_form(x), e.RHS - e.LHS, fs)
+        self.assertTrue(f.sincos_form(th_1) is f.sincos_form(th_1), fs)
+        # (sin() on both sides cancelling in RHS - LHS)
+        t = kequation(sp.sin(th_1), sp.sin(th_1) + x).features().trig(th_1)
+        self.assertEqual((t.sin, t.sin_sides), (False, True), fs)
 
     # test Latex output for kequation
     def a_test_kequation(self):   # another kequation test in ik_classes
@@ -460,6 +694,13 @@ class TestSolver008(unittest.TestCase):
         self.assertTrue(L[2].Td[2, 2] == -r_23, fs)
         self.assertTrue(L[2].Td[2, 3] == -Py - h, fs)
 
+        # shared chain products must match the explicit chains
+        fs = 'chain product cache FAIL'
+        self.assertTrue(sp.expand(M.chain_product('suffix', 3) -
+                                  M.T_34 * M.T_45 * M.T_56) == sp.zeros(4), fs)
+        self.assertTrue(sp.expand(L[2].Td - H_inv_S(M.T_12) * H_inv_S(M.T_01)
+                                  * M.Td) == sp.zeros(4), fs)
+
         if(JACOBIAN and False):    # reactivate this later
             print ' --- Numerical Jacobian ---'
             pose = {th_1: 20 * deg, th_2: 45 * deg,
@@ -18,11 +18,13 @@
 
 # THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 import unittest
+import collections
 import sympy as sp
 from ik_classes import *
 import kin_cl as kc
 from matching import *
 import itertools as itt
+import ikbtfunctions.ik_logging as ikl
 
 ((th_1, th_2, th_3, th_4, th_5, th_6)) = sp.symbols(
     ('th_1', 'th_2', 'th_3', 'th_4', 'th_5', 'th_6'))
@@ -123,7 +125,7 @@ class Node:
     def detect_parent(self, R):
         if not len(self.solutions) == 0:
             eqn = self.solutions[0]  # solutions is a list of keqn
-            print eqn
+            ikl.log.debug('%s', eqn)
             elements = eqn.atoms(sp.Symbol)  # get only symbol elements
             for elem in elements:
                 if elem in R.variables_symbols:  # swap possible_unkns to unknows symbols
@@ -155,8 +157,7 @@ class Node:
                 self.sol_notations.add(self.symbol)
                 R.notation_graph.add(Edge(self.symbol, -1))
                 R.notation_collections.append([self.symbol])
-                print '//////////////////////// 1 sol'
-                print 'curr: ', self.symbol
+                ikl.log.debug('//////////////////////// 1 sol\ncurr: %s', self.symbol)
                 self.solution_with_notations[self.symbol] = kc.kequation(
                     self.symbol, self.solutions[0])
                 self.arguments[self.symbol] = self.argument
@@ -172,9 +173,8 @@ class Node:
                     curr_solution = self.solutions[i - 1]
                     self.solution_with_notations[curr] = kc.kequation(
                         curr, curr_solution)
-                    print '//////////////////////// > 1 sol'
-                    print 'curr: ', curr
-                    print self.argument
+                    ikl.log.debug('//////////////////////// > 1 sol\ncurr: %s\n%s',
+                                  curr, self.argument)
                     self.arguments[curr] = self.argument  # simple because root
 
         else:    # Non-root node
@@ -283,6 +283,57 @@ class Edge:
         return self.child.__hash__() * self.parent.__hash__() + self.child.__hash__()
 
 
+#  A set of Edges which iterates in the same order after a pickle.  A
+#    plain set rebuilt from a pickle may iterate in a different order from
+#    the original (and so may the edges added to it later), which would
+#    reorder the graph in the reports.  An edge_set keeps the adds and
+#    discards which changed it and replays them when it is unpickled, so
+#    its set is built exactly as the original was: it iterates as the
+#    plain set would have, before and after any pickle (e.g. a checkpoint,
+#    or a speculative BT tick, see b3/core/speculate.py).  All the other
+#    set operations (remove, |=, -=, ...) come from MutableSet and go
+#    through add() and discard().
+class edge_set(collections.MutableSet):
+    def __init__(self, history=()):
+        self.edges = set()
+        self.history = []       # (True: added / False: discarded, edge)
+        for (added, e) in history:
+            if added:
+                self.add(e)
+            else:
+                self.discard(e)
+
+    def __contains__(self, e):
+        return e in self.edges
+
+    def __len__(self):
+        return len(self.edges)
+
+    def __iter__(self):
+        return iter(self.edges)
+
+    def add(self, e):
+        if e not in self.edges:
+            self.edges.add(e)
+            self.history.append((True, e))
+
+    def discard(self, e):
+        if e in self.edges:
+            self.edges.remove(e)
+            self.history.append((False, e))
+
+    def update(self, *others):
+        for edges in others:
+            for e in edges:
+                self.add(e)
+
+    def __repr__(self):
+        return 'edge_set(%r)' % list(self.edges)
+
+    def __reduce__(self):
+        return (edge_set, (self.history,))
+
+
 class SolutionGraphV2Tests(unittest.TestCase):
     # the tests were designed for v1 (independent module), not suitable for v2
     def test_mock(self):
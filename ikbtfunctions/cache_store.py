@@ -0,0 +1,298 @@
+#!/usr/bin/python
+#
+#   Crash-safe pickle cache store (used for fk_eqns/)
+#
+#     - entries are written to a temp file and atomically renamed in place,
+#          so a killed writer never leaves a truncated pickle behind
+#     - each entry carries a sha1 checksum which is verified on load;
+#          a bad entry is discarded and treated as a cache miss
+#     - per-key lock files let several solver processes share one cache
+#          directory without computing (or writing) the same entry twice
+#     - total size is capped; least recently used entries are evicted
+#
+
+# Copyright 2017 University of Washington
+
+# Developed by Dianmu Zhang and Blake Hannaford
+# BioRobotics Lab, University of Washington
+
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import os as os
+import time
+import errno
+import shutil
+import hashlib
+import pickle
+import tempfile
+import unittest
+import copy_reg
+import sympy as sp
+from contextlib import contextmanager
+from sympy.assumptions.assume import AppliedPredicate
+
+try:
+    import fcntl      # POSIX file locking
+except ImportError:
+    fcntl = None      # (e.g. Windows) per-key locks become no-ops
+
+pprotocol = 2
+
+#  default size cap for a cache directory (bytes)
+CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+ENTRY_SUFFIX = '_pickle.p'
+LOCK_SUFFIX = '.lock'
+
+#  sympy's AppliedPredicate (e.g. Q.positive(x), found in unknown.assumption
+#    after solving) pickles but does not unpickle; give it a working reducer
+copy_reg.pickle(AppliedPredicate, lambda p: (AppliedPredicate, (p.func, p.arg)))
+
+
+class cache_store:
+    def __init__(self, directory='fk_eqns/', max_bytes=CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        if not os.path.isdir(self.directory):  # if this doesn't exist, create it.
+            print 'Creating a new pickle directory: ./' + self.directory
+            try:
+                os.makedirs(self.directory)
+            except OSError as e:   # another worker may have just made it
+                if e.errno != errno.EEXIST:
+                    raise
+
+    def path(self, key):
+        return os.path.join(self.directory, key + ENTRY_SUFFIX)
+
+    def _lock_path(self, key):
+        return os.path.join(self.directory, key + LOCK_SUFFIX)
+
+    # open and lock the lock file of key; None if blocking is False and
+    #   another process holds it.  A lock file may be removed (by evict)
+    #   while we wait for it, so retry until the locked file is the one
+    #   in the directory.
+    def _open_locked(self, key, blocking=True):
+        lname = self._lock_path(key)
+        while True:
+            f = open(lname, 'a')
+            if fcntl is None:
+                return f
+            try:
+                if blocking:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+                else:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except IOError:
+                f.close()
+                return None      # in use
+            try:
+                if os.stat(lname).st_ino == os.fstat(f.fileno()).st_ino:
+                    return f
+            except OSError:
+                pass
+            f.close()            # (closing releases the lock)
+
+    # hold an exclusive lock on one key (blocks while another process has it)
+    #   usage:   with store.lock(key):  load or compute+store
+    @contextmanager
+    def lock(self, key):
+        f = self._open_locked(key)
+        try:
+            yield
+        finally:
+            f.close()
+
+    # return the stored object, or None if missing or damaged
+    def load(self, key):
+        name = self.path(key)
+        try:
+            with open(name, 'rb') as f:
+                checksum = f.readline().strip()
+                payload = f.read()
+        except IOError:
+            return None
+        if hashlib.sha1(payload).hexdigest() != checksum:
+            print 'cache_store: discarding damaged entry: ', name
+            self._remove(name)
+            return None
+        try:
+            obj = pickle.loads(payload)
+        except Exception:
+            print 'cache_store: discarding unreadable entry: ', name
+            self._remove(name)
+            return None
+        try:
+            os.utime(name, None)   # mark as recently used
+        except OSError:
+            pass
+        return obj
+
+    # write an entry atomically, then enforce the size cap
+    def store(self, key, obj):
+        payload = pickle.dumps(obj, pprotocol)
+        fd, tmpname = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(hashlib.sha1(payload).hexdigest() + '\n')
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            if os.name == 'nt' and os.path.isfile(self.path(key)):
+                os.remove(self.path(key))   # rename won't replace on Windows
+            os.rename(tmpname, self.path(key))
+        except:
+            self._remove(tmpname)
+            raise
+        self.evict(keep=key)
+
+    # drop least recently used entries until we are under the size cap,
+    #   and the lock files of entries which are gone
+    def evict(self, keep=None):
+        entries = []
+        locks = []
+        total = 0
+        for fname in os.listdir(self.directory):
+            if fname.endswith(LOCK_SUFFIX):
+                locks.append(fname[:-len(LOCK_SUFFIX)])
+                continue
+            if not fname.endswith(ENTRY_SUFFIX):
+                continue
+            name = os.path.join(self.directory, fname)
+            try:
+                st = os.stat(name)
+            except OSError:
+                continue
+            total += st.st_size
+            entries.append((st.st_mtime, fname[:-len(ENTRY_SUFFIX)], st.st_size))
+        entries.sort()   # oldest first
+        for mtime, key, size in entries:
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            if self._try_remove_unlocked(key):
+                print 'cache_store: evicted ', key
+                total -= size
+        for key in locks:
+            if key != keep and not os.path.isfile(self.path(key)):
+                self._try_remove_unlocked(key)
+        return total
+
+    # remove an entry and its lock file unless some other process
+    #   currently holds its lock
+    def _try_remove_unlocked(self, key):
+        f = self._open_locked(key, blocking=False)
+        if f is None:
+            return False     # in use: leave it
+        try:
+            self._remove(self.path(key))
+            self._remove(self._lock_path(key))
+        finally:
+            f.close()
+        return True
+
+    def _remove(self, name):
+        try:
+            os.remove(name)
+        except OSError:
+            pass
+
+
+#####################################################################################
+# Test code below.  See sincos_solver.py for example
+#
+class TestSolver011(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp() + '/'
+        return
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_store_load(self):
+        fs = 'cache_store store/load  FAIL'
+        cs = cache_store(self.dir)
+        self.assertTrue(cs.load('abc') is None, fs)
+        with cs.lock('abc'):
+            cs.store('abc', [1, 'two', {3: 4}])
+        self.assertEqual(cs.load('abc'), [1, 'two', {3: 4}], fs)
+        q = [sp.Q.positive(sp.cos(sp.Symbol('B')))]
+        cs.store('q', q)
+        self.assertEqual(cs.load('q'), q, fs + ' (assumptions)')
+        # no temp files left behind
+        self.assertEqual(sorted(os.listdir(self.dir)),
+                         ['abc' + LOCK_SUFFIX, 'abc' + ENTRY_SUFFIX,
+                          'q' + ENTRY_SUFFIX], fs)
+
+    def test_damaged(self):
+        fs = 'cache_store damaged entry  FAIL'
+        cs = cache_store(self.dir)
+        cs.store('abc', range(1000))
+        name = cs.path('abc')
+        data = open(name, 'rb').read()
+        with open(name, 'wb') as f:     # simulate a truncated write
+            f.write(data[:len(data) // 2])
+        self.assertTrue(cs.load('abc') is None, fs)
+        self.assertFalse(os.path.isfile(name), fs)
+        with open(name, 'wb') as f:     # old style (no checksum) pickle
+            pickle.dump([1, 2], f)
+        self.assertTrue(cs.load('abc') is None, fs)
+
+    def test_eviction(self):
+        fs = 'cache_store eviction  FAIL'
+        cs = cache_store(self.dir)
+        cs.store('a', 'x' * 1000)
+        size = os.path.getsize(cs.path('a'))
+        cs.max_bytes = 2 * size + 10
+        t = time.time()
+        os.utime(cs.path('a'), (t - 100, t - 100))
+        cs.store('b', 'y' * 1000)
+        os.utime(cs.path('b'), (t - 50, t - 50))
+        cs.load('a')                   # 'a' is now most recently used
+        cs.store('c', 'z' * 1000)      # over the cap: 'b' must go
+        self.assertTrue(cs.load('b') is None, fs)
+        self.assertEqual(cs.load('a'), 'x' * 1000, fs)
+        self.assertEqual(cs.load('c'), 'z' * 1000, fs)
+
+    def test_lock_files(self):
+        fs = 'cache_store lock files  FAIL'
+        cs = cache_store(self.dir)
+        with cs.lock('a'):
+            cs.store('a', 1)
+        with cs.lock('b'):
+            pass                       # (e.g. the computation failed)
+        with cs.lock('c'):
+            cs.store('c', 3)           # lock files of gone entries go
+            self.assertEqual(sorted(os.listdir(self.dir)),
+                             ['a' + LOCK_SUFFIX, 'a' + ENTRY_SUFFIX,
+                              'c' + LOCK_SUFFIX, 'c' + ENTRY_SUFFIX], fs)
+        cs.max_bytes = 0
+        with cs.lock('a'):             # in use: kept
+            cs.store('d', 4)
+        self.assertEqual(sorted(os.listdir(self.dir)),
+                         ['a' + LOCK_SUFFIX, 'a' + ENTRY_SUFFIX,
+                          'd' + ENTRY_SUFFIX], fs)
+        with cs.lock('a'):             # still usable after eviction
+            self.assertEqual(cs.load('a'), 1, fs)
+
+
+#
+#    Can run your test from command line by invoking this file
+#
+#      - or - call your TestSolverTEMPLATE()  from elsewhere
+#
+
+if __name__ == "__main__":
+
+    print '\n\n===============  Test cache_store ====================='
+    testsuite = unittest.TestLoader().loadTestsFromTestCase(
+        TestSolver011)  # replace TEMPLATE
+    unittest.TextTestRunner(verbosity=2).run(testsuite)
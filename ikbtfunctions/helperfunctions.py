@@ -39,10 +39,31 @@ def print_debug(label):
     print label
 
 
+#  free symbols of an expression, memoized.
+#    The leaves ask about the same (immutable) expressions over and over;
+#    expr.has(u.symbol) walks the whole tree once per unknown, this walks
+#    it once per expression.
+FREE_SYMBOLS_CACHE_MAX = 50000
+free_symbols_cache = {}
+
+
+def free_symbols(expr):
+    try:
+        return free_symbols_cache[expr]
+    except KeyError:
+        pass
+    fs = frozenset(sp.sympify(expr).free_symbols)   # (expr may be a number)
+    if len(free_symbols_cache) > FREE_SYMBOLS_CACHE_MAX:
+        free_symbols_cache.clear()
+    free_symbols_cache[expr] = fs
+    return fs
+
+
 def count_unknowns(unknowns, expr):
+    fs = free_symbols(expr)
     n = 0
     for u in unknowns:
-        if(expr.has(u.symbol) and u.solved == False):
+        if(u.solved == False and u.symbol in fs):
             n += 1
     return n
 
@@ -50,9 +71,10 @@ def count_unknowns(unknowns, expr):
 
 
 def get_unknowns(unknowns, expr):
+    fs = free_symbols(expr)
     us = []
     for u in unknowns:
-        if(expr.has(u.symbol) and u.solved == False):
+        if(u.solved == False and u.symbol in fs):
             us.append(u)
     return us
 
@@ -62,10 +84,11 @@ def get_unknowns(unknowns, expr):
 
 def get_variables(variables, expr):
     vs = []
+    fs = free_symbols(expr)
     # print 'get_variables: ', expr
     for v in variables:
         # print 'get_variables: ', v.symbol
-        if(expr.has(v.symbol)):
+        if(v.symbol in fs):
             vs.append(v)
     return vs
 
@@ -0,0 +1,143 @@
+#!/usr/bin/python
+#
+#   Level gated solver output
+#
+#     Two loggers:  'ikbt'  solver classes and leaves
+#                   'b3'    behavior tree nodes (see BaseNode.log())
+#
+#     Messages are written like
+#           log.debug('set_solved: %s = %s', u.symbol, u.solutions[0])
+#     so expressions are only turned into strings if the message is emitted.
+#     Importing this sets up no output; the application (ikSolver.main(),
+#     the test runners) calls setup(), which sends INFO and above to stdout
+#     (like the old print statements).  quiet() turns off everything below
+#     WARNING, e.g. for batch runs.
+#     Single BT nodes can still be made verbose with node.BHdebug = True.
+#
+
+# Copyright 2017 University of Washington
+
+# Developed by Dianmu Zhang and Blake Hannaford
+# BioRobotics Lab, University of Washington
+
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import sys
+import logging
+import unittest
+import StringIO
+
+from logging import DEBUG, INFO, WARNING
+
+LOGGERS = ['ikbt', 'b3']
+
+log = logging.getLogger('ikbt')
+log.addHandler(logging.NullHandler())  # (the application sets up output)
+
+handler = None
+
+
+#  send solver output to stream (default stdout) at the given level
+def setup(level=INFO, stream=None):
+    global handler
+    for name in LOGGERS:
+        l = logging.getLogger(name)
+        if handler is not None:
+            l.removeHandler(handler)
+    handler = logging.StreamHandler(stream or sys.stdout)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    for name in LOGGERS:
+        l = logging.getLogger(name)
+        l.addHandler(handler)
+        l.propagate = False
+        l.setLevel(level)
+
+
+#  undo setup()
+def reset():
+    global handler
+    for name in LOGGERS:
+        l = logging.getLogger(name)
+        if handler is not None:
+            l.removeHandler(handler)
+        l.propagate = True
+        l.setLevel(logging.NOTSET)
+    handler = None
+
+
+def set_level(level):
+    for name in LOGGERS:
+        logging.getLogger(name).setLevel(level)
+
+
+#  production mode: no debug/info output (and no expression is stringified)
+def quiet():
+    set_level(WARNING)
+
+
+#  defer building an expensive message part until it is printed:
+#       log.info('solved: %s', lazy(lambda: ', '.join(...)))
+class lazy(object):
+    def __init__(self, f):
+        self.f = f
+
+    def __str__(self):
+        return str(self.f())
+
+
+
+#####################################################################################
+# Test code below.  See sincos_solver.py for example
+#
+class TestSolver014(unittest.TestCase):
+    def runTest(self):
+        self.test_levels()
+
+    def test_levels(self):
+        fs = 'ik_logging  FAIL'
+        out = StringIO.StringIO()
+        calls = []
+
+        def expensive():
+            calls.append(1)
+            return 'X'
+        configured = handler is not None
+        try:
+            setup(INFO, out)
+            log.info('a %s', lazy(expensive))
+            log.debug('b %s', lazy(expensive))
+            self.assertEqual(out.getvalue(), 'a X\n', fs)
+            self.assertEqual(len(calls), 1, fs)
+            quiet()
+            log.info('c %s', lazy(expensive))
+            log.warning('d')
+            self.assertEqual(out.getvalue(), 'a X\nd\n', fs)
+            self.assertEqual(len(calls), 1, fs)
+        finally:
+            if configured:
+                setup()
+            else:
+                reset()
+
+
+#
+#    Can run your test from command line by invoking this file
+#
+#      - or - call your TestSolverTEMPLATE()  from elsewhere
+#
+
+if __name__ == "__main__":
+
+    setup()
+    print '\n\n===============  Test ik_logging ====================='
+    testsuite = unittest.TestLoader().loadTestsFromTestCase(
+        TestSolver014)  # replace TEMPLATE
+    unittest.TextTestRunner(verbosity=2).run(testsuite)
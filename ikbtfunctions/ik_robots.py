@@ -33,11 +33,14 @@ from ikbtbasics.ik_classes import *
 #####
 
 
+# the robots known to robot_params()
+robot_list = ['Puma', 'Kuka', 'Chair_Helper', 'Wrist', 'MiniDD',
+              'Olson13', 'Stanford', 'Chair6DOF', 'Khat6DOF', 'Craig417']
+
+
 def robot_params(name):
     pvals = {}   # null for most robots
-    List = ['Puma', 'Kuka', 'Chair_Helper', 'Wrist', 'MiniDD',
-            'Olson13', 'Stanford', 'Chair6DOF', 'Khat6DOF', 'Craig417']
-    assert (name in List), 'robot_params(): Unknown robot, ' + \
+    assert (name in robot_list), 'robot_params(): Unknown robot, ' + \
         name + ', Stopping'
 
     if(name == 'Craig417'):
@@ -0,0 +1,174 @@
+#!/usr/bin/python
+#
+#   Simplify many independent expressions on a pool of worker processes
+#
+#     usage:   L = simplify_all(list_of_exprs)             # sp.simplify each
+#              L = simplify_all(list_of_exprs, 'trigsimp')  # sp.trigsimp each
+#
+#              L = simplify_all(list_of_exprs, timeout=b3.remaining(tick))
+#
+#     Results come back in the same order as the input.  With a timeout
+#     (seconds) the work is given up (raising b3.Timeout) if it is not done
+#     in time; the workers doing it are killed.  Set PARALLEL = False (or
+#     the environment variable IKBT_SERIAL=1) to do the work without the
+#     pool, e.g. for debugging or profiling.  On Windows (no fork()) and on
+#     single core machines simplification is always serial.  Serial work
+#     runs in this process, or with a timeout in one worker process which
+#     is killed when the time is up.
+#
+
+# Copyright 2017 University of Washington
+
+# Developed by Dianmu Zhang and Blake Hannaford
+# BioRobotics Lab, University of Washington
+
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import os as os
+import time
+import atexit
+import unittest
+import multiprocessing
+import sympy as sp
+import b3 as b3
+
+PARALLEL = os.environ.get('IKBT_SERIAL', '0') == '0'
+NWORKERS = None      # None: one worker per core
+
+FUNCS = {'simplify': sp.simplify, 'trigsimp': sp.trigsimp}
+
+pool = None
+
+
+def _apply(args):     # (runs in the worker)
+    (fname, expr) = args
+    return FUNCS[fname](expr)
+
+
+def _apply_all(fname, exprs):
+    return [FUNCS[fname](e) for e in exprs]
+
+
+def nworkers():
+    if NWORKERS is not None:
+        return NWORKERS
+    try:
+        return multiprocessing.cpu_count()
+    except NotImplementedError:
+        return 1
+
+
+def parallel_ok():
+    return (PARALLEL and os.name != 'nt' and nworkers() > 1 and
+            multiprocessing.current_process().name == 'MainProcess')
+
+
+# how many independent jobs to batch up when work could stop early
+def batch_size():
+    if parallel_ok():
+        return nworkers()
+    return 1
+
+
+def get_pool():
+    global pool
+    if pool is None:
+        pool = multiprocessing.Pool(nworkers())
+        atexit.register(shutdown)
+    return pool
+
+
+def shutdown():
+    global pool
+    if pool is not None:
+        pool.terminate()
+        pool = None
+
+
+def simplify_all(exprs, fname='simplify', timeout=None):
+    if timeout is not None and timeout <= 0:
+        raise b3.Timeout()
+    exprs = list(exprs)
+    # only send (distinct) non-trivial expressions to the workers
+    work = []
+    for e in exprs:
+        if not (isinstance(e, sp.Basic) and e.is_Atom) and e not in work:
+            work.append(e)
+    results = {}
+    if parallel_ok() and len(work) > 1:
+        try:
+            job = get_pool().map_async(_apply, [(fname, e) for e in work], chunksize=1)
+            # (get() with no timeout can't be interrupted)
+            simp = job.get(1e7 if timeout is None else timeout)
+            results = dict(zip(work, simp))
+        except multiprocessing.TimeoutError:
+            shutdown()          # (stops the workers)
+            raise b3.Timeout()
+        except Exception as err:
+            print 'simplify_all: worker pool failed (', err, '), continuing serially'
+            shutdown()
+            results = {}
+    work = [e for e in work if e not in results]
+    if work:
+        # (with a timeout: in one worker, killed when the time is up)
+        simp = b3.call_timeout(timeout, _apply_all, fname, work, hard=True)
+        results.update(zip(work, simp))
+    return [results.get(e, e) for e in exprs]
+
+
+#####################################################################################
+# Test code below.  See sincos_solver.py for example
+#
+class TestSolver012(unittest.TestCase):
+    def runTest(self):
+        self.test_simplify_all()
+
+    def test_simplify_all(self):
+        global NWORKERS
+        fs = 'simplify_all()  FAIL'
+        (a, b) = sp.symbols(('a', 'b'))
+        exprs = [sp.sin(a) * sp.cos(b) + sp.cos(a) * sp.sin(b), a, 0,
+                 sp.sin(a)**2 + sp.cos(a)**2, (a + b)**2 - a**2 - 2 * a * b]
+        serial = [sp.simplify(e) for e in exprs]
+        n = NWORKERS
+        try:
+            for NWORKERS in [1, 2]:      # serial and pool
+                self.assertEqual(simplify_all(exprs), serial, fs)
+            self.assertEqual(simplify_all(exprs[:1], 'trigsimp'),
+                             [sp.sin(a + b)], fs)
+            for NWORKERS in [1, 2]:      # with a time limit
+                self.assertEqual(simplify_all(exprs, timeout=600), serial, fs)
+                self.assertRaises(b3.Timeout, simplify_all, exprs, timeout=0)
+            # serial work which runs past the time limit is cut off
+            NWORKERS = 1
+            FUNCS['sleep'] = lambda e: time.sleep(30) or e
+            t0 = time.time()
+            self.assertRaises(b3.Timeout, simplify_all, exprs[:1], 'sleep',
+                              0.5)
+            self.assertTrue(time.time() - t0 < 10, fs)
+        finally:
+            NWORKERS = n
+            FUNCS.pop('sleep', None)
+            shutdown()
+
+
+#
+#    Can run your test from command line by invoking this file
+#
+#      - or - call your TestSolverTEMPLATE()  from elsewhere
+#
+
+if __name__ == "__main__":
+
+    print '\n\n===============  Test parallel_simplify ====================='
+    testsuite = unittest.TestLoader().loadTestsFromTestCase(
+        TestSolver012)  # replace TEMPLATE
+    unittest.TextTestRunner(verbosity=2).run(testsuite)
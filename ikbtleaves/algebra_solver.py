@@ -73,9 +73,9 @@ class test_algebra_id(b3.Action):    # tester for your ID
         return b3.SUCCESS
 
 
-class algebra_id(b3.Action):    # action leaf for
+class algebra_id(id_leaf):    # action leaf for
 
-    def tick(self, tick):
+    def identify(self, tick):
         Tm = tick.blackboard.get('Tm')   # the current matrix equation
         # the current list of unknowns
         unknowns = tick.blackboard.get('unknowns')
@@ -99,17 +99,14 @@ class algebra_id(b3.Action):    # action leaf for
                     print 'algebra ID: Looking for unknown: ', u.symbol, ' in equation: ',
                     print e,
                     print "  - ", count_unknowns(unknowns, e.RHS), " unknown"
-                if (e.RHS.has(sp.sin(u.symbol)) or e.RHS.has(sp.cos(u.symbol)) or
-                        e.LHS.has(sp.sin(u.symbol)) or e.LHS.has(sp.cos(u.symbol))):
+                t = e.features().trig(u.symbol)
+                if t.sin_sides or t.cos_sides:
                     continue   # this shouldbe caught by another ID
 
                 # since we're not solving the equation here, simply count the unknowns will suffice for the identification
-                if(e.RHS.has(u.symbol) or e.LHS.has(u.symbol)):
+                if t.plain:
                     u.readytosolve = True
-                    tmp = e.RHS - e.LHS
-                    tmp = tmp.expand()
-
-                    tmp = tmp.collect(u.symbol)
+                    tmp = e.features().algebra_form(u.symbol)
                     u.eqntosolve = kequation(0, tmp)
                     u.solvemethod = "algebra"
                     found = True
@@ -28,6 +28,8 @@ from ikbtbasics.kin_cl import *
 from ikbtbasics.ik_classes import *
 
 import b3 as b3          # behavior trees
+from b3.core import speculate
+import unittest
 
 
 class assigner(b3.Action):
@@ -46,6 +48,7 @@ class assigner(b3.Action):
                 print "variable on blackboard: %s" % curr.symbol
                 tick.blackboard.set("counter", counter)
                 tick.blackboard.set("curr_unk", curr)
+                note_tried(tick.blackboard, curr)
                 return b3.SUCCESS
 
         if counter >= len(unknowns):
@@ -92,3 +95,186 @@ class assigner(b3.Action):
         # return b3.SUCCESS
 
         # return b3.SUCCESS
+
+
+#  tick the child with a given unknown on the blackboard
+#    (the previous curr_unk is put back afterwards).  The unknown is looked
+#    up by symbol at each tick, since a speculative tick (see solve_each)
+#    may have replaced the unknowns on the blackboard.  FAILURE if the
+#    unknown is (or is still) unsolved.
+class attempt_unk(b3.Decorator):
+    stateless = True
+
+    def __init__(self, u, child):
+        super(attempt_unk, self).__init__(child)
+        self.symbol = u.symbol
+        self.Name = 'Solve ' + str(u.symbol)
+
+    def unknown(self, tick):
+        for u in tick.blackboard.get("unknowns"):
+            if u.symbol == self.symbol:
+                return u
+
+    def tick(self, tick):
+        self.Cost = 0
+        if self.unknown(tick).solved:      # (e.g. by sum of angles)
+            return b3.FAILURE
+        prev = tick.blackboard.get("curr_unk")
+        tick.blackboard.set("curr_unk", self.unknown(tick))
+        try:
+            status = self.child._execute(tick)
+        finally:
+            tick.blackboard.set("curr_unk", prev)
+        self.Cost = self.child.Cost
+        if status == b3.SUCCESS and not self.unknown(tick).solved:
+            return b3.FAILURE
+        return status
+
+
+#
+#   Multi-unknown solving: one tick tries every unknown which is unsolved
+#     at the start of the tick with the child (e.g. worktools), in the order
+#     of the unknowns list, and keeps every solution found.  SUCCESS if any
+#     unknown was solved.  (The assigner gives the child one unknown per tick.)
+#
+#     Each attempt sees the solutions committed before it, so the outcome
+#     (and solveorder) is the same with or without parallel.  With
+#     parallel, the attempts are ticked speculatively (see
+#     b3/core/speculate.py).
+#
+#     The leaves solve the unknowns themselves, one attempt after another
+#     within the round: attempts are not batched into one commit.
+#
+class solve_each(b3.Decorator):
+    stateless = True
+
+    def __init__(self, child=None, parallel=False):
+        super(solve_each, self).__init__(child)
+        self.Name = '*solve each unknown*'
+        self.parallel = parallel
+
+    def tick(self, tick):
+        todo = [u for u in tick.blackboard.get("unknowns") if not u.solved]
+        attempts = [attempt_unk(u, self.child) for u in todo]
+        status = b3.FAILURE
+        self.Cost = 0
+        for (i, status_curr, dt) in speculate.execute(attempts, tick,
+                                                      self.parallel):
+            self.Cost += attempts[i].Cost
+            if status_curr == b3.SUCCESS:
+                status = b3.SUCCESS
+        if status == b3.FAILURE:
+            for a in attempts:
+                note_tried(tick.blackboard, a.unknown(tick))
+        return status
+
+
+class TestSolver015(unittest.TestCase):
+    def runTest(self):
+        self.test_solve_each()
+        self.test_restore()
+        self.test_stall()
+
+    def test_solve_each(self):
+        from ikbtleaves.algebra_solver import test_algebra_id, algebra_id, algebra_solve
+        fs = 'solve_each()  FAIL'
+        sp.var('r_13 r_12')
+        n = speculate.NWORKERS
+        spec = speculate._speculate
+        rounds = []
+
+        def count(nodes, tick, before):
+            rounds.append(len(nodes))
+            return spec(nodes, tick, before)
+        speculate._speculate = count
+        try:
+            results = []
+            for (speculate.NWORKERS, par) in [(1, False), (2, True)]:
+                bt = b3.BehaviorTree()
+                bb = b3.Blackboard()
+                bb.set('Robot', Robot())
+                alg = b3.Sequence([algebra_id(), algebra_solve()])
+                bt.root = b3.Sequence([test_algebra_id(), solve_each(alg, par)])
+                self.assertEqual(bt.tick('solve_each', bb), b3.SUCCESS, fs)
+                # both algebra unknowns in one tick, th_3 is left unsolved
+                unk = dict([(u.symbol, u) for u in bb.get('unknowns')])
+                self.assertTrue(unk[d_1].solved and unk[th_2].solved, fs)
+                self.assertFalse(unk[th_3].solved, fs)
+                self.assertEqual(unk[d_1].solutions, [(r_13 - l_1) / l_3], fs)
+                self.assertEqual(unk[th_2].solutions, [r_12 - l_1 * l_2], fs)
+                # a second round: nothing is left that algebra can solve
+                bt.root = solve_each(alg, par)
+                self.assertEqual(bt.tick('solve_each', bb), b3.FAILURE, fs)
+                results.append([(u.symbol, u.solved, u.solveorder)
+                                for u in bb.get('unknowns')])
+                results.append([(x.N_ticks, x.N_success) for x in
+                                alg.children])
+            # the same solutions and statistics with speculation
+            self.assertEqual(results[0], results[2], fs)
+            self.assertEqual(results[1], results[3], fs)
+            self.assertTrue(len(rounds) > 0, fs + ' (no speculation)')
+        finally:
+            speculate.NWORKERS = n
+            speculate._speculate = spec
+
+    def test_restore(self):
+        fs = 'attempt_unk()  FAIL'
+
+        class boom(b3.Action):
+            def tick(self, tick):
+                raise ZeroDivisionError
+
+        bb = b3.Blackboard()
+        u = unknown(th_1)
+        bb.set('unknowns', [u])
+        bb.set('curr_unk', 'prev')
+        bt = b3.BehaviorTree()
+        bt.root = attempt_unk(u, boom())
+        self.assertRaises(ZeroDivisionError, bt.tick, 'attempt_unk', bb)
+        # curr_unk is put back even when the child raises
+        self.assertEqual(bb.get('curr_unk'), 'prev', fs)
+
+    def test_stall(self):
+        from ikbtleaves.algebra_solver import test_algebra_id, algebra_id, algebra_solve
+        from ikbtleaves.comp_detect import stall_detect
+        fs = 'stall detection  FAIL'
+
+        class count(b3.Action):
+            def tick(self, tick):
+                self.N += 1
+                return b3.SUCCESS
+
+        bt = b3.BehaviorTree()
+        bb = b3.Blackboard()
+        bb.set('Robot', Robot())
+        alg = b3.Sequence([algebra_id(), algebra_solve()])
+        bt.root = b3.Sequence([test_algebra_id(), solve_each(alg)])
+        bt.tick('setup', bb)        # solves d_1 and th_2
+        rounds = []
+        for stalled in [None, stall_detect()]:
+            c = count()
+            c.N = 0
+            alg = b3.Sequence([algebra_id(), algebra_solve()])
+            bt.root = b3.RepeatUntilSuccess(b3.Sequence([c, solve_each(alg)]),
+                                            7, stalled)
+            self.assertEqual(bt.tick('stall', bb), b3.FAILURE, fs)
+            rounds.append(c.N)
+        # nothing is left that algebra can solve: without stall detection
+        #   all 7 rounds run, with it the loop stops after the first
+        self.assertEqual(rounds[0], 7, fs)
+        self.assertEqual(rounds[1], 1, fs)
+        self.assertEqual(bb.get('stalled'), [th_3, th_4, th_5], fs)
+
+
+#
+#    Can run your test from command line by invoking this file
+#
+#      - or - call your TestSolverTEMPLATE()  from elsewhere
+#
+
+if __name__ == "__main__":
+
+    print '\n\n===============  Test solve_each ====================='
+    testsuite = unittest.TestLoader().loadTestsFromTestCase(
+        TestSolver015)  # replace TEMPLATE
+    unittest.TextTestRunner(verbosity=2).run(testsuite)
@@ -26,6 +26,7 @@ from ikbtbasics.ik_classes import *
 
 import b3 as b3          # behavior trees
 import time
+import ikbtfunctions.ik_logging as ikl
 
 
 #   Detect when all unknowns are solved
@@ -38,6 +39,7 @@ class comp_det(b3.Action):
         # we can set up to succeed when all are done or succeed when more to do.
         self.FailAllDone = False
         self.Name = '*completion_detect*'
+        self.pause = 0      # seconds to wait after the summary (for easier reading/ stopping)
 
     def tick(self, tick):
         unks = tick.blackboard.get('unknowns')
@@ -49,16 +51,12 @@ class comp_det(b3.Action):
             n += 1
             if(u.solved):
                 ns += 1
-        # if(self.BHdebug):
-        print '\n\n\n\n'
-        print '           Completion Detector: ', n, ' variables, ', ns, ' are solved.'
-        print '             solved: ',
-        for u in unks:
-            if(u.solved):
-                str = '{} ({});  '.format(u.symbol, u.solvemethod)
-                print str,
-        print '\n\n\n'
-        time.sleep(2)  # for easier reading/ stopping
+        ikl.log.info('\n\n\n\n           Completion Detector: %d variables, %d are solved.'
+                     '\n             solved:  %s\n\n\n', n, ns,
+                     ikl.lazy(lambda: ''.join(['{} ({});  '.format(u.symbol, u.solvemethod)
+                                               for u in unks if u.solved])))
+        if self.pause > 0:
+            time.sleep(self.pause)
 
         #
         #   Look for sum-of-angle equations which can now be solved
@@ -75,14 +73,35 @@ class comp_det(b3.Action):
             DONEComplete = b3.SUCCESS
             DONEIncomplete = b3.FAILURE
         if(n == ns):
-            print ""
-            print " Solution Complete!!"
-            print ""
+            ikl.log.info('\n Solution Complete!!\n')
             return DONEComplete  # we have solved all vars
         else:
             return DONEIncomplete  # we still have unsolved vars
 
 
+#
+#   Stall detection for the solver loop (b3.RepeatUntilSuccess(stalled=))
+#
+#     The solver is stuck when every unsolved unknown has been given to the
+#     solvers since the unknowns or equations last changed (see
+#     note_tried()): another pass would do exactly the same again.
+#
+class stall_detect(object):
+    def __call__(self, tick):
+        bb = tick.blackboard
+        tried = bb.get('tried')
+        if tried is None or tried[0] != solver_progress(bb):
+            return False
+        stuck = [u.symbol for u in bb.get('unknowns') if not u.solved]
+        for s in stuck:
+            if s not in tried[1]:
+                return False
+        ikl.log.warning('Solver stalled: no progress on %s',
+                        ', '.join([str(s) for s in stuck]))
+        bb.set('stalled', stuck)
+        return True
+
+
 # Self Tests
 if __name__ == "__main__":
 
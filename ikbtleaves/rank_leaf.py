@@ -27,62 +27,211 @@ from ikbtbasics.kin_cl import *
 from ikbtbasics.ik_classes import *
 
 import b3 as b3          # behavior trees
+import unittest
 
 # helper function: count veriables (regardless of solved status)
 
 
 def count_variables(unknowns, expr):
     n = 0
+    fs = free_symbols(expr)
     for unk in unknowns:
-        if expr.has(unk.symbol):
+        if unk.symbol in fs:
             n += 1
     return n
 
 
+# cost of a list of candidate solutions for one unknown, smaller is better
+#   (compared in order):
+#     branches:      number of solutions (each one doubles the solution tree)
+#     dependencies:  number of variables the first solution depends on
+#     domain:        number of domain restricted functions (asin, acos, sqrt)
+#     ops:           operation count of all the solutions
+def solution_cost(unknowns, sols):
+    domain = 0
+    for s in sols:
+        for x in sp.preorder_traversal(s):
+            if isinstance(x, (sp.asin, sp.acos)) or \
+                    (x.is_Pow and x.exp == sp.S.Half):
+                domain += 1
+    return (len(sols), count_variables(unknowns, sols[0]), domain,
+            sum([sp.count_ops(s) for s in sols]))
+
+
+#  which of the sin/cos and tan solutions of u to keep ("sincos" or "tan"):
+#    fewer solutions is better, then fewer dependencies (variables in the
+#    first solution); ties go to tan and an empty list loses.  The other
+#    parts of solution_cost() don't change the choice, rank_all only uses
+#    them to order the commits.
+def choose(u, unknowns):
+    sc = u.sincos_solutions
+    tan = u.tan_solutions
+    if len(sc) == 0:
+        return "tan"
+    if len(tan) == 0:
+        return "sincos"
+    if (len(sc), count_variables(unknowns, sc[0])) < \
+            (len(tan), count_variables(unknowns, tan[0])):
+        return "sincos"
+    return "tan"
+
+
+#  keep the better candidate solutions of u and mark it solved
+def commit(u, unknowns, R):
+    # only invokes comparisions when solved by both solvers
+    if u.solvable_sincos and u.solvable_tan:
+        choosen = choose(u, unknowns)
+        # reset soltusions
+        u.solutions = None
+        if choosen == "sincos":
+            u.solutions = u.sincos_solutions
+            u.nsolutions = len(u.sincos_solutions)
+            u.eqntosolve = u.sincos_eqnlist[0]
+            u.solvemethod = "sin or cos"
+        elif choosen == "tan":
+            u.solutions = u.tan_solutions
+            u.nsolutions = len(u.tan_solutions)
+            u.eqntosolve = u.tan_eqnlist[0]
+            u.secondeqn = u.tan_eqnlist[1]
+            u.solvemethod = "atan2(y,x)"
+
+        u.set_solved(R, unknowns)
+
+    elif u.solvable_sincos or u.solvable_tan:
+        u.set_solved(R, unknowns)
+
+
 class rank(b3.Action):
     def tick(self, tick):
         u = tick.blackboard.get("curr_unk")
         unknowns = tick.blackboard.get("unknowns")
         R = tick.blackboard.get("Robot")
-        choosen = None
-        # only invokes comparisions when solved by both solvers
-        if u.solvable_sincos and u.solvable_tan:
-            # less number of solutions is better
-            if (len(u.sincos_solutions) < len(u.tan_solutions)) and (len(u.sincos_solutions) > 0):
-                choosen = "sincos"
-            elif (len(u.sincos_solutions) > len(u.tan_solutions)) and (len(u.tan_solutions) > 0):
-                choosen = "tan"
-            else:
-                # if the number of solutions are the same, countinue
-                # less dependency
-                sol_sin = u.sincos_solutions[0]
-                sol_tan = u.tan_solutions[0]
-                if count_variables(unknowns, sol_sin) < count_variables(unknowns, sol_tan):
-                    choosen = "sincos"
-                else:
-                    choosen = "tan"
-
-            # reset soltusions
-            u.solutions = None
-            #u.solveorder = u.solveorder - 1
-            if choosen == "sincos":
-                u.solutions = u.sincos_solutions
-                u.nsolutions = len(u.sincos_solutions)
-                u.eqntosolve = u.sincos_eqnlist[0]
-                u.solvemethod = "sin or cos"
-            elif choosen == "tan":
-                u.solutions = u.tan_solutions
-                u.nsolutions = len(u.tan_solutions)
-                u.eqntosolve = u.tan_eqnlist[0]
-                u.secondeqn = u.tan_eqnlist[1]
-                u.solvemethod = "atan2(y,x)"
-
-            u.set_solved(R, unknowns)
-
-        elif u.solvable_sincos or u.solvable_tan:
-            u.set_solved(R, unknowns)
+        commit(u, unknowns, R)
 
         tick.blackboard.set("curr_unk", u)
         tick.blackboard.set("unknowns", unknowns)
         tick.blackboard.set("Robot", R)
         return b3.SUCCESS
+
+
+#
+#   Batch version of rank: tick child (the sin/cos and tan ID+solvers)
+#     for every unsolved unknown, then commit all the unknowns which got
+#     candidate solutions at once, cheapest first.  The candidates don't
+#     depend on each other (a solution only has unknowns which were solved
+#     before this pass), so one pass solves everything that is solvable
+#     now.  SUCCESS if anything was solved.
+#
+#     Only the tan and sin/cos solvers leave candidates to rank; the other
+#     solvers (algebra, sin and cos, simultaneous eqns, x2z2) solve their
+#     unknown directly and keep their turn in the usual loop.
+#
+class rank_all(b3.Decorator):
+    stateless = True
+
+    def __init__(self, child=None):
+        super(rank_all, self).__init__(child)
+        self.Name = '*rank all unknowns*'
+
+    def tick(self, tick):
+        unknowns = tick.blackboard.get("unknowns")
+        R = tick.blackboard.get("Robot")
+        curr = tick.blackboard.get("curr_unk")
+        self.Cost = 0
+        found = []
+        for (i, u) in enumerate(unknowns):
+            if u.solved:
+                continue
+            tick.blackboard.set("curr_unk", u)
+            status = self.child._execute(tick)
+            self.Cost += self.child.Cost
+            if status == b3.SUCCESS and (u.solvable_tan or u.solvable_sincos):
+                if choose(u, unknowns) == "sincos":
+                    cost = solution_cost(unknowns, u.sincos_solutions)
+                else:
+                    cost = solution_cost(unknowns, u.tan_solutions)
+                found.append((cost, i, u))
+        tick.blackboard.set("curr_unk", curr)
+
+        found.sort(key=lambda f: f[:2])
+        for (cost, i, u) in found:
+            commit(u, unknowns, R)
+        if len(found) == 0:
+            return b3.FAILURE
+        return b3.SUCCESS
+
+
+class TestSolver016(unittest.TestCase):
+    def runTest(self):
+        self.test_cost()
+        self.test_rank_all()
+
+    def test_cost(self):
+        fs = 'rank solution cost  FAIL'
+        (l_1, l_2, Px, Py) = sp.symbols('l_1 l_2 Px Py')
+        unks = [unknown(th_1), unknown(th_2)]
+        tan = [sp.atan2(Px / l_1, Py / l_2)]
+        sc = [sp.asin(Px / l_1), -sp.asin(Px / l_1) + sp.pi]
+        self.assertEqual(solution_cost(unks, tan)[:3], (1, 0, 0), fs)
+        self.assertEqual(solution_cost(unks, sc)[:3], (2, 0, 2), fs)
+        self.assertEqual(solution_cost(unks, [sp.acos(th_2 * Px)])[:3],
+                         (1, 1, 1), fs)
+        u = unks[0]
+        u.tan_solutions = tan
+        u.sincos_solutions = sc
+        self.assertEqual(choose(u, unks), 'tan', fs)
+        u.tan_solutions = []        # (tan solver failed)
+        self.assertEqual(choose(u, unks), 'sincos', fs)
+        u.tan_solutions = [sp.atan2(th_2 * Px, Py), sp.atan2(-th_2 * Px, -Py)]
+        u.sincos_solutions = [sp.asin(Px / l_1), -sp.asin(Px / l_1) + sp.pi]
+        self.assertEqual(choose(u, unks), 'sincos', fs)   # (fewer variables)
+        # the choices of the original rank leaf: fewer solutions, then
+        #   fewer variables, else tan (whatever the other costs)
+        u.tan_solutions = [sp.atan2(Px, Py), sp.atan2(-Px, -Py)]
+        u.sincos_solutions = [sp.acos(Px * Py / l_1 + l_2 * Py)]
+        self.assertEqual(choose(u, unks), 'sincos', fs)   # (fewer solutions)
+        u.tan_solutions = [sp.atan2(sp.sqrt(Px * l_1), sp.sqrt(Py * l_2))]
+        u.sincos_solutions = [sp.asin(Px)]
+        self.assertEqual(choose(u, unks), 'tan', fs)      # (a tie)
+        u.tan_solutions = [sp.atan2(th_2 * Px, Py)]
+        u.sincos_solutions = [sp.asin(th_2 * Px)]
+        self.assertEqual(choose(u, unks), 'tan', fs)      # (a tie)
+
+    def test_rank_all(self):
+        from ikbtleaves.tan_solver import test_tan_id, tan_id, tan_solve
+        from ikbtleaves.sincos_solver import sincos_id, sincos_solve
+        fs = 'rank_all()  FAIL'
+        sp.var('r_13 r_22 r_23 Px')
+        bt = b3.BehaviorTree()
+        bb = b3.Blackboard()
+        bb.set('test_number', 1)
+        sols = b3.OrNode([b3.Sequence([tan_id(), tan_solve()]),
+                          b3.Sequence([sincos_id(), sincos_solve()])])
+        bt.root = b3.Sequence([test_tan_id(), rank_all(sols)])
+        self.assertEqual(bt.tick('rank_all', bb), b3.SUCCESS, fs)
+        unk = dict([(u.symbol, u) for u in bb.get('unknowns')])
+        # everything tan or sin/cos can solve, in one tick
+        for th in [th_2, th_3, th_4, th_5, th_23]:
+            self.assertTrue(unk[th].solved, fs + ' [%s]' % th)
+        self.assertFalse(unk[th_1].solved or unk[th_6].solved, fs)
+        # th_2 is solvable by both: the single atan2() solution wins
+        self.assertEqual(unk[th_2].solvemethod, 'atan2(y,x)', fs)
+        self.assertEqual(unk[th_2].solutions,
+                         [sp.atan2((r_22 - 15) / l_1, (r_23 - 99) / l_3)], fs)
+        self.assertEqual(unk[th_4].solutions,
+                         [sp.atan2(r_13 / (l_1 + l_2), Px / l_3)], fs)
+        # th_5 (only arcsin, two solutions) costs most and is committed last
+        self.assertEqual(unk[th_5].nsolutions, 2, fs)
+        self.assertEqual(unk[th_5].solveorder,
+                         max([unk[th].solveorder for th in unk
+                              if unk[th].solved]), fs)
+        # nothing left for a second pass
+        bt.root = rank_all(sols)
+        self.assertEqual(bt.tick('rank_all', bb), b3.FAILURE, fs)
+
+
+if __name__ == "__main__":
+
+    print '\n\n===============  Test rank ====================='
+    testsuite = unittest.TestLoader().loadTestsFromTestCase(TestSolver016)
+    unittest.TextTestRunner(verbosity=2).run(testsuite)
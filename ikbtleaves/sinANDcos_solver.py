@@ -19,6 +19,7 @@
 import sympy as sp
 import numpy as np
 from sys import exit
+from logging import DEBUG
 import b3 as b3          # behavior trees
 from ikbtfunctions.helperfunctions import *
 import ikbtbasics.kin_cl as kc
@@ -93,8 +94,8 @@ class test_sinandcos_id(b3.Action):    # tester for sincos ID
         return b3.SUCCESS
 
 
-class sinandcos_id(b3.Action):    # action leaf for sincosid
-    def tick(self, tick):
+class sinandcos_id(id_leaf):    # action leaf for sincosid
+    def identify(self, tick):
         # the current list of unknowns
         unknowns = tick.blackboard.get('unknowns')
         R = tick.blackboard.get('Robot')
@@ -114,23 +115,18 @@ class sinandcos_id(b3.Action):    # action leaf for sincosid
 
         if (not u.solved):  # only if not already solved!
             for e in one_unk:  # only look at the eqns with one unknowns
-                print "Looking for unknown: ", u.symbol, " in equation: ",
-                print e
+                self.log(DEBUG, 'Looking for unknown: %s in equation: %s', u.symbol, e)
 
-                tmp = e.RHS - e.LHS
                 lhs = l_1 - l_1
-                if (tmp.has(sp.sin(u.symbol)) and tmp.has(sp.cos(u.symbol))):
-
-                    es = tmp.expand()
-                    # collect terms in sin(x) and cos(x)
-                    es = es.collect(sp.sin(u.symbol))
-                    es = es.collect(sp.cos(u.symbol))
+                t = e.features().trig(u.symbol)
+                if (t.sin and t.cos):
+                    # expanded, terms in sin(x) and cos(x) collected
+                    (ex, es, A, B, C) = e.features().sincos_form(u.symbol)
 
                     d = {}
-                    d[Aw] = es.coeff(sp.sin(u.symbol))
-                    d[Bw] = es.coeff(sp.cos(u.symbol))
-                    d[Cw] = es - d[Aw] * \
-                        sp.sin(u.symbol) - d[Bw] * sp.cos(u.symbol)
+                    d[Aw] = A
+                    d[Bw] = B
+                    d[Cw] = C
 
                     if(self.BHdebug):
                         print 'Sin AND Cos identifying: ', es
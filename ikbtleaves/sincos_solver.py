@@ -38,6 +38,7 @@ from ikbtbasics import kin_cl
 from ikbtbasics import ik_classes
 #from ik_classes import *
 
+from logging import DEBUG
 import b3 as b3          # behavior trees
 from assigner_leaf import *
 
@@ -95,9 +96,9 @@ class test_sincos_id(b3.Action):    # tester for sincos ID
         return b3.SUCCESS
 
 
-class sincos_id(b3.Action):    # action leaf for sincosid
+class sincos_id(ik_classes.id_leaf):    # action leaf for sincosid
 
-    def tick(self, tick):
+    def identify(self, tick):
         # the current list of unknowns
         unknowns = tick.blackboard.get('unknowns')
         #self.BHdebug = True
@@ -124,11 +125,11 @@ class sincos_id(b3.Action):    # action leaf for sincosid
                     print "Looking for unknown: ", u.symbol, " in equation: ",
                     e.prt()
                     print "  which has one unknown(s)"
-                if (e.RHS.has(sp.sin(u.symbol)) or e.LHS.has(sp.sin(u.symbol))) \
-                        and (e.RHS.has(sp.cos(u.symbol)) or e.LHS.has(sp.cos(u.symbol))):
+                t = e.features().trig(u.symbol)
+                if t.sin_sides and t.cos_sides:
                     continue   # this shouldbe caught by another ID
                 # we found  X = Asin(x)
-                if e.RHS.has(sp.sin(u.symbol)) or e.LHS.has(sp.sin(u.symbol)):
+                if t.sin_sides:
                     if(self.BHdebug):
                         print 'I found an sin() equation to ID: ', e
                     u.eqntosolve = e
@@ -137,7 +138,7 @@ class sincos_id(b3.Action):    # action leaf for sincosid
                     break
 
                 # we found X = Acos(x)
-                if e.RHS.has(sp.cos(u.symbol)) or e.LHS.has(sp.cos(u.symbol)):
+                if t.cos_sides:
                     if(self.BHdebug):
                         print 'I found an cos() equation to ID: ', e
                     u.eqntosolve = e
@@ -165,7 +166,7 @@ class sincos_solve(b3.Action):    # Solve asincos equation pairs
         u = tick.blackboard.get("curr_unk")
         unknowns = tick.blackboard.get("unknowns")
         # for u in unknowns:
-        print 'sincos: checking ', u.symbol
+        self.log(DEBUG, 'sincos: checking %s', u.symbol)
         #self.BHdebug = True
         if u.solvable_sincos:
             if(self.BHdebug):
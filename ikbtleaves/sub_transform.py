@@ -85,6 +85,54 @@ class test_sub_transform(b3.Action):    # tester for your ID
     #
 
 
+#
+#   Index of the Ts entries of a matrix equation, for finding the entries
+#     e1 with e2.has(e1) by looking at each subexpression of e2 once
+#     (instead of walking e2 once per e1).  e2.has(e1) if e1 is a node of
+#     e2, or e1 is an Add (Mul) whose terms (factors) are some of those of
+#     an Add (Mul) node of e2 (see sympy AssocOp._has_matcher).
+#
+class sub_index(object):
+    def __init__(self):
+        self.exact = {}     # expr: positions of the entries equal to it
+        self.parts = {}     # (Add or Mul, term): positions of Adds (Muls) with it
+        self.nparts = {}    # position: number of terms (factors)
+
+    def _assoc(self, e):
+        return isinstance(e, (sp.Add, sp.Mul)) and \
+            all([a.is_commutative for a in e.args])
+
+    def add(self, pos, e):
+        self.exact.setdefault(e, set()).add(pos)
+        if self._assoc(e):
+            args = set(e.args)
+            self.nparts[pos] = len(args)
+            for a in args:
+                self.parts.setdefault((e.func, a), set()).add(pos)
+
+    def remove(self, pos, e):
+        self.exact[e].discard(pos)
+        if self._assoc(e):
+            del self.nparts[pos]
+            for a in set(e.args):
+                self.parts[(e.func, a)].discard(pos)
+
+    # positions of the entries e1 with e2.has(e1)
+    def found_in(self, e2):
+        hits = set()
+        for n in sp.preorder_traversal(e2):
+            hits |= self.exact.get(n, set())
+            if isinstance(n, (sp.Add, sp.Mul)):
+                count = {}
+                for a in set(n.args):
+                    for pos in self.parts.get((n.func, a), ()):
+                        count[pos] = count.get(pos, 0) + 1
+                for pos in count:
+                    if count[pos] == self.nparts[pos]:
+                        hits.add(pos)
+        return hits
+
+
 class sub_transform(b3.Action):    # action leaf for
 
     def tick(self, tick):
@@ -101,11 +149,8 @@ class sub_transform(b3.Action):    # action leaf for
                 print u.symbol, ', solved: ', u.solved
             print ''
 
-        #   We're going to look at the first N equations in the mequation_list
-        # were only looking at first 2 matrix equations (at least for now)
-        N = 1
-        assert (N <= len(R.mequation_list)
-                ), 'sub_transform test wants too many meqns '
+        #   We're going to look at all the equations in the mequation_list
+        N = len(R.mequation_list)
 
         # identify elements of eqns where another elemnet can be substituted in
         #    to eliminate unknowns
@@ -117,55 +162,74 @@ class sub_transform(b3.Action):    # action leaf for
 
         cols = [0, 1, 2, 3]
         rows = [0, 1, 2]     # we don't care about row 4 ([0,0,0,1])!
+        positions = [(i, j) for i in rows for j in cols]
 
         for m in range(0, N):
-            for i in rows:
-                for j in cols:
-                    e2 = R.mequation_list[m].Ts[i, j]
-                    for k in rows:
-                        for l in cols:
-                            e1 = R.mequation_list[m].Ts[k, l]
-                            # substitute with e1 or -e1      ####################################3    *******    adapt ".has" to both LHS and RHS??
-                            if((e1 != e2) and e2 != z and e2.has(e1)):  # we found a substitution
-                                if(self.BHdebug):
-                                    print ''
-                                    print self.Name, ' found a sub transform (+)'
-                                    print e1, ' / ',  e2
-                                    print 'new: ', e2, ' = ',  e2.subs(e1, e2)
-                                nold = count_unknowns(unknowns, e2)
-                                # substitute
-                                new = e2.subs(e1, R.mequation_list[m].Td[k, l])
-                                nnew = count_unknowns(unknowns, new)
-                                if(self.BHdebug):
-                                    print 'Unknowns: old/new:', nold, '/', nnew
-                                    print 'Prop Sub: ', e2, '/', new
-                                if(nnew < nold):
-                                    R.mequation_list[m].Ts[i, j] = new
-                                    found = True
-
-                            # we found a substitution -e1
-                            elif((e1 != e2) and e2 != z and e2.has(-e1)):
-                                if(self.BHdebug):
-                                    print self.Name, ' found a (-) sub transform'
-                                    print e1, '/',  e2
-                                nold = count_unknowns(unknowns, e2)
-                                # substitute with -e1
-                                new = e2.subs(-e1, -
-                                              R.mequation_list[m].Td[k, l])
-                                nnew = count_unknowns(unknowns, new)
-                                if(self.BHdebug):
-                                    print 'Unknowns: old/new:', nold, '/', nnew
-                                    print 'Prop Sub: ', e2, '/', new
-                                if(nnew < nold):
-                                    R.mequation_list[m].Ts[i, j] = new
-                                    found = True
+            Tm = R.mequation_list[m]
+            # the entries e1 (+) and -e1 (-), indexed
+            plus = sub_index()
+            minus = sub_index()
+            for (k, l) in positions:
+                plus.add((k, l), Tm.Ts[k, l])
+                minus.add((k, l), -Tm.Ts[k, l])
+            for (i, j) in positions:
+                e2 = Tm.Ts[i, j]
+                if e2 == z:
+                    continue
+                # the entries which might be substituted into e2 (in order)
+                hp = plus.found_in(e2)
+                hm = minus.found_in(e2)
+                for (k, l) in positions:
+                    e1 = Tm.Ts[k, l]
+                    if (k, l) == (i, j) and e1 is not e2:    # (changed below)
+                        is_plus = e2.has(e1)
+                        is_minus = e2.has(-e1)
+                    else:
+                        is_plus = (k, l) in hp
+                        is_minus = (k, l) in hm
+                    # substitute with e1 or -e1      ####################################3    *******    adapt ".has" to both LHS and RHS??
+                    if((e1 != e2) and is_plus):  # we found a substitution
+                        if(self.BHdebug):
+                            print ''
+                            print self.Name, ' found a sub transform (+)'
+                            print e1, ' / ',  e2
+                            print 'new: ', e2, ' = ',  e2.subs(e1, e2)
+                        nold = count_unknowns(unknowns, e2)
+                        # substitute
+                        new = e2.subs(e1, Tm.Td[k, l])
+                        nnew = count_unknowns(unknowns, new)
+                        if(self.BHdebug):
+                            print 'Unknowns: old/new:', nold, '/', nnew
+                            print 'Prop Sub: ', e2, '/', new
+                        if(nnew < nold):
+                            Tm.Ts[i, j] = new
+                            found = True
+
+                    # we found a substitution -e1
+                    elif((e1 != e2) and is_minus):
+                        if(self.BHdebug):
+                            print self.Name, ' found a (-) sub transform'
+                            print e1, '/',  e2
+                        nold = count_unknowns(unknowns, e2)
+                        # substitute with -e1
+                        new = e2.subs(-e1, -Tm.Td[k, l])
+                        nnew = count_unknowns(unknowns, new)
+                        if(self.BHdebug):
+                            print 'Unknowns: old/new:', nold, '/', nnew
+                            print 'Prop Sub: ', e2, '/', new
+                        if(nnew < nold):
+                            Tm.Ts[i, j] = new
+                            found = True
+                if Tm.Ts[i, j] is not e2:
+                    plus.remove((i, j), e2)
+                    minus.remove((i, j), -e2)
+                    plus.add((i, j), Tm.Ts[i, j])
+                    minus.add((i, j), -Tm.Ts[i, j])
 
         if found:
             #  put the tmp_eqns list back into R !!!!  ******************************
             [L1, L2, L3p] = R.scan_for_equations(unknowns)
-            tick.blackboard.set('eqns_1u', L1)
-            tick.blackboard.set('eqns_2u', L2)
-            tick.blackboard.set('eqns_3pu', L3p)
+            set_eqn_lists(tick.blackboard, L1, L2, L3p)
             tick.blackboard.set('Robot', R)
 
         return b3.SUCCESS
@@ -190,6 +254,24 @@ class TestSolver006(unittest.TestCase):
 
     def runTest(self):
         self.test_subber()
+        self.test_index()
+
+    def test_index(self):
+        fs = 'sub_transform index FAIL'
+        (a, b, c, d) = sp.symbols('a b c d')
+        exprs = [a + b + c + d, a + b + c, a * b + c, a, -a, a * b,
+                 2 * a * b, sp.sin(th_1) * sp.cos(th_2) + sp.sin(th_5),
+                 sp.sin(th_1) * sp.cos(th_2), -sp.sin(th_1) * sp.cos(th_2),
+                 sp.cos(th_2), sp.Integer(0), sp.Integer(2)]
+        idx = sub_index()
+        for n in range(len(exprs)):
+            idx.add(n, exprs[n])
+        idx.remove(0, exprs[0])
+        idx.add(0, exprs[0])
+        for e2 in exprs:
+            self.assertEqual(idx.found_in(e2),
+                             set([n for n in range(len(exprs))
+                                  if e2.has(exprs[n])]), fs)
 
     def test_subber(self):
         sub_tester = b3.BehaviorTree()
@@ -40,6 +40,7 @@ from comp_detect import *
 from assigner_leaf import *
 from sympy.assumptions.assume import global_assumptions
 
+from logging import DEBUG
 import b3 as b3          # behavior trees
 
 sp.var('th_23')
@@ -50,8 +51,21 @@ Cw = sp.Wild('Cw')
 Dw = sp.Wild('Dw')
 
 
-class tan_id(b3.Action):    # action leaf for ID eqns solved by atan2()
-    def tick(self, tick):
+#
+#   tan_id candidate 0 = A*f(th) + B (f = sp.sin or sp.cos), decomposed:
+#     (collected eqn, A, B, unsolved unknowns in A), or None if B has
+#     unsolved unknowns (then it can't be part of a pair)
+#
+def tan_signature(unknowns, e, symbol, f):
+    (collected, d) = e.features().tan_form(symbol, f)
+    if d is None or count_unknowns(unknowns, d[Bw]) > 0:
+        return None
+    return (collected, d[Aw], d[Bw],
+            frozenset([v.symbol for v in get_unknowns(unknowns, d[Aw])]))
+
+
+class tan_id(id_leaf):    # action leaf for ID eqns solved by atan2()
+    def identify(self, tick):
         # the current list of unknowns
         unknowns = tick.blackboard.get('unknowns')
         R = tick.blackboard.get('Robot')
@@ -70,17 +84,16 @@ class tan_id(b3.Action):    # action leaf for ID eqns solved by atan2()
 
         # only if not identified as solvable by tangent yet
         if (not u.solvable_tan) and (not u.solved):
-            terms = [sp.sin(u.symbol), sp.cos(u.symbol)]
-
             sin_eqn = []
             cos_eqn = []
 
             for e in (one_unk + two_unk):   # spot the ones with common factors as well
+                if u.symbol not in e.free_symbols():
+                    continue        # (quick check before building tmp)
 
                 # fix the eqn, but not changing the original equation - DZ
-                tmp = e.RHS - e.LHS
-                lhs = l_1 - l_1
-                if(not (tmp).has(u.symbol)):
+                f = e.features()
+                if u.symbol not in f.symbols:
                     continue        # only look at equations having the current unknown in them
                 if(self.BHdebug):
                     print "\n\n  tan_id:        Looking for unknown: ", u.symbol, " in equation: ",
@@ -88,59 +101,51 @@ class tan_id(b3.Action):    # action leaf for ID eqns solved by atan2()
                     print "  which has ", count_unknowns(unknowns, e.RHS), " unknown(s) in RHS"
                     print "     and    ", count_unknowns(unknowns, e.LHS), " unknown(s) in LHS"
 
-                if (tmp.has(sp.sin(u.symbol)) and tmp.has(sp.cos(u.symbol))):
+                t = f.trig(u.symbol)
+                if (t.sin and t.cos):
                     continue   # this should be caught by sinANDcos solver
 
-                if tmp.has(sp.sin(u.symbol)):
+                if t.sin:
                     sin_eqn.append(e)
-                if tmp.has(sp.cos(u.symbol)):
+                if t.cos:
                     cos_eqn.append(e)
 
+            # each candidate once: 0 = Aw*sin(th) + Bw or 0 = Cw*cos(th) + Dw
+            #   A pair needs Bw, Dw and Aw/Cw free of unsolved unknowns, so
+            #   only pair the sin eqns with the cos eqns having the same
+            #   unsolved unknowns in Cw as in Aw (else Aw/Cw has some).
+            sins = []
+            coss = {}
             for es in sin_eqn:
-                # get all the sin(th)s collected
-                estst = (es.RHS - es.LHS).collect(terms)
-                d1 = estst.match(Aw * sp.sin(u.symbol) + Bw)
+                sig = tan_signature(unknowns, es, u.symbol, sp.sin)
+                if sig is not None:
+                    sins.append(sig)
+            for ec in cos_eqn:
+                sig = tan_signature(unknowns, ec, u.symbol, sp.cos)
+                if sig is not None:
+                    coss.setdefault(sig[3], []).append(sig)
+
+            for (estst, A, B, unks) in sins:
                 if self.BHdebug:
                     print '---'
-                    print "\nsin equ: "
-                    print u.eqntosolve
+                    print "\nsin equ: ", estst
                     print "\nsin(): coefficients are : "
-                    print d1[Aw]
+                    print A
                     print '---'
-                for ec in cos_eqn:
-                    # get all the cos(th)s collected
-                    ectst = (ec.RHS - ec.LHS).collect(terms)
-                    d2 = ectst.match(Cw * sp.cos(u.symbol) + Dw)
-                    if self.BHdebug:
-                        print "\ncos equ: "
-                        print u.secondeqn
-                        print "\ncos(): coefficients"
-                        print d2[Cw]
-
-                    # check some things about potential solvable equations
-                    assert(d1 is not None and d2 is not None), 'somethings wrong!'
-                    co = d1[Aw] / d2[Cw]   # take ratio
-                    # it's not solvable if (simplified) coefficient contains unknowns, or other parts have unknowns
-
-                    print 'tan_id: (', u.symbol, ')   0 =  Aw*sin(th)+Bw , 0 = Cw*cos(th) + Dw '
-                    print 'Aw: ', d1[Aw], '   Bw: ', d1[Bw]
-                    print 'Cw: ', d2[Cw], '   Dw: ', d2[Dw]
-
-                    too_many_unknowns = False
-                    if count_unknowns(unknowns, co) > 0 or count_unknowns(unknowns, d1[Bw]) > 0 or count_unknowns(unknowns, d2[Dw]) > 0:
-                        too_many_unknowns = True
+                for (ectst, C, D, unks2) in coss.get(unks, []):
+                    co = A / C   # take ratio
+                    # it's not solvable if (simplified) coefficient contains unknowns
+
+                    self.log(DEBUG, 'tan_id: ( %s )   0 =  Aw*sin(th)+Bw , 0 = Cw*cos(th) + Dw \n'
+                             'Aw: %s   Bw: %s\nCw: %s   Dw: %s', u.symbol, A, B, C, D)
 
                     # a good match / solution candidate
-                    if not too_many_unknowns:
+                    if len(unks) == 0 or count_unknowns(unknowns, co) == 0:
                         found = True  # found both terms for at least one variable
                         u.eqntosolve = kc.kequation(0, estst)
                         u.secondeqn = kc.kequation(0, ectst)
                         u.readytosolve = True
-                        # u.eqntosolve and secondeqn are already set up above
-                        print 'tan_id:  able to solve', u.symbol
-                        # cancellable unsolved term, add the nonzero assumption
-                        if count_unknowns(unknowns, co) > 0:
-                            global_assumptions.add(sp.Q.nonzero(d2[Cw]))
+                        self.log(DEBUG, 'tan_id:  able to solve %s', u.symbol)
                         u.solvemethod = "atan2(y,x)"
                         u.solvable_tan = True
 
@@ -149,13 +154,7 @@ class tan_id(b3.Action):    # action leaf for ID eqns solved by atan2()
                         e1tmp = u.eqntosolve.RHS + u.eqntosolve.LHS
                         e2tmp = u.secondeqn.RHS + u.secondeqn.LHS
                         print '                       ', u.eqntosolve, '  (', count_unknowns(unknowns, e1tmp), 'unks)'
-                        for u in get_unknowns(unknowns, e1tmp):
-                            print u.symbol,
-                        print''
                         print '                       ', u.secondeqn, '  (', count_unknowns(unknowns, e2tmp), 'unks)'
-                        for u in get_unknowns(unknowns, e1tmp):
-                            print u.symbol,
-                        print''
                         print ''
                     if found:
                         break
@@ -187,7 +186,7 @@ class tan_solve(b3.Action):    # Solve sin cos equation pairs
         for unk in unknowns:
             if not unk.solved:
                 unk_unsol.append(unk)
-                print 'tan_solve(): Not yet solved: ', unk.symbol
+                self.log(DEBUG, 'tan_solve(): Not yet solved: %s', unk.symbol)
 
         fsolved = False
         if u.solvable_tan:
@@ -222,7 +221,7 @@ class tan_solve(b3.Action):    # Solve sin cos equation pairs
             assert(count_unknowns(unknowns, d2[Bw]) == 0), fs
 
             # construct solutions
-            print 'tan_solver Denominators: ', d[Aw], d2[Aw]
+            self.log(DEBUG, 'tan_solver Denominators: %s %s', d[Aw], d2[Aw])
 
             co = d[Aw] / d2[Aw]  # coefficients of Y and X
             Y = x - d[Bw]
@@ -369,6 +368,31 @@ class TestSolver004(unittest.TestCase):
 
     def runTest(self):
         self.test_tansolver()
+        self.test_signatures()
+
+    def test_signatures(self):
+        fs = 'tan_id candidate pairing FAIL'
+        (l_1, l_2, Px, Py, Pz) = sp.symbols('l_1 l_2 Px Py Pz')
+        unks = [unknown(th_1), unknown(th_2)]
+        e1 = kequation(0, l_1 * sp.sin(th_1) + Px)
+        e2 = kequation(0, l_1 * sp.sin(th_1) + th_2)     # (Bw has th_2)
+        e3 = kequation(0, th_2 * sp.cos(th_1) + Py)      # (th_2 in Cw)
+        e4 = kequation(0, l_2 * sp.cos(th_1) + Pz)
+        self.assertEqual(tan_signature(unks, e1, th_1, sp.sin)[1:],
+                         (l_1, Px, frozenset()), fs)
+        self.assertEqual(tan_signature(unks, e2, th_1, sp.sin), None, fs)
+        self.assertEqual(tan_signature(unks, e3, th_1, sp.cos)[3],
+                         frozenset([th_2]), fs)
+
+        bb = b3.Blackboard()
+        bb.set('unknowns', unks)
+        bb.set('curr_unk', unks[0])
+        set_eqn_lists(bb, [], [e2, e3, e1, e4], [])
+        bt = b3.BehaviorTree()
+        bt.root = tan_id()
+        self.assertEqual(bt.tick('tan_id pairs', bb), b3.SUCCESS, fs)
+        self.assertEqual(unks[0].eqntosolve.RHS, e1.RHS, fs)
+        self.assertEqual(unks[0].secondeqn.RHS, e4.RHS, fs)
 
     def test_tansolver(self):
         ik_tester = b3.BehaviorTree()
@@ -23,6 +23,7 @@ from ikbtbasics.kin_cl import *
 from ikbtbasics.ik_classes import *
 from sys import exit
 import b3 as b3          # behavior trees
+import ikbtfunctions.parallel_simplify as ps
 
 
 Aw = sp.Wild('Aw')
@@ -36,13 +37,13 @@ thy = sp.Wild('thy')
 thz = sp.Wild('thz')
 
 
-class simu_id(b3.Action):
+class simu_id(id_leaf):
     # finding
     #    c = Asin(th1) + Bcos(th1)
     #    d = Acos(th1) - Bsin(th2)  (nice arctan solution)
     #
 
-    def tick(self, tick):
+    def identify(self, tick):
         curr_unk = tick.blackboard.get('curr_unk')
         unknowns = tick.blackboard.get('unknowns')
         R = tick.blackboard.get('Robot')
@@ -57,15 +58,16 @@ class simu_id(b3.Action):
         eq2 = None
 
         eqn_list = []
+        coeffs = []     # (coefficient of sin(), of cos()) of each
         if not curr_unk.solved:
             for e in one_unk:
-                e_flat = e.RHS - e.LHS
-                e_flat = e_flat.expand()
-                if e_flat.has(curr_unk.symbol) and e_flat.has(curr_unk.symbol):
-                    e_flat = e_flat.collect(sp.sin(curr_unk.symbol))
-                    e_flat = e_flat.collect(sp.cos(curr_unk.symbol))
+                if curr_unk.symbol not in e.free_symbols():
+                    continue
+                (ex, e_flat, A, B, C) = e.features().sincos_form(curr_unk.symbol)
+                if curr_unk.symbol in free_symbols(ex):
                     if e_flat not in eqn_list:
                         eqn_list.append(e_flat)
+                        coeffs.append((A, B))
 
             if self.BHdebug:
                 print "potential list: "
@@ -76,8 +78,7 @@ class simu_id(b3.Action):
                 # previouly used sp.match, which fails when expr too complicated
                 # collect coefficients manually
                 d1 = {}
-                d1[Aw] = e_flat.coeff(sp.sin(curr_unk.symbol))
-                d1[Bw] = e_flat.coeff(sp.cos(curr_unk.symbol))
+                (d1[Aw], d1[Bw]) = coeffs[i]
 
                 if self.BHdebug:
                     print "considering eqn: ", e_flat
@@ -91,33 +92,37 @@ class simu_id(b3.Action):
                         continue
 
                     d2 = {}
-                    d2[Aw] = e_flat.coeff(sp.cos(curr_unk.symbol))
-                    d2[Bw] = -e_flat.coeff(sp.sin(curr_unk.symbol))
+                    d2[Aw] = coeffs[j][1]
+                    d2[Bw] = -coeffs[j][0]
 
                     if self.BHdebug:
                         print "considering eqn: ", e_flat
                         print "d2 content (a, b)"
                         print d2[Aw], '\n', d2[Bw]
 
-                    eq2 = e_flat
-                    if (d1[Aw] == d2[Aw] or d1[Aw] == -d2[Aw]) \
-                            and (d1[Bw] == d2[Bw] or d1[Bw] == -d2[Bw]):
-                        found = True
-                        if self.BHdebug:
-                            print "found two equ two unknown"
-                            print eq1
-                            print eq2
+                    # simu_solver needs  0 = A*sin(th) + B*cos(th) - C
+                    #                    0 = A*cos(th) - B*sin(th) - D
+                    #   with the same A and B (mixed signs are not of this
+                    #   form), so flip the sign of the second one if needed.
+                    pair = None
+                    if d1[Aw] == d2[Aw] and d1[Bw] == d2[Bw]:
+                        pair = (eq1, e_flat)
+                    elif d1[Aw] == -d2[Aw] and d1[Bw] == -d2[Bw]:
+                        pair = (eq1, -e_flat)
                     # it's also possible the order is reversed
                     # if that's the case, swap
                     elif (d1[Aw] == d2[Bw] or d1[Aw] == -d2[Bw]) \
                             and (d1[Bw] == d2[Aw] or d1[Bw] == -d2[Aw]):
                         print "reverse order"
-                        found = True
-                        temp = eq1
-                        eq1 = eq2
-                        eq2 = temp
+                        pair = (e_flat, eq1)
 
-                    if found:
+                    if pair is not None:
+                        found = True
+                        (eq1, eq2) = pair
+                        if self.BHdebug:
+                            print "found two equ two unknown"
+                            print eq1
+                            print eq2
                         curr_unk.solvemethod = "simultaneous eqn"
                         curr_unk.eqntosolve = kequation(0, eq1)
                         curr_unk.secondeqn = kequation(0, eq2)
@@ -140,10 +145,9 @@ class simu_solver(b3.Action):
         B = eq1.coeff(sp.cos(curr_unk.symbol))
 
         C = A * sp.sin(curr_unk.symbol) + B * sp.cos(curr_unk.symbol) - eq1
-        C = C.simplify()
-
         D = A * sp.cos(curr_unk.symbol) - B * sp.sin(curr_unk.symbol) - eq2
-        D = D.simplify()
+        # (cut off when this leaf's time budget, if any, runs out)
+        [C, D] = ps.simplify_all([C, D], timeout=b3.remaining(tick))
 
         if C == 0 and D == 0:
             print "Simultaneous Eqn Unsuccessful: divded by 0"
@@ -211,6 +215,25 @@ class TestSolverm7(unittest.TestCase):
         curr = bb.get('curr_unk')
         print curr.solutions
 
+        # check the solution numerically, also with the sign of the
+        #   second equation flipped
+        fs = 'two_eqn_m7  FAIL'
+        vals = {th_1: 0.3, th_3: 0.4, Py: 0.1, a_2: 0.4, a_3: 0.05, d_4: 0.43}
+        th23 = 0.6
+        X = Px * sp.cos(th_1) + Py * sp.sin(th_1)
+        sol = sp.solve([exp1.subs(th_23, th23).subs(vals),
+                        exp2.subs(th_23, th23).subs(vals)], [Px, Pz])
+        vals[Px] = sol[Px]
+        vals[Pz] = sol[Pz]
+        for e2 in [exp2, -exp2]:
+            u = unknown(th_23)
+            bb.set('curr_unk', u)
+            bb.set('eqns_1u', [kequation(0, exp1), kequation(0, e2)])
+            bb.set('unknowns', [uth1, uth2, u])
+            ik_tester.tick("testing two_eqn_m7", bb)
+            self.assertTrue(u.solved, fs)
+            self.assertAlmostEqual(float(u.solutions[0].subs(vals)), th23, 9, fs)
+
 
 def run_test():
     suite2 = unittest.TestLoader().loadTestsFromTestCase(TestSolverm7)
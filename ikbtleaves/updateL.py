@@ -45,9 +45,7 @@ class updateL(b3.Action):    # Set up the equation lists
         [L1, L2, L3p] = R.scan_for_equations(
             variables)   # get the equation lists
 
-        tick.blackboard.set('eqns_1u', L1)  # eqns w/ 1 unknown
-        tick.blackboard.set('eqns_2u', L2)  # eqns w/ 2 unknowns
-        tick.blackboard.set('eqns_3pu', L3p)  # eqns w/ 3 unknowns
+        set_eqn_lists(tick.blackboard, L1, L2, L3p)
         tick.blackboard.set('Robot', R)
         return b3.SUCCESS
 
@@ -76,19 +74,19 @@ class TestSolver007(unittest.TestCase):
         #   The famous Puma 560  (solved in Craig)
         #
         import os as os
+        # return [dh, vv, params, pvals, variables]
+        robot = 'Puma'
+        [dh, vv, params, pvals, unknowns] = robot_params(
+            robot)  # see ik_robots.py
+
         print '\n------------'
         print 'Current dir: ', os.getcwd()
-        pickname = 'fk_eqns/Puma_pickle.p'
+        pickname = 'fk_eqns/' + fk_entry_key(dh, vv, unknowns) + '_pickle.p'
         if(os.path.isfile(pickname)):
             print 'a pickle file will be used to speed up'
         else:
             print 'There was no pickle file'
         print '------------'
-
-        # return [dh, vv, params, pvals, variables]
-        robot = 'Puma'
-        [dh, vv, params, pvals, unknowns] = robot_params(
-            robot)  # see ik_robots.py
         # def kinematics_pickle(rname, dh, constants, pvals, vv, unks, test):
         Test = True
         [M, R, unk_Puma] = kinematics_pickle(
@@ -144,6 +142,17 @@ class TestSolver007(unittest.TestCase):
         # when initialized solveN=0 set_solved should increment it
         self.assertTrue(R.solveN == 1, fs)
 
+        # incremental rescan after a solution must match a full rescan
+        fs = 'updateL: incremental scan_for_equations   FAIL '
+        Linc = R.scan_for_equations(unk_Puma)
+        self.assertTrue(len(R.eqn_index[u.symbol]) > 0, fs)
+        R.reset_equation_index()
+        Lfull = R.scan_for_equations(unk_Puma)
+        for n in range(3):
+            self.assertEqual([str(e) for e in Linc[n]],
+                             [str(e) for e in Lfull[n]], fs)
+        self.assertTrue(len(Linc[0]) != len(L1) or len(Linc[1]) != len(L2), fs)
+
         # solutiontreenodes no longer used
         # self.assertTrue(len(R.solutiontreenodes) == 3, fs)  # we should now have three nodes (root + two solns)
 
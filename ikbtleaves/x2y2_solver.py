@@ -23,6 +23,7 @@
 # 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
 
 # THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import unittest
 import sympy as sp
 import numpy as np
 from sys import exit
@@ -32,11 +33,45 @@ from ikbtbasics.kin_cl import *
 # special classes for Inverse kinematics in sympy
 from ikbtbasics.ik_classes import *
 from ikbtfunctions.ik_robots import *
+import ikbtfunctions.parallel_simplify as ps
+from logging import DEBUG, INFO
 
 
 sp.var('th_23 Px Py Pz')
 
 
+#  sp.simplify() of each of exprs (through ps.simplify_all()), remembering
+#    the results: x2z2 tries the same sums of squares on every tick and for
+#    every unknown.
+SIMPLIFY_MEMO_MAX = 5000
+simplify_memo = {}
+
+
+def simplify_memo_all(exprs, timeout=None):
+    todo = []
+    for e in exprs:
+        if e not in simplify_memo and e not in todo:
+            todo.append(e)
+    if todo:
+        results = ps.simplify_all(todo, timeout=timeout)
+        if len(simplify_memo) + len(todo) > SIMPLIFY_MEMO_MAX:
+            simplify_memo.clear()
+        simplify_memo.update(zip(todo, results))
+    return [simplify_memo[e] for e in exprs]
+
+
+#  symbols of the unsolved unknowns in expr (after expanding the sum of
+#    angles variables, as in expr.subs(soa_expansions), if soa)
+def unsolved_symbols(unknowns, expr, soa=False):
+    syms = free_symbols(expr)
+    if soa:
+        syms = set()
+        for s in free_symbols(expr):
+            syms |= free_symbols(soa_expansions.get(s, s))
+    return frozenset([u.symbol for u in unknowns
+                      if not u.solved and u.symbol in syms])
+
+
 class test_x2z2(b3.Action):    # tester for your ID
     def tick(self, tick):
 
@@ -86,6 +121,8 @@ class test_x2z2(b3.Action):    # tester for your ID
             tick.blackboard.set('eqns_3pu', L3p)
 
             tick.blackboard.set('unknowns', variables)
+            tick.blackboard.set('curr_unk', [v for v in variables
+                                             if v.symbol == th_3][0])
             tick.blackboard.set('Robot', R)
             return b3.SUCCESS
 
@@ -94,7 +131,7 @@ class test_x2z2(b3.Action):    # tester for your ID
             #   The famous Puma 560  (solved in Craig)
             #
             robot = 'Puma'
-            [dh_Puma560, vv_Puma,  params_puma,
+            [dh_Puma560, vv_Puma, params_puma, pvals_puma,
                 unk_Puma] = robot_params('Puma')
 
             dh = dh_Puma560
@@ -111,7 +148,7 @@ class test_x2z2(b3.Action):    # tester for your ID
             print 'Testing x2z2solver with Puma Kinematics'
             # read kinematic model from pickle file / or compute it from scratch
             [M, R, variables] = kinematics_pickle(
-                robot, dh, params_puma, vv, variables)
+                robot, dh, params_puma, pvals_puma, vv, variables, True)
 
             # check the pickle in case DH params were changed in robot_params making the
             #       pickle obsolete.
@@ -133,6 +170,8 @@ class test_x2z2(b3.Action):    # tester for your ID
             tick.blackboard.set('eqns_3pu', L3p)
 
             tick.blackboard.set('unknowns', variables)
+            tick.blackboard.set('curr_unk', [v for v in variables
+                                             if v.symbol == th_3][0])
             tick.blackboard.set('Robot', R)
 
             return b3.SUCCESS
@@ -150,13 +189,8 @@ class x2z2_id_solve(b3.Action):  # This time we combine into a single ID/Solve l
 
         u = tick.blackboard.get('curr_unk')
 
-        if(self.BHdebug):
-            print "x2z2, running: ", self.Name
-            print 'len(3p): ', len(more_unk)
-            print 'len(2): ', len(two_unk)
-            print 'len(1): ', len(one_unk)
-            print "currently looking at: ", u.symbol
-            # sp.pprint(Tm.Ts)
+        self.log(DEBUG, 'x2z2, running: %s\nlen(3p): %d\nlen(2): %d\nlen(1): %d\ncurrently looking at: %s',
+                 self.Name, len(more_unk), len(two_unk), len(one_unk), u.symbol)
 
         solved = False
 
@@ -165,73 +199,74 @@ class x2z2_id_solve(b3.Action):  # This time we combine into a single ID/Solve l
 
         eqn_ls = []
 
-        # for debugging Puma, comment out for others
-        # note: x2y2 is very costly, and less likely to be used
-        if not u.symbol == th_3:
+        if u.solved:
             return b3.FAILURE
 
         for e in (two_unk):  # only two-unk list is enough
-            tmp = e.RHS + e.LHS
-            if (tmp.has(Py) or tmp.has(Px) or tmp.has(Pz)):
+            syms = e.features().side_symbols
+            if (Py in syms or Px in syms or Pz in syms):
                 eqn_ls.append(e)
 
         found = False
 
-        if (self.BHdebug):
-            print "found potential eqn list: ", len(eqn_ls)
-            print eqn_ls
+        self.log(DEBUG, 'found potential eqn list: %d\n%s', len(eqn_ls), eqn_ls)
 
+        # A pair works if the LHS sum of squares simplifies to no unknowns
+        #   and the RHS sum to just u.  An unknown in only one eqn of the
+        #   pair can't cancel out of the sum, so only pairs with the same
+        #   unknowns on the left, and on the right up to u, can work.
+        sigs = [(unsolved_symbols(unknowns, e.LHS),
+                 unsolved_symbols(unknowns, e.RHS, True)) for e in eqn_ls]
+        pairs = []
         for i in range(len(eqn_ls)):
-            eqn1 = eqn_ls[i]
-            r1 = eqn1.RHS
-            l1 = eqn1.LHS
             for j in range(i + 1, len(eqn_ls)):
-                eqn2 = eqn_ls[j]
-                r2 = eqn2.RHS
-                l2 = eqn2.LHS
-
-                if (self.BHdebug):
-                    print "currently evaluating: "
-                    print eqn1
-                    print eqn2
-                    print "\n"
-
-                temp_l = l1 * l1 + l2 * l2
-                temp_l = temp_l.simplify()
-
-                if count_unknowns(unknowns, temp_l) == 0:
-
-                    temp_r = r1 * r1 + r2 * r2
-
-                    temp_r = temp_r.simplify()
-
-                    temp_r = temp_r.subs(soa_expansions)
-
-                    temp_r = temp_r.simplify()
-
-                    if count_unknowns(unknowns, temp_r) == 1:
-                        print "found eqn for x2y2!"
-                        found = True
-                if found:
+                if sigs[i][0] != sigs[j][0]:
+                    continue
+                if (sigs[i][1] ^ sigs[j][1]) - set([u.symbol]):
+                    continue
+                if u.symbol in (sigs[i][1] | sigs[j][1]):
+                    pairs.append([eqn_ls[i], eqn_ls[j]])
+
+        # the simplifications of each pair are independent: do them a
+        #   batch of pairs at a time (one pair per worker process), taking
+        #   the first pair that works
+        nb = ps.batch_size()
+
+        for b0 in range(0, len(pairs), nb):
+            batch = pairs[b0:b0 + nb]
+            L = simplify_memo_all([e1.LHS * e1.LHS + e2.LHS * e2.LHS for [e1, e2] in batch],
+                                  timeout=b3.remaining(tick))
+            cand = [n for n in range(len(batch)) if count_unknowns(unknowns, L[n]) == 0]
+            Rs = simplify_memo_all([batch[n][0].RHS * batch[n][0].RHS +
+                                    batch[n][1].RHS * batch[n][1].RHS for n in cand],
+                                   timeout=b3.remaining(tick))
+            Rs = simplify_memo_all([r.subs(soa_expansions) for r in Rs],
+                                   timeout=b3.remaining(tick))
+
+            for m in range(len(cand)):
+                [eqn1, eqn2] = batch[cand[m]]
+                self.log(DEBUG, 'currently evaluating: \n%s\n%s\n', eqn1, eqn2)
+                if count_unknowns(unknowns, Rs[m]) == 1 and \
+                        u.symbol in free_symbols(Rs[m]):
+                    self.log(INFO, 'found eqn for x2y2!')
+                    temp_l = L[cand[m]]
+                    temp_r = Rs[m]
+                    found = True
                     break
             if found:
                 break
 
         if not found:
-            print "x2y2 did not find suitable eqns"
+            self.log(DEBUG, 'x2y2 did not find suitable eqns')
             return b3.FAILURE
 
-        # find the current unknown
-        for u in unknowns:
-            if temp_r.has(u.symbol):
-                unknown = u
-                unk = u.symbol
-                if self.BHdebug:
-                    print ' The unknown variable is: ', unk
+        unknown = u
+        unk = u.symbol
+        self.log(DEBUG, ' The unknown variable is: %s', unk)
 
         if not unknown.solved:
             if (temp_r.has(sp.sin(unk)) and temp_r.has(sp.cos(unk))):
-                print "x2z2: found sin and cos terms"
+                self.log(DEBUG, 'x2z2: found sin and cos terms')
                 Aw = sp.Wild("Aw")
                 Bw = sp.Wild("Bw")
                 Cw = sp.Wild("Cw")
@@ -243,17 +278,16 @@ class x2z2_id_solve(b3.Action):  # This time we combine into a single ID/Solve l
                 #rhs = rhs.collect(sp.cos(unk))
 
                 d = rhs.match(Aw * sp.sin(unk) + Bw * sp.cos(unk) - Cw)
-                if(self.BHdebug):
-                    print 'x2z2: Sin AND Cos processing: ', rhs
-                    if(d is not None):
-                        print 'Aw: ', d[Aw], ' Bw: ', d[Bw], ' Cw: ', d[Cw]
-                    else:
-                        print 'Parse not successful'
+                self.log(DEBUG, 'x2z2: Sin AND Cos processing: %s', rhs)
+                if(d is not None):
+                    self.log(DEBUG, 'Aw: %s  Bw: %s  Cw: %s', d[Aw], d[Bw], d[Cw])
+                else:
+                    self.log(DEBUG, 'Parse not successful')
                 if(d is None):
-                    print "x2z2_solve:  Somethings Wrong!"
+                    self.log(INFO, 'x2z2_solve:  Somethings Wrong!')
                     return b3.FAILURE
                 else:
-                    print "I'm working up a solution for ", unknown
+                    self.log(INFO, "I'm working up a solution for %s", unknown)
                     #lhs = temp_l - d[Cw]
 
                     A = d[Aw]
@@ -266,10 +300,7 @@ class x2z2_id_solve(b3.Action):  # This time we combine into a single ID/Solve l
                     #     r1=sp.sqrt(2)*A     # arg is always positive
                     #  generate the solutions
 
-                    if(self.BHdebug):
-                        print 'I think I solved ', unknown.symbol
-                        sp.pprint(unknown.solutions)
-                        print ''
+                    self.log(DEBUG, 'I think I solved %s\n%s\n', unknown.symbol, unknown.solutions)
 
                     # unknown.solutions.append(sp.asin(lhs/r1)-sp.atan2(A,B))
                     #unknown.solutions.append(sp.pi - sp.asin(lhs/r1)-sp.atan2(A,B))
@@ -293,6 +324,82 @@ class x2z2_id_solve(b3.Action):  # This time we combine into a single ID/Solve l
             return b3.FAILURE
 
 
+class TestSolver017(unittest.TestCase):
+    def runTest(self):
+        self.test_no_pair()
+        self.test_other_unknown()
+
+    #  blackboard for x2z2_id_solve(): the x and z position eqns, th_1 solved
+    def setup(self, Ts03, Ts23, curr):
+        Td = ik_lhs()
+        Ts = sp.zeros(4)
+        Td[0, 3] = sp.cos(th_1) * Px + sp.sin(th_1) * Py
+        Ts[0, 3] = Ts03
+        Td[2, 3] = -Pz
+        Ts[2, 3] = Ts23
+        R = Robot()
+        R.mequation_list = [matrix_equation(Td, Ts)]
+        variables = [unknown(v) for v in [th_1, th_2, th_23, th_3, th_4,
+                                          th_5]]
+        R.generate_solution_nodes(variables)
+        variables[0].solutions.append(a_3)
+        variables[0].nsolutions = 1
+        variables[0].set_solved(R, variables)
+        R.sum_of_angles_transform(variables)
+        [L1, L2, L3p] = R.scan_for_equations(variables)
+        bb = b3.Blackboard()
+        bb.set('eqns_1u', L1)
+        bb.set('eqns_2u', L2)
+        bb.set('eqns_3pu', L3p)
+        bb.set('unknowns', variables)
+        bb.set('curr_unk', [v for v in variables if v.symbol == curr][0])
+        bb.set('Robot', R)
+        return bb
+
+    def test_no_pair(self):
+        # th_4 is in only one of the eqns: it can't cancel out, so the pair
+        #   is not even simplified
+        global simplify_memo_all
+        fs = 'x2z2 pair filter  FAIL'
+        bb = self.setup(a_2 * sp.cos(th_2) + a_3 * sp.cos(th_3),
+                        a_2 * sp.sin(th_2) + a_3 * sp.sin(th_4), th_3)
+        self.assertEqual(len(bb.get('eqns_2u')), 2, fs)
+        calls = []
+        memo_all = simplify_memo_all
+
+        def count(exprs, timeout=None):
+            calls.append(exprs)
+            return memo_all(exprs, timeout)
+        simplify_memo_all = count
+        try:
+            bt = b3.BehaviorTree()
+            bt.root = x2z2_id_solve()
+            self.assertEqual(bt.tick('x2z2 no pair', bb), b3.FAILURE, fs)
+        finally:
+            simplify_memo_all = memo_all
+        self.assertEqual(calls, [], fs)
+        self.assertFalse(bb.get('curr_unk').solved, fs)
+
+    def test_other_unknown(self):
+        # the Puma's x2z2 eqns with th_2 and th_3 swapped: solves th_2
+        fs = 'x2z2 id/solver (th_2)  FAIL'
+        bb = self.setup(a_3 * sp.cos(th_23) - d_4 * sp.sin(th_23) +
+                        a_2 * sp.cos(th_3),
+                        a_3 * sp.sin(th_23) + d_4 * sp.cos(th_23) +
+                        a_2 * sp.sin(th_3), th_2)
+        bt = b3.BehaviorTree()
+        bt.root = x2z2_id_solve()
+        self.assertEqual(bt.tick('x2z2 th_2', bb), b3.SUCCESS, fs)
+        unk = dict([(u.symbol, u) for u in bb.get('unknowns')])
+        self.assertTrue(unk[th_2].solved, fs)
+        self.assertFalse(unk[th_3].solved, fs)
+        self.assertEqual((unk[th_2].nsolutions, unk[th_2].solvemethod),
+                         (2, 'x2y2'), fs)
+        for sol in unk[th_2].solutions:
+            self.assertEqual(free_symbols(sol) & set([th_2, th_3, th_23]),
+                             set(), fs)
+
+
 #  put in test code here.  See sinANDcos.py for example
 #
 if __name__ == '__main__':
@@ -358,13 +465,12 @@ if __name__ == '__main__':
             ntests += 1
             assert(u.nsolutions == 2), fs
             print u.solutions[0]
-            c1 = sp.cos(th_1)
-            s1 = sp.sin(th_1)
-            term2 = sp.asin((Px**2 * c1**2 + Px * Py * sp.sin(2 * th_1) + Py**2 * s1**2 + Pz**2 - a_2**2 - a_3**2 -
-                             d_4**2) / sp.sqrt(4 * a_2**2 * a_3**2 + 4 * a_2**2 * d_4**2)) - sp.atan2(2 * a_2 * a_3, -2 * a_2 * d_4)
-
-            term2a = -sp.asin((Px**2 * c1**2 + Px * Py * sp.sin(2 * th_1) +
-                               Py**2 * s1**2 + Pz**2 - a_2**2 - a_3**2 - d_4**2) / sp.sqrt(4 * a_2**2 * a_3**2 + 4 * a_2**2 * d_4**2)) - sp.atan2(2 * a_2 * a_3, -2 * a_2 * d_4) + sp.pi
+            # atan2(A, B) + atan2(+-sqrt(A**2 + B**2 - C**2), C)
+            C = ((Px * sp.cos(th_1) + Py * sp.sin(th_1))**2 + (Pz - d_1)**2 -
+                 a_2**2 - a_3**2 - d_4**2)
+            t = sp.sqrt(4 * a_2**2 * a_3**2 + 4 * a_2**2 * d_4**2 - C**2)
+            term2 = sp.atan2(-2 * a_2 * d_4, 2 * a_2 * a_3) + sp.atan2(t, C)
+            term2a = sp.atan2(-2 * a_2 * d_4, 2 * a_2 * a_3) + sp.atan2(-t, C)
 
             assert (u.solutions[0] == term2), fs + ' th_3'
             print ' '
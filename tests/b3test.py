@@ -0,0 +1,357 @@
+#!/usr/bin/python
+#
+#     Test additions to the b3 behavior tree package
+#
+# Copyright 2017 University of Washington
+
+# Developed by Dianmu Zhang and Blake Hannaford
+# BioRobotics Lab, University of Washington
+
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import os as os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+import logging
+import StringIO
+import time
+
+sys.path.append('../')
+# allow this test to go 'up' to project main dir.
+import b3 as b3
+from b3.core import speculate
+
+
+#  a leaf which takes a fixed (fake) time and returns a fixed status
+class timed_leaf(b3.Action):
+    def __init__(self, clock, dt, status):
+        super(timed_leaf, self).__init__()
+        self.clock = clock
+        self.dt = dt
+        self.status = status
+
+    def tick(self, tick):
+        self.clock[0] += self.dt
+        return self.status
+
+
+#  a leaf which appends its name to the blackboard list 'seen' (if
+#    touch) and returns a fixed status
+#  touch 1: add Name to 'seen' in base memory, 2: count ticks in node memory
+class bb_leaf(b3.Action):
+    here = []       # Names of the leaves ticked in this process
+
+    def __init__(self, name, status, touch):
+        super(bb_leaf, self).__init__()
+        self.Name = name
+        self.status = status
+        self.touch = touch
+        self.Cost = 1
+
+    def tick(self, tick):
+        if self.touch == 1:
+            tick.blackboard.set('seen', tick.blackboard.get('seen') + [self.Name])
+        elif self.touch == 2:
+            bb = tick.blackboard
+            k = bb.get('n', tick.tree.id, self.id) or 0
+            bb.set('n', k + 1, tick.tree.id, self.id)
+        bb_leaf.here.append(self.Name)
+        return self.status
+
+
+#  a leaf which works for dt (real) seconds: in a hard timed_call() worker,
+#    or (worker=False) here, checking the time every 10ms
+class slow_leaf(b3.Action):
+    def __init__(self, dt, worker=True):
+        super(slow_leaf, self).__init__()
+        self.dt = dt
+        self.worker = worker
+
+    def tick(self, tick):
+        if self.worker:
+            b3.timed_call(tick, time.sleep, self.dt, hard=True)
+        else:
+            t = time.time() + self.dt
+            while time.time() < t:
+                time.sleep(0.01)
+                b3.check_time(tick)
+        return b3.SUCCESS
+
+
+class TestSolver013(unittest.TestCase):
+    def setUp(self):
+        self.clock = [0.0]
+
+    def runTest(self):
+        self.test_profiler()
+        self.test_log_levels()
+        self.test_speculate()
+        self.test_budget()
+        self.test_adaptive()
+        self.test_blackboard()
+
+    def test_profiler(self):
+        fs = 'b3 Profiler  FAIL'
+        a = timed_leaf(self.clock, 0.5, b3.FAILURE)
+        a.Name = 'A'
+        b = timed_leaf(self.clock, 2.0, b3.SUCCESS)
+        b.Name = 'B'
+        top = b3.Priority([a, b])
+        top.Name = 'top'
+        bt = b3.BehaviorTree()
+        bt.root = top
+        bb = b3.Blackboard()
+
+        bt.tick('not profiled', bb)
+        self.assertTrue(bt.profiler is None, fs)
+
+        prof = bt.enable_profiling()
+        prof.wall = lambda: self.clock[0]
+        prof.cpu = lambda: self.clock[0]
+        bt.tick('profiled', bb)
+        bt.tick('profiled', bb)
+        d = dict([(n['name'], n) for n in prof.to_dict()['nodes']])
+        self.assertEqual(d['top']['calls'], 2, fs)
+        self.assertEqual(d['A']['calls'], 2, fs)
+        self.assertAlmostEqual(d['top']['wall'], 5.0, 6, fs)
+        self.assertAlmostEqual(d['top']['self'], 0.0, 6, fs)
+        self.assertAlmostEqual(d['B']['self'], 4.0, 6, fs)
+        self.assertAlmostEqual(d['A']['cpu'], 1.0, 6, fs)
+        self.assertEqual(sum(d['B']['hist']), 2, fs)
+        self.assertEqual(d['B']['hist'][5], 2, fs)   # 1s < 2s <= 10s
+
+        tmp = tempfile.mkdtemp()
+        try:
+            prof.write_json(os.path.join(tmp, 'p.json'))
+            with open(os.path.join(tmp, 'p.json')) as f:
+                self.assertEqual(len(json.load(f)['nodes']), 3, fs)
+            prof.write_folded(os.path.join(tmp, 'p.folded'))
+            with open(os.path.join(tmp, 'p.folded')) as f:
+                lines = sorted(f.read().split('\n'))
+            self.assertEqual(lines, ['', 'top 0', 'top;A 1000000',
+                                     'top;B 4000000'], fs)
+        finally:
+            shutil.rmtree(tmp)
+
+    def test_log_levels(self):
+        fs = 'b3 node logging  FAIL'
+        out = StringIO.StringIO()
+        h = logging.StreamHandler(out)
+        h.setFormatter(logging.Formatter('%(node)s: %(message)s'))
+        logger = logging.getLogger('b3')
+        level = logger.level
+        logger.addHandler(h)
+        calls = []
+
+        class expensive(object):
+            def __str__(self):
+                calls.append(1)
+                return 'X'
+        try:
+            logger.setLevel(logging.WARNING)
+            n = b3.Action()
+            n.Name = 'leaf'
+            self.assertFalse(n.BHdebug, fs)
+            n.log(logging.DEBUG, 'a %s', expensive())
+            self.assertEqual(len(calls), 0, fs)    # never stringified
+            n.BHdebug = True          # per node level
+            self.assertTrue(n.BHdebug, fs)
+            n.log(logging.DEBUG, 'b %s', expensive())
+            n.BHdebug = False
+            logger.setLevel(logging.DEBUG)
+            self.assertTrue(n.BHdebug, fs)
+            self.assertEqual(out.getvalue(), 'leaf: b X\n', fs)
+        finally:
+            logger.removeHandler(h)
+            logger.setLevel(level)
+
+    def test_speculate(self):
+        fs = 'b3 parallel Priority/OrNode  FAIL'
+        S = b3.SUCCESS
+        F = b3.FAILURE
+
+        def run(comp, parallel, spec):
+            leaves = [bb_leaf(n, st, t) for (n, st, t) in spec]
+            top = comp(leaves, parallel)
+            bt = b3.BehaviorTree()
+            bt.root = top
+            bt.log_flag = 2
+            bt.log_file = StringIO.StringIO()
+            bb = b3.Blackboard()
+            bb.set('seen', [])
+            bb_leaf.here = []
+            status = bt.tick('speculate', bb)
+            return (status, bb.get('seen'), bb.get('TotalCost'), top.Cost,
+                    bt.log_file.getvalue(),
+                    [bb.get('n', bt.id, x.id) for x in leaves],
+                    [(x.N_ticks_all, x.N_ticks, x.N_success) for x in leaves],
+                    bb_leaf.here)
+
+        n = speculate.NWORKERS
+        try:
+            for comp in [b3.Priority, b3.OrNode]:
+                for spec in [[('a', F, 0), ('b', F, 0), ('c', S, 1), ('d', S, 1)],
+                             [('a', F, 0), ('b', F, 1), ('c', F, 0), ('d', S, 0)],
+                             [('a', F, 2), ('b', F, 0), ('c', S, 2)],
+                             [('a', F, 0), ('b', F, 0), ('c', F, 0)]]:
+                    speculate.NWORKERS = 1          # serial
+                    ser = run(comp, True, spec)
+                    speculate.NWORKERS = 2
+                    par = run(comp, True, spec)
+                    # the same result, state and statistics
+                    self.assertEqual(par[:7], ser[:7], fs)
+                    # the leaves were ticked in workers and not again here
+                    #   (but for a last one, which has nothing to race)
+                    self.assertTrue(par[7] in [[], [spec[-1][0]]], fs)
+                    self.assertEqual(ser[7], [x[0] for x in spec
+                                              if x[0] in ser[7]], fs)
+        finally:
+            speculate.NWORKERS = n
+
+    def test_budget(self):
+        fs = 'b3 time budget  FAIL'
+
+        def run(root):
+            bt = b3.BehaviorTree()
+            bt.root = root
+            t0 = time.time()
+            status = bt.tick('budget', b3.Blackboard())
+            return (status, time.time() - t0, bt.timeouts)
+
+        # no budget: runs to the end
+        self.assertEqual(run(slow_leaf(0.1))[0], b3.SUCCESS, fs)
+        for worker in [True, False]:
+            a = slow_leaf(30, worker)
+            a.Name = 'A'
+            a.max_time = 0.3
+            b = bb_leaf('B', b3.SUCCESS, False)
+            (status, dt, timeouts) = run(b3.Priority([a, b]))
+            self.assertEqual(status, b3.SUCCESS, fs)    # (moved on to B)
+            self.assertTrue(dt < 10, fs)
+            self.assertEqual((a.N_timeouts, timeouts), (1, {'A': 1}), fs)
+        # the enclosing budget is the one which runs out
+        a = slow_leaf(30)
+        a.max_time = 100
+        top = b3.MaxTime(b3.Sequence([a]), 0.3)
+        top.Name = 'top'
+        (status, dt, timeouts) = run(top)
+        self.assertEqual((status, a.N_timeouts, timeouts),
+                         (b3.FAILURE, 0, {'top': 1}), fs)
+        # a child which doesn't check the time FAILS when it returns
+        self.assertEqual(run(b3.MaxTime(timed_leaf(self.clock, 0, b3.SUCCESS),
+                                        0))[0], b3.FAILURE, fs)
+        self.assertEqual(run(b3.MaxTime(slow_leaf(0.1, False), 30))[0],
+                         b3.SUCCESS, fs)
+        self.assertEqual(run(b3.MaxTime(slow_leaf(0.1, False), None))[0],
+                         b3.SUCCESS, fs)      # (no budget)
+        # the nodes left open by a Timeout are closed
+        a = slow_leaf(30, False)
+        bt = b3.BehaviorTree()
+        bt.root = b3.MaxTime(b3.Sequence([a]), 0.3)
+        bb = b3.Blackboard()
+        self.assertEqual(bt.tick('budget', bb), b3.FAILURE, fs)
+        self.assertEqual(bb.get('is_open', bt.id, a.id), False, fs)
+        # timed_call() runs f here (no worker) unless asked for a hard limit
+        pids = []
+
+        class call_leaf(b3.Action):
+            def tick(self, tick):
+                b3.timed_call(tick, pids.append, os.getpid())
+                return b3.SUCCESS
+        self.assertEqual(run(b3.MaxTime(call_leaf(), 30))[0], b3.SUCCESS, fs)
+        self.assertEqual(pids, [os.getpid()], fs)
+
+    def test_adaptive(self):
+        fs = 'b3 AdaptivePriority  FAIL'
+        S = b3.SUCCESS
+        F = b3.FAILURE
+        d = tempfile.mkdtemp()
+        path = os.path.join(d, 'stats', 'utility.json')
+
+        def run(nsolves):   # one run of a program doing nsolves solves
+            leaves = [bb_leaf('a', F, 1), bb_leaf('b', F, 1),
+                      bb_leaf('c', S, 1), bb_leaf('d', S, 1)]
+            top = b3.AdaptivePriority(leaves, b3.UtilityStats(path), 2)
+            order = top.order_names()
+            for i in range(nsolves):
+                bt = b3.BehaviorTree()
+                bt.root = top
+                bb = b3.Blackboard()
+                bb.set('seen', [])
+                self.assertEqual(bt.tick('adaptive', bb), S, fs)
+            top.stats.save()
+            return (order, bb.get('seen'))
+
+        try:
+            # untrained: the given order
+            self.assertEqual(run(2), (['a', 'b', 'c', 'd'], ['a', 'b', 'c']), fs)
+            # a, b, c trained; d (never ticked) keeps its place.  (a and b
+            #   only differ in time taken)
+            (order, seen) = run(1)
+            self.assertEqual((order[0], order[3], seen), ('c', 'd', ['c']), fs)
+            self.assertEqual(run(1)[0], order, fs)  # (a, b stats unchanged)
+            self.assertEqual(b3.UtilityStats(path).get('c')[:3], [4, 4, 4], fs)
+            self.assertEqual(b3.UtilityStats(path).get('a')[:3], [2, 0, 2], fs)
+        finally:
+            shutil.rmtree(d)
+
+    def test_blackboard(self):
+        fs = 'b3 Blackboard  FAIL'
+        bb = b3.Blackboard()
+        bb.set('x', 1)
+        bb.set('x', 2, 'tree')
+        bb.set('x', 3, 'tree', 'node')
+        bb.inc('x', 10, 'tree', 'node')
+        self.assertEqual([bb.get('x'), bb.get('x', 'tree'),
+                          bb.get('x', 'tree', 'node'), bb.get('y', 'tree', 'n2')],
+                         [1, 2, 13, None], fs)
+        bb.set('s', 'a')
+        self.assertRaises(TypeError, bb.inc, 's', 1)
+        # memory handles are the memories themselves
+        m = bb.memory('tree', 'node')
+        self.assertTrue(m is bb.memory('tree', 'node'), fs)
+        m['x'] = 4
+        self.assertEqual(bb.get('x', 'tree', 'node'), 4, fs)
+        self.assertTrue(bb.memory() is bb.memory(None, 'node'), fs)
+
+        # stateless nodes leave no is_open flags; the others still do
+        leaf = bb_leaf('a', b3.SUCCESS, 1)
+        seq = b3.Sequence([leaf])
+        rep = b3.RepeatUntilSuccess(b3.Inverter(seq), 3)
+        bt = b3.BehaviorTree()
+        bt.root = rep
+        bb = b3.Blackboard()
+        bb.set('seen', [])
+        for i in range(2):
+            self.assertEqual(bt.tick('bb', bb), b3.FAILURE, fs)
+        self.assertEqual(bb.get('seen'), ['a'] * 6, fs)
+        for node in [seq, rep.child]:
+            self.assertEqual(bb.memory(bt.id, node.id), {}, fs)
+        for node in [leaf, rep]:
+            self.assertEqual(bb.get('is_open', bt.id, node.id), False, fs)
+        self.assertEqual(bb.get('open_nodes', bt.id), [], fs)
+
+
+#
+#    Can run your test from command line by invoking this file
+#
+#      - or - call your TestSolverTEMPLATE()  from elsewhere
+#
+
+if __name__ == "__main__":
+
+    print '\n\n===============  Test b3 additions ====================='
+    testsuite = unittest.TestLoader().loadTestsFromTestCase(
+        TestSolver013)  # replace TEMPLATE
+    unittest.TextTestRunner(verbosity=2).run(testsuite)
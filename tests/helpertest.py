@@ -19,6 +19,7 @@
 import unittest
 import sympy as sp
 import ikbtbasics.ik_classes as ikc
+import ikbtbasics.kin_cl as kc
 from ikbtfunctions.helperfunctions import *
 
 #####################################################################################
@@ -48,6 +49,7 @@ class TestSolver009(unittest.TestCase):
         self.test_findobj()
         self.test_get_vars()
         self.test_get_unknowns()
+        self.test_count_unknowns()
         return
 
     def test_lhs(self):
@@ -87,6 +89,22 @@ class TestSolver009(unittest.TestCase):
         self.assertTrue(unks[0] == self.uth4)
         return
 
+    def test_count_unknowns(self):
+        fs = 'count_unknowns()   FAIL'
+        self.uth2.solved = False
+        self.assertTrue(count_unknowns(self.vars, self.expression01) == 2, fs)
+        self.assertTrue(free_symbols(self.expression01) is
+                        free_symbols(self.uth2.symbol + sp.sin(self.uth4.symbol)), fs)
+        e = kc.kequation(self.ud1.symbol * sp.cos(self.uth3.symbol),
+                         self.expression01 + self.ud1.symbol)
+        self.assertTrue(e.free_symbols() == set([d_1, th_2, th_3, th_4]), fs)
+        # a symbol on both sides is counted twice, like scan_for_equations()
+        self.assertTrue(e.count_unknowns(self.vars) == 5, fs)
+        self.uth2.solved = True   # solved state is not cached
+        self.assertTrue(e.count_unknowns(self.vars) == 4, fs)
+        self.assertTrue(count_unknowns(self.vars, self.expression01) == 1, fs)
+        return
+
 
 #
 #    Can run your test from command line by invoking this file
@@ -38,6 +38,7 @@ sys.path.append('../ikbtfunctions')
 from ikbtfunctions.helperfunctions import *
 # had to separate tests form helperfunctions b/c of circular imports
 from helpertest import *
+from b3test import *
 
 from ikbtbasics.kin_cl import *
 # special classes for Inverse kinematics in sympy
@@ -49,6 +50,14 @@ from ikbtleaves.sincos_solver import *
 from ikbtleaves.tan_solver import *
 from ikbtleaves.sub_transform import *
 from ikbtleaves.updateL import *
+from ikbtleaves.two_eqn_m7 import TestSolverm7
+from ikbtfunctions.cache_store import TestSolver011
+from ikbtfunctions.parallel_simplify import TestSolver012
+import ikbtfunctions.ik_logging as ikl
+from ikbtfunctions.ik_logging import TestSolver014
+from ikbtleaves.assigner_leaf import TestSolver015
+from ikbtleaves.rank_leaf import TestSolver016
+from ikbtleaves.x2y2_solver import TestSolver017
 
 import b3 as b3          # behavior trees
 
@@ -103,6 +112,103 @@ class TestIkClass(unittest.TestCase):
         self.assertEqual(E1.RHS, sp.cos(d), fs)
         self.assertEqual(E2.RHS, sp.sin(e), fs)
         self.assertEqual(E3.RHS, d + e + 5, fs)
+        self.assertEqual(E3.string, '5 = d + e + 5', fs)
+        self.assertEqual(E3.count_ops(), 2, fs)
+        self.assertEqual(hash(E3), hash(kequation(5, d + e + 5)), fs)
+        import pickle
+        E4 = pickle.loads(pickle.dumps(E3, 2))
+        self.assertEqual(E4, E3, fs)
+        self.assertEqual(E4.string, E3.string, fs)
+        self.assertEqual(pickle.loads(pickle.dumps(E3)), E3, fs)
+
+    def test_robot_pickle(self):
+        # the solution graph iterates as a plain set would, through pickles
+        #   and the set operations
+        import pickle
+        fs = ' Robot pickle FAIL'
+        R = Robot()
+        s = set()
+        for i in range(40):
+            R.notation_graph.add(Edge(sp.var('x_%d' % i), -1))
+            s.add(Edge(sp.var('x_%d' % i), -1))
+        R2 = pickle.loads(pickle.dumps(R, 2))
+        self.assertEqual(list(R2.notation_graph), list(s), fs)
+        g = R2.notation_graph
+        g.discard(Edge(sp.var('x_3'), -1))
+        g.remove(Edge(sp.var('x_5'), -1))
+        g |= set([Edge(sp.var('y_1'), -1)])
+        g.update([Edge(sp.var('y_2'), -1), Edge(sp.var('x_7'), -1)])
+        g -= set([Edge(sp.var('x_9'), -1)])
+        s.discard(Edge(sp.var('x_3'), -1))
+        s.remove(Edge(sp.var('x_5'), -1))
+        s |= set([Edge(sp.var('y_1'), -1)])
+        s.update([Edge(sp.var('y_2'), -1), Edge(sp.var('x_7'), -1)])
+        s -= set([Edge(sp.var('x_9'), -1)])
+        self.assertEqual(list(g), list(s), fs)
+        R3 = pickle.loads(pickle.dumps(R2, 2))
+        for i in range(40, 60):     # (edges added after the pickle)
+            R3.notation_graph.add(Edge(sp.var('x_%d' % i), -1))
+            s.add(Edge(sp.var('x_%d' % i), -1))
+        self.assertEqual(list(R3.notation_graph), list(s), fs)
+        self.assertEqual(len(R3.notation_graph), len(s), fs)
+        self.assertTrue(Edge(sp.var('y_1'), -1) in R3.notation_graph, fs)
+        self.assertTrue(isinstance(R3.notation_graph, edge_set), fs)
+
+    def test_kequation_set(self):
+        # duplicate detection in kequation_set
+        fs = ' kequation_set FAIL'
+        s = kequation_set()
+        self.assertTrue(s.add(kequation(0, sp.cos(d) + e)), fs)
+        self.assertTrue(s.add(kequation(5, d * e)), fs)
+        self.assertFalse(s.add(kequation(0, e + sp.cos(d))), fs)
+        self.assertFalse(s.add(kequation(5, e * d)), fs)
+        self.assertTrue(s.add(kequation(5, d + e)), fs)
+        self.assertTrue(kequation(5, d * e) in s, fs)
+        self.assertFalse(kequation(6, d * e) in s, fs)
+        self.assertEqual(len(s), 3, fs)
+        self.assertEqual(list(s)[1], kequation(5, d * e), fs)  # keeps order
+
+    def test_id_memo(self):
+        # repeated ID failures are answered from the memo
+        fs = ' id_leaf memo FAIL'
+
+        class counting_id(id_leaf):
+            calls = 0
+
+            def identify(self, tick):
+                self.calls += 1
+                return b3.FAILURE
+
+        bb = b3.Blackboard()
+        set_eqn_lists(bb, [kequation(0, sp.cos(d) + e)], [], [])
+        v = bb.get('eqns_index')[d][0]
+        set_eqn_lists(bb, [kequation(0, sp.cos(d) + e)], [], [])  # same eqns
+        self.assertEqual(bb.get('eqns_index')[d][0], v, fs)
+        ud = unknown(d)
+        ue = unknown(e)
+        ua = unknown(a)
+        bb.set('unknowns', [ud, ue, ua])
+        bb.set('curr_unk', ud)
+        leaf = counting_id()
+        bt = b3.BehaviorTree()
+        bt.root = leaf
+        self.assertEqual(bt.tick('memo test', bb), b3.FAILURE, fs)
+        self.assertEqual(bt.tick('memo test', bb), b3.FAILURE, fs)
+        self.assertEqual(leaf.calls, 1, fs)
+        ua.solved = True                      # not in d's eqns
+        bt.tick('memo test', bb)
+        self.assertEqual(leaf.calls, 1, fs)
+        ue.solved = True                      # in d's eqns
+        bt.tick('memo test', bb)
+        self.assertEqual(leaf.calls, 2, fs)
+        set_eqn_lists(bb, [kequation(0, sp.sin(d) + e)], [], [])  # new eqns
+        self.assertNotEqual(bb.get('eqns_index')[d][0], v, fs)
+        bt.tick('memo test', bb)
+        bt.tick('memo test', bb)
+        self.assertEqual(leaf.calls, 3, fs)
+        leaf.memo = False
+        bt.tick('memo test', bb)
+        self.assertEqual(leaf.calls, 4, fs)
 
     def test_unknown(self):
        # Test unknown class
@@ -163,6 +269,148 @@ class TestIkClass(unittest.TestCase):
         c.add(b)
         self.assertEqual(len(c), 1, "hashing (unknown/variable) class fail")
 
+    def test_fkcachekey(self):
+        # FK cache entries are keyed on kinematics, not robot name
+        dh = sp.Matrix([
+            [0, 0, d_1, 0],
+            [sp.pi / 2, 0, 0, th_2],
+            [0, l_2, 0, th_3],
+            [0, 0, 0, 0],
+            [0, 0, 0, 0],
+            [0, 0, 0, 0]
+        ])
+        vv = [0, 1, 1, 1, 1, 1]
+        unks = [unknown(d_1), unknown(th_2), unknown(th_3)]
+        fs = 'fk_cache_key() FAIL'
+        k1 = fk_cache_key(dh, vv, unks)
+        self.assertEqual(k1, fk_cache_key(dh.copy(), list(vv),
+                                          [unknown(d_1), unknown(th_2), unknown(th_3)]), fs)
+        dh2 = dh.copy()
+        dh2[2, 1] = l_3
+        self.assertNotEqual(k1, fk_cache_key(dh2, vv, unks), fs + ' (DH)')
+        self.assertNotEqual(k1, fk_cache_key(dh, [1, 1, 1, 1, 1, 1], unks), fs + ' (vv)')
+        # the stored entry is also keyed on the FK source code
+        k2 = fk_entry_key(dh, vv, unks)
+        self.assertNotEqual(k1, k2, fs + ' (source)')
+        self.assertEqual(k2, fk_entry_key(dh.copy(), vv, unks), fs)
+        d = source_digest(['ikbtbasics'])
+        self.assertNotEqual(d, source_digest([]), fs + ' (no sources)')
+        cwd = os.getcwd()
+        try:
+            os.chdir('/')
+            self.assertEqual(source_digest(['ikbtbasics']), d, fs + ' (cwd)')
+        finally:
+            os.chdir(cwd)
+        self.assertTrue(check_the_pickle(dh, dh.copy()), fs)
+        self.assertFalse(check_the_pickle(dh, dh2), fs + ' (stale)')
+
+    def test_soa_memo(self):
+        # sum_of_angles_transform() only redoes entries that changed
+        fs = 'sum_of_angles_transform() FAIL'
+        Td = ik_lhs()
+        Ts = sp.zeros(4)
+        Ts[0, 0] = sp.sin(th_1) * sp.cos(th_2) + sp.cos(th_1) * sp.sin(th_2)
+        Ts[1, 3] = l_1 * sp.cos(th_2 + th_3) + l_2
+        R = Robot()
+        R.mequation_list = [matrix_equation(Td, Ts)]
+        unks = [unknown(th_1), unknown(th_2), unknown(th_3)]
+        calls = []
+        soa_entry = R.soa_entry
+
+        def counting_entry(lhs, rhs, simplified={}):
+            calls.append(rhs)
+            return soa_entry(lhs, rhs, simplified)
+        R.soa_entry = counting_entry
+        R.sum_of_angles_transform(unks)
+        m = R.mequation_list[0]
+        self.assertEqual(m.Ts[0, 0], sp.sin(th_12), fs)
+        self.assertEqual(m.Ts[1, 3], l_1 * sp.cos(th_23) + l_2, fs)
+        self.assertEqual(sorted([str(u) for u in unks]),
+                         ['th_1', 'th_12', 'th_2', 'th_23', 'th_3'], fs)
+        self.assertEqual(len(R.kequation_aux_list), 2, fs)
+        self.assertEqual(len(calls), 12, fs)
+        calls[:] = []
+        R.sum_of_angles_transform(unks)     # (the two transformed entries)
+        self.assertEqual(len(calls), 2, fs + ' (transformed entries)')
+        calls[:] = []
+        R.sum_of_angles_transform(unks)
+        self.assertEqual(calls, [], fs + ' (not memoized)')
+        m.Ts[2, 3] = sp.cos(th_1 + th_2)   # e.g. sub_transform
+        R.sum_of_angles_transform(unks)
+        self.assertEqual(len(calls), 1, fs + ' (dirty entry)')
+        self.assertEqual(m.Ts[2, 3], sp.cos(th_12), fs)
+        self.assertEqual(len(R.kequation_aux_list), 2, fs)
+
+    def test_soa_two_sums(self):
+        # an entry with two different sums of angles: one is replaced on
+        #   each pass, and both variables are added
+        fs = 'sum_of_angles_transform() two sums FAIL'
+        Td = ik_lhs()
+        Ts = sp.zeros(4)
+        Ts[0, 3] = l_1 * sp.sin(th_1 + th_2) + l_2 * sp.cos(th_2 + th_3)
+        R = Robot()
+        R.mequation_list = [matrix_equation(Td, Ts)]
+        unks = [unknown(th_1), unknown(th_2), unknown(th_3)]
+        for n in range(3):
+            R.sum_of_angles_transform(unks)
+        self.assertEqual(R.mequation_list[0].Ts[0, 3],
+                         l_1 * sp.sin(th_12) + l_2 * sp.cos(th_23), fs)
+        self.assertEqual(sorted([str(u) for u in unks]),
+                         ['th_1', 'th_12', 'th_2', 'th_23', 'th_3'], fs)
+        self.assertEqual(len(R.kequation_aux_list), 2, fs)
+
+    def test_checkpoints(self):
+        # run_checkpointed() resumes after the deepest stored stage
+        import tempfile
+        import shutil
+        from ikbtfunctions.cache_store import cache_store
+        d = tempfile.mkdtemp() + '/'
+        calls = []
+
+        def start():
+            calls.append('start')
+            return [0]
+
+        def stage(name):
+            def f(state):
+                calls.append(name)
+                return state + [name]
+            return f
+        stages = [('a', stage('a')), ('b', stage('b')), ('c', stage('c'))]
+        fs = 'run_checkpointed() FAIL'
+        try:
+            cs = cache_store(d)
+            self.assertEqual(run_checkpointed(stages, 'k0', start, cs),
+                             [0, 'a', 'b', 'c'], fs)
+            self.assertEqual(calls, ['start', 'a', 'b', 'c'], fs)
+            calls[:] = []
+            self.assertEqual(run_checkpointed(stages, 'k0', start, cs),
+                             [0, 'a', 'b', 'c'], fs)
+            self.assertEqual(calls, [], fs + ' (recomputed)')
+            # a new last stage only runs that stage
+            stages[2] = ('c2', stage('c2'))
+            self.assertEqual(run_checkpointed(stages, 'k0', start, cs),
+                             [0, 'a', 'b', 'c2'], fs)
+            self.assertEqual(calls, ['c2'], fs + ' (resume)')
+            # different base key: start over
+            calls[:] = []
+            run_checkpointed(stages, 'k1', start, cs)
+            self.assertEqual(calls, ['start', 'a', 'b', 'c2'], fs)
+            calls[:] = []
+            run_checkpointed(stages, 'k1', start)   # no store
+            self.assertEqual(calls, ['start', 'a', 'b', 'c2'], fs)
+            # a result which is not kept: neither it nor later stages
+            #   are stored
+            calls[:] = []
+            keep = lambda state: 'b' not in state
+            run_checkpointed(stages, 'k2', start, cs, keep)
+            self.assertEqual(calls, ['start', 'a', 'b', 'c2'], fs)
+            calls[:] = []
+            run_checkpointed(stages, 'k2', start, cs, keep)
+            self.assertEqual(calls, ['b', 'c2'], fs + ' (not kept)')
+        finally:
+            shutil.rmtree(d)
+
 # class TestSolvers(unittest.TestCase):
 
 
@@ -189,17 +437,28 @@ if __name__ == '__main__':
             print >> sys.stderr, 'invalid arguments: ', sys.argv
             quit()
 
+    ikl.setup()      # solver output to stdout
+
     #####################################################################
     # set up the test suites
     suite1 = unittest.TestLoader().loadTestsFromTestCase(TestIkClass)
     suite1.addTest(TestSolver008())   # kin_cl.py   # basic kinematics classes
     suite1.addTest(TestSolver009())   # helperfunctions.py
+    suite1.addTests(unittest.TestLoader().loadTestsFromTestCase(
+        TestSolver011))               # cache_store.py
+    suite1.addTest(TestSolver012())   # parallel_simplify.py
+    suite1.addTest(TestSolver013())   # b3test.py  (b3 additions)
+    suite1.addTest(TestSolver014())   # ik_logging.py
+    suite1.addTest(TestSolver015())   # assigner_leaf.py  (solve_each)
 
     suite2 = unittest.TestLoader().loadTestsFromTestCase(
         TestSolver001)  # sincos_solver.py
     suite2.addTest(TestSolver002())  # algebra_solver.py
     suite2.addTest(TestSolver003())  # sinANDcos_solver.py
     suite2.addTest(TestSolver004())  # tan_solver.py
+    suite2.addTest(TestSolverm7())   # two_eqn_m7.py
+    suite2.addTest(TestSolver016())  # rank_leaf.py  (rank_all)
+    suite2.addTest(TestSolver017())  # x2y2_solver.py
     # TestSolver005 deprecated
     suite3 = unittest.TestLoader().loadTestsFromTestCase(
         TestSolver006)  # sub_transform.py